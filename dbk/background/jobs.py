@@ -3,7 +3,7 @@ from datetime import datetime
 
 import sqlalchemy as sa
 
-from dbk.core import models, persist, rules, sync
+from dbk.core import balances, models, persist, rules, sync
 from dbk.db import make_connection, make_session_factory
 from dbk.settings import RootConfig
 
@@ -13,9 +13,11 @@ from .worker_pool import Job
 class _worker_context:
     def __init__(self):
         self.config = RootConfig()  # type: ignore
-        self.engine = make_connection(self.config.db_url)
+        self.engine = make_connection(
+            self.config.db_url, self.config.sqlite, role="worker"
+        )
         self.session_factory = make_session_factory(self.engine)
-        self.storage = persist.LocalStorage()
+        self.storage = persist.make_storage(engine=self.engine)
 
 
 def _sync_data_sources_job(conn_id):
@@ -59,6 +61,9 @@ def _apply_rules(book_id: int, rulesets: list[rules.RuleSet]):
         for tx in txs:
             engine.apply_rules(tx)
 
+        balances.refresh(session)
+        session.commit()
+
 
 def sync_data_sources(conn_id: int) -> Job[int]:
     """
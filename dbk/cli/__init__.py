@@ -1,6 +1,6 @@
 import click
 
-from dbk.cli import database, sync, book
+from dbk.cli import database, export, prices, rates, sync, book
 from dbk.core import initialize
 
 from ._app import App
@@ -16,4 +16,8 @@ def main(ctx: click.Context):
 
 main.add_command(database.database)
 main.add_command(sync.add_file)
+main.add_command(sync.import_files)
 main.add_command(book.subcommand)
+main.add_command(export.export)
+main.add_command(prices.prices)
+main.add_command(rates.rates)
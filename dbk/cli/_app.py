@@ -3,6 +3,7 @@ import os
 
 import sqlalchemy.orm as orm
 
+from dbk.core import persist
 from dbk.db import make_connection
 from dbk.logging import setup_logging
 from dbk.settings import RootConfig, UserConfig
@@ -18,7 +19,8 @@ class App:
 
         setup_logging("dbk.cli.log")
 
-        self.engine = make_connection(self.root_config.db_url)
+        self.engine = make_connection(self.root_config.db_url, self.root_config.sqlite)
         self.session_factory: orm.sessionmaker[orm.Session] = orm.sessionmaker(
             self.engine
         )
+        self.storage = persist.make_storage(self.user_config, self.engine)
@@ -1,7 +1,8 @@
 import click
 
-from dbk.core import models
-from dbk.db import migrate
+from dbk import db
+from dbk.core import balances, models, persist
+from dbk.errors import DbkError
 
 from ._app import App
 
@@ -15,5 +16,52 @@ def database():
 @click.pass_obj
 def reset(app: App):
     print("Resetting database...")
-    migrate(app.engine, models.Base.metadata)
+    db.reset(app.engine, models.Base.metadata)
     print("Done!")
+
+
+@database.command()
+@click.pass_obj
+def migrate(app: App):
+    """Upgrades the database to the latest schema, keeping its data."""
+    todo = db.pending(app.engine)
+    if not todo:
+        print("Database is up to date.")
+        return
+
+    def progress(m: db.Migration, done: int, total: int):
+        print(f"\r  {m.name}: {done * 100 // total}%", end="", flush=True)
+
+    for m in todo:
+        print(f"Migration {m.version}: {m.name}")
+    db.migrate(app.engine, models.Base.metadata, progress=progress)
+    print("\nDone!")
+
+
+@database.command()
+@click.pass_obj
+def rebuild(app: App):
+    """Recomputes the tables derived from others, and the search index."""
+    with app.session_factory() as s, s.begin():
+        conn = s.connection()
+        print("Recomputing the account tree...")
+        models.rebuild_account_closure(conn)
+        print("Recounting transactions...")
+        models.rebuild_transaction_counts(conn)
+        print("Recomputing daily balances...")
+        balances.rebuild(s)
+        print("Reindexing transaction descriptions...")
+        models.rebuild_search_index(conn)
+    print("Done!")
+
+
+@database.command()
+@click.pass_obj
+def gc(app: App):
+    """Removes stored files that no data source refers to anymore."""
+    if not isinstance(app.storage, persist.ContentAddressedStorage):
+        raise DbkError("Garbage collection requires the 'cas' storage backend.")
+
+    with app.session_factory() as s:
+        removed = app.storage.collect_garbage(s)
+    print(f"Removed {len(removed)} unreferenced files.")
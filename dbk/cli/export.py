@@ -0,0 +1,80 @@
+import sys
+from pathlib import Path
+
+import click
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+from dbk.core import export as core_export
+from dbk.core import models
+from dbk.errors import DbkError
+
+from ._app import App
+
+
+def _find_book(s: orm.Session, book: str | None) -> models.Book:
+    stmt = sa.select(models.Book)
+    if book:
+        stmt = stmt.where(models.Book.name == book)
+    books = s.scalars(stmt.limit(2)).all()
+
+    if not books:
+        raise DbkError(f"Book {book} does not exist.")
+
+    if len(books) > 1:
+        raise DbkError(
+            "There are several books, or several with that name. Specify a book name."
+        )
+
+    return books[0]
+
+
+@click.command()
+@click.option("--book", type=str)
+@click.option(
+    "--format",
+    "format",
+    type=click.Choice([f.value for f in core_export.ExportFormat]),
+    default=core_export.ExportFormat.csv.value,
+)
+@click.option(
+    "--output",
+    "-o",
+    type=Path,
+    help="File to write to, defaults to standard output.",
+)
+@click.option("--from", "start", type=click.DateTime(["%Y-%m-%d"]))
+@click.option("--to", "end", type=click.DateTime(["%Y-%m-%d"]))
+@click.option(
+    "--account",
+    type=str,
+    help='Path of an account, like "Expenses:Food", to export with its subaccounts.',
+)
+@click.pass_obj
+def export(
+    app: App,
+    book: str | None,
+    format: str,
+    output: Path | None,
+    start: click.DateTime | None,
+    end: click.DateTime | None,
+    account: str | None,
+):
+    """Writes the transactions of a book to CSV or JSON Lines, oldest first."""
+    with app.session_factory() as s:
+        b = _find_book(s, book)
+        account_id = core_export.find_account(s, b.id, account) if account else None
+        filters = dict(
+            start=start.date() if start else None,  # type: ignore
+            end=end.date() if end else None,  # type: ignore
+            account_id=account_id,
+        )
+        fmt = core_export.ExportFormat(format)
+
+        if output is None:
+            core_export.export(s, b.id, sys.stdout, fmt, **filters)
+            return
+
+        with open(output, "w", newline="", encoding="utf-8") as out:
+            n = core_export.export(s, b.id, out, fmt, **filters)
+        print(f"Exported {n} transactions to {output}.", file=sys.stderr)
@@ -0,0 +1,37 @@
+from pathlib import Path
+
+import click
+
+from dbk.core import portfolio
+
+from ._app import App
+
+
+@click.group()
+def prices():
+    pass
+
+
+@prices.command("import")
+@click.argument("fnames", type=Path, nargs=-1, required=True)
+@click.option(
+    "--instrument",
+    type=str,
+    help="Instrument of the prices, for files without an instrument column.",
+)
+@click.option(
+    "--currency",
+    type=str,
+    help="Currency of the prices, for files without a currency column, if it is "
+    "not that of the books.",
+)
+@click.pass_obj
+def import_prices(
+    app: App, fnames: tuple[Path, ...], instrument: str | None, currency: str | None
+):
+    """Imports daily prices from CSV files, replacing those of the same days."""
+    with app.session_factory() as s, s.begin():
+        for fname in fnames:
+            prices = portfolio.read_price_file(fname, instrument, currency)
+            n = portfolio.import_prices(s, prices)
+            print(f"Imported {n} prices from {fname}.")
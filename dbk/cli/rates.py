@@ -0,0 +1,30 @@
+from pathlib import Path
+
+import click
+
+from dbk.core import fx
+
+from ._app import App
+
+
+@click.group()
+def rates():
+    pass
+
+
+@rates.command("import")
+@click.argument("fnames", type=Path, nargs=-1, required=True)
+@click.option("--base", type=str, help="Currency converted from, e.g. EUR.")
+@click.option("--quote", type=str, help="Currency converted to, e.g. USD.")
+@click.pass_obj
+def import_rates(
+    app: App, fnames: tuple[Path, ...], base: str | None, quote: str | None
+):
+    """
+    Imports daily exchange rates from CSV files, replacing those of the same days.
+    `--base` and `--quote` are for files without base and quote columns.
+    """
+    with app.session_factory() as s, s.begin():
+        for fname in fnames:
+            n = fx.import_rates(s, fx.read_rate_file(fname, base, quote))
+            print(f"Imported {n} rates from {fname}.")
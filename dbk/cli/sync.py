@@ -2,12 +2,32 @@ from pathlib import Path
 
 import click
 import sqlalchemy as sa
+import sqlalchemy.orm as orm
 
 from dbk.core import models, sync
+from dbk.errors import DbkError
 
 from ._app import App
 
 
+def _find_connection(s: orm.Session, conn: str, book: str | None) -> models.Connection:
+    stmt = sa.select(models.Connection)
+    if book:
+        stmt = stmt.join(models.Book).where(models.Book.name == book)
+    stmt = stmt.where(models.Connection.conn_name == conn)
+    conns = s.scalars(stmt).all()
+
+    if not conns:
+        raise DbkError(f"Connection {conn} does not exist.")
+
+    if len(conns) > 1:
+        raise DbkError(
+            f"Connection {conn} is ambiguous - multiple connections with that name exist. Specify a book name to narrow the search."
+        )
+
+    return conns[0]
+
+
 @click.command()
 @click.argument("fname", type=Path)
 @click.option("--conn", type=str, required=True)
@@ -17,23 +37,40 @@ def add_file(app: App, fname: Path, book: str | None, conn: str):
     with app.session_factory() as s:
         s.expire_on_commit = False
 
-        stmt = sa.select(models.Connection)
-        if book:
-            stmt = stmt.join(models.Book).where(models.Book.name == book)
-        stmt = stmt.where(models.Connection.conn_name == conn)
-        conns = s.scalars(
-            sa.select(models.Connection).where(models.Connection.conn_name == conn)
-        ).all()
+        connection = _find_connection(s, conn, book)
+        data_source = sync.create_file_data_source(s, app.storage, connection, fname)
+        sync.sync_connection(s, app.storage, connection, [data_source])
+        s.commit()
 
-        if len(conn) > 1:
-            raise ValueError(
-                f"Connection {conn} is ambiguous - multiple connections with that name exist. Specify a book name to narrow the search."
-            )
 
-        connection = conns[0]
-        data_source = sync.create_file_data_source(s, connection, fname)
-        sync.sync_data_source(s, connection, data_source)
-        s.commit()
+@click.command("import")
+@click.argument("pattern", type=str)
+@click.option("--conn", type=str, required=True)
+@click.option("--book", type=str)
+@click.option(
+    "--jobs",
+    "-j",
+    type=int,
+    default=0,
+    help="Number of parallel workers, defaults to the number of cpus.",
+)
+@click.pass_obj
+def import_files(app: App, pattern: str, conn: str, book: str | None, jobs: int):
+    """Imports every file in a directory, or matching a glob pattern, into a connection."""
+    fnames = sync.discover_files(pattern)
+    if not fnames:
+        raise DbkError(f"No files found matching '{pattern}'.")
+
+    with app.session_factory() as s:
+        connection = _find_connection(s, conn, book)
+        print(f"Importing {len(fnames)} files into {connection.conn_name}...")
+        stats = sync.import_files(s, app.storage, connection, fnames, jobs)
+
+    print(
+        f"Imported {stats.files} files ({stats.skipped} skipped) "
+        f"and {stats.rows} rows in {stats.elapsed:.2f}s"
+    )
+    print(f"{stats.files_per_sec:.1f} files/s, {stats.rows_per_sec:.1f} rows/s")
 
 
 @click.command()
@@ -0,0 +1,171 @@
+"""
+Balances of accounts at a date, and their changes over a period, read from the
+`account_daily_balances` table, so they cost one index lookup per account instead of
+a scan of the transactions. Amounts are positive when the account is debited, and
+are summed in minor units, then converted with the exponent of the currency of the
+account, or of its book for groups. Totals over accounts in several currencies are
+converted into one, see `fx`.
+
+Readers never write. The running balances of accounts with new or changed
+transactions are brought up to date by writers, with `refresh` at the end of a sync
+or a rules run; until then, the balances of those accounts are read from the net
+changes of their days since the first one that changed.
+"""
+
+from datetime import date
+from typing import Iterable
+
+import numpy as np
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+from dbk.core import fx, models
+
+
+def units_at(day: date, account_ids) -> sa.Select[tuple[int, int]]:
+    """
+    Query for the balance, in minor units, of each of `account_ids`, a list or a
+    select of ids, at the end of `day`. Accounts without transactions by then have
+    no row.
+    """
+    B = models.AccountDailyBalance
+    dirty = models.AccountBalanceDirty
+    # SQLite takes the bare column `balance` from the row with the max day
+    latest = (
+        sa.select(B.account_id, B.balance, sa.func.max(B.day).label("day"))
+        .where(B.account_id.in_(account_ids), B.day <= day)
+        .group_by(B.account_id)
+        .subquery()
+    )
+
+    before = orm.aliased(B)
+    clean = (
+        sa.select(before.balance)
+        .where(
+            before.account_id == latest.c.account_id,
+            before.day < dirty.from_day,
+        )
+        .order_by(before.day.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    since = orm.aliased(B)
+    changed = (
+        sa.select(sa.func.sum(since.net_change))
+        .where(
+            since.account_id == latest.c.account_id,
+            since.day >= dirty.from_day,
+            since.day <= day,
+        )
+        .scalar_subquery()
+    )
+    units = sa.case(
+        (
+            sa.or_(dirty.from_day.is_(None), latest.c.day < dirty.from_day),
+            latest.c.balance,
+        ),
+        # the running balance is stale from `from_day` on
+        else_=sa.func.coalesce(clean, 0) + changed,
+    )
+    return sa.select(latest.c.account_id, units.label("units")).outerjoin(
+        dirty, dirty.account_id == latest.c.account_id
+    )
+
+
+def _exponents(session: orm.Session, account_ids: list[int]) -> dict[int, int]:
+    stmt = (
+        sa.select(
+            models.Account.id,
+            sa.func.coalesce(models.Account.currency, models.Book.currency),
+        )
+        .join(models.Book)
+        .where(models.Account.id.in_(account_ids))
+    )
+    return {a: models.currency_exponent(c) for a, c in session.execute(stmt)}
+
+
+def _decode(
+    session: orm.Session, ids: list[int], units: dict[int, int]
+) -> dict[int, float]:
+    exponents = _exponents(session, ids)
+    return {
+        a: units.get(a, 0) / 10 ** exponents.get(a, models.DEFAULT_EXPONENT)
+        for a in ids
+    }
+
+
+def refresh(session: orm.Session):
+    """
+    Brings the running balances of accounts with new or changed transactions up to
+    date. Called by writers before they commit, so readers read them as stored.
+    """
+    dirty = session.scalar(sa.select(models.AccountBalanceDirty.account_id).limit(1))
+    if dirty is not None:
+        models.refresh_daily_balances(session.connection())
+
+
+def rebuild(session: orm.Session):
+    """Recomputes the daily balances of all accounts from their transactions."""
+    models.rebuild_daily_balances(session.connection())
+
+
+def balance_at(
+    session: orm.Session,
+    account_ids: Iterable[int],
+    day: date,
+) -> dict[int, float]:
+    """Balance of each account at the end of `day`."""
+    ids = list(account_ids)
+    stmt = units_at(day, ids)
+    return _decode(session, ids, {a: v for a, v in session.execute(stmt)})
+
+
+def total_at(session: orm.Session, account_id: int, day: date) -> float:
+    """
+    Sum of the balances of the account and all accounts under it, at `day`, in the
+    currency of the account. Balances in other currencies are converted at their rate
+    as of `day`, see `fx.Rates`, and the total is nan if one of them has none.
+    """
+    A = models.Account
+    currency = sa.func.upper(sa.func.coalesce(A.currency, models.Book.currency))
+    units = units_at(day, models.AccountClosure.subtree(account_id)).subquery()
+    # summed exactly, in minor units, per currency
+    stmt = (
+        sa.select(currency, sa.func.sum(units.c.units))
+        .select_from(units)
+        .join(A, A.id == units.c.account_id)
+        .join(models.Book, models.Book.id == A.book_id)
+        .group_by(currency)
+    )
+    totals = [(c, u) for c, u in session.execute(stmt) if u]
+    target = session.scalar(
+        sa.select(currency).select_from(A).join(models.Book).where(A.id == account_id)
+    )
+    assert target is not None
+
+    amounts = np.array(
+        [u / 10 ** models.currency_exponent(c) for c, u in totals], np.float64
+    )
+    if all(c == target for c, _ in totals):
+        return float(amounts.sum())
+    rates = fx.rates(session, target)
+    codes = rates.codes(c for c, _ in totals)
+    days = np.full(len(totals), np.datetime64(day, "D"))
+    return float(rates.convert(amounts, codes, days).sum())
+
+
+def change_over(
+    session: orm.Session,
+    account_ids: Iterable[int],
+    start: date,
+    end: date,
+) -> dict[int, float]:
+    """Net change of each account from the start of `start` to the end of `end`."""
+    B = models.AccountDailyBalance
+    ids = list(account_ids)
+    stmt = (
+        sa.select(B.account_id, sa.func.sum(B.net_change))
+        .where(B.account_id.in_(ids), B.day.between(start, end))
+        .group_by(B.account_id)
+    )
+    return _decode(session, ids, {a: v for a, v in session.execute(stmt)})
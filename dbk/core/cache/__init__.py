@@ -0,0 +1,125 @@
+"""
+Results of expensive queries, kept in memory by the version of the data they were
+computed from. Every change to a book moves its data version, see
+`models.DataVersion`, so a result is reused for as long as the version it was
+computed at is current, and nothing needs to tell the cache what changed.
+"""
+
+import dataclasses
+import sys
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable
+
+import numpy as np
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+from dbk.core import models
+
+MAX_BYTES = 64 * 1024 * 1024
+"""Default memory cap of a `ResultCache`."""
+
+
+def data_version(session: orm.Session, book_id: int | None = None) -> int:
+    """
+    Version of the data of the book, including the data shared by all books, or of
+    all books when `book_id` is None. It only grows.
+    """
+    V = models.DataVersion
+    stmt = sa.select(sa.func.max(V.version))
+    if book_id is not None:
+        stmt = stmt.where(V.book_id.in_([book_id, 0]))
+    return session.scalar(stmt) or 0
+
+
+def sizeof(value: Any) -> int:
+    """Estimate of the memory held by a result, following containers and arrays."""
+    seen: set[int] = set()
+
+    def size(v: Any) -> int:
+        if id(v) in seen:
+            return 0
+        seen.add(id(v))
+        if isinstance(v, np.ndarray):
+            # a view holds its base, which is counted with it
+            return v.nbytes + sys.getsizeof(v)
+        n = sys.getsizeof(v)
+        if isinstance(v, (str, bytes, int, float, bool)) or v is None:
+            return n
+        if isinstance(v, dict):
+            return n + sum(size(k) + size(x) for k, x in v.items())
+        if isinstance(v, (list, tuple, set, frozenset)):
+            return n + sum(size(x) for x in v)
+        if dataclasses.is_dataclass(v):
+            return n + sum(size(getattr(v, f.name)) for f in dataclasses.fields(v))
+        return n
+
+    return size(value)
+
+
+@dataclass
+class _Entry:
+    version: int
+    value: Any
+    size: int
+
+
+class ResultCache:
+    """
+    Results by key, like `("balance-sheet", book_id, day)`, each kept with the data
+    version it was computed at. A result is only returned for that same version; an
+    older one is replaced when the key is asked for again, so a key holds one result.
+    The least recently used results are evicted beyond `max_entries` or `max_bytes`.
+
+    Safe to use from several threads. Results are shared by their readers, who must
+    not change them.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: dict[Hashable, _Entry] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get[T](self, key: Hashable, version: int, compute: Callable[[], T]) -> T:
+        """The result for `key` at `version`, computed by `compute` if it is not kept."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry.version == version:
+                # most recently used last
+                self._entries[key] = entry
+                self.hits += 1
+                return entry.value
+            if entry is not None:
+                self.size -= entry.size
+            self.misses += 1
+
+        # computed outside the lock, two readers of a key may both compute it
+        value = compute()
+        entry = _Entry(version, value, sizeof(value))
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old.size
+            if old is not None and old.version > version:
+                # computed meanwhile from newer data
+                entry = old
+            if entry.size <= self.max_bytes:
+                self._entries[key] = entry
+                self.size += entry.size
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                evicted = self._entries.pop(next(iter(self._entries)))
+                self.size -= evicted.size
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
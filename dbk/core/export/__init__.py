@@ -0,0 +1,214 @@
+"""
+Exports of the transactions of a book, to CSV or JSON Lines, for other tools. Rows
+are streamed from the database in batches and written as they arrive, in the order
+of the book's time index, so an export holds one batch in memory no matter how
+large the book is.
+"""
+
+import csv
+import enum
+import json
+from dataclasses import dataclass, fields
+from datetime import date, datetime, time, timedelta
+from typing import Iterator, TextIO
+
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+from dbk.core import models
+from dbk.errors import DbkError
+
+BATCH_SIZE = 1000
+"""Number of rows fetched from the database at a time."""
+
+PATH_SEPARATOR = ":"
+
+
+class ExportFormat(enum.StrEnum):
+    csv = "csv"
+    jsonl = "jsonl"
+
+
+class AccountNotFound(DbkError):
+    pass
+
+
+@dataclass(frozen=True, slots=True)
+class ExportRow:
+    id: int
+    time: datetime
+    type: models.TransactionType
+    description: str
+    user_description: str | None
+    credit_account: str | None
+    """Path of the credited account, e.g. "Assets:Checking"."""
+    debit_account: str | None
+    credit_amount: float | None
+    debit_amount: float | None
+    currency: str
+    external_ref: str | None
+
+
+_columns = [f.name for f in fields(ExportRow)]
+
+
+@dataclass(frozen=True, slots=True)
+class _Account:
+    path: str
+    currency: str | None
+
+
+def _accounts(session: orm.Session, book_id: int) -> dict[int, _Account]:
+    """The accounts of the book, with their paths from the root of their tree."""
+    A = models.Account
+    stmt = sa.select(A.id, A.parent_id, A.name, A.currency).where(A.book_id == book_id)
+    rows = {
+        id: (parent_id, name, cur) for id, parent_id, name, cur in session.execute(stmt)
+    }
+
+    paths: dict[int, str] = {}
+
+    def path(account_id: int) -> str:
+        if account_id not in paths:
+            parent_id, name, _ = rows[account_id]
+            paths[account_id] = (
+                name if parent_id is None else path(parent_id) + PATH_SEPARATOR + name
+            )
+        return paths[account_id]
+
+    return {id: _Account(path(id), cur) for id, (_, _, cur) in rows.items()}
+
+
+def find_account(session: orm.Session, book_id: int, path: str) -> int:
+    """
+    Id of the account of the book at `path`, like "Expenses:Food".
+
+    :raises AccountNotFound: if there is no such account
+    """
+    for id, account in _accounts(session, book_id).items():
+        if account.path == path:
+            return id
+    raise AccountNotFound(f"Account {path} does not exist.")
+
+
+def statement(
+    book_id: int,
+    start: date | None = None,
+    end: date | None = None,
+    account_id: int | None = None,
+):
+    """
+    Query for the transactions of a book, oldest first.
+
+    :param start: first day of transactions to export
+    :param end: last day of transactions to export
+    :param account_id: only export the transactions of this account, or of the
+        accounts under it
+    """
+    T = models.Transaction
+    stmt = sa.select(
+        T.id,
+        T.time,
+        T.type,
+        T.description,
+        T.user_description,
+        T.credit_account_id,
+        T.debit_account_id,
+        T.credit_units,
+        T.debit_units,
+        T.amount_exponent,
+        T.external_ref,
+    ).where(T.book_id == book_id)
+    if start is not None:
+        stmt = stmt.where(T.time >= datetime.combine(start, time()))
+    if end is not None:
+        stmt = stmt.where(T.time < datetime.combine(end + timedelta(days=1), time()))
+    if account_id is not None:
+        subtree = models.AccountClosure.subtree(account_id)
+        stmt = stmt.where(
+            sa.or_(T.credit_account_id.in_(subtree), T.debit_account_id.in_(subtree))
+        )
+    # the order of ix_transactions_book_time, so rows stream without a sort
+    return stmt.order_by(T.time, T.id)
+
+
+def transactions(
+    session: orm.Session,
+    book_id: int,
+    start: date | None = None,
+    end: date | None = None,
+    account_id: int | None = None,
+) -> Iterator[ExportRow]:
+    """The transactions of a book, oldest first, see `statement`."""
+    book_currency = session.scalar(
+        sa.select(models.Book.currency).where(models.Book.id == book_id)
+    )
+    accounts = _accounts(session, book_id)
+    none = _Account(path="", currency=None)
+
+    stmt = statement(book_id, start, end, account_id)
+    result = session.execute(stmt.execution_options(yield_per=BATCH_SIZE))
+    for r in result:
+        credit = accounts.get(r.credit_account_id, none)
+        debit = accounts.get(r.debit_account_id, none)
+        yield ExportRow(
+            id=r.id,
+            time=r.time,
+            type=r.type,
+            description=r.description,
+            user_description=r.user_description,
+            credit_account=credit.path or None,
+            debit_account=debit.path or None,
+            credit_amount=models.from_units(r.credit_units, r.amount_exponent),
+            debit_amount=models.from_units(r.debit_units, r.amount_exponent),
+            currency=credit.currency or debit.currency or book_currency or "",
+            external_ref=r.external_ref,
+        )
+
+
+def _value(v):
+    if isinstance(v, datetime):
+        return v.isoformat()
+    return v
+
+
+def write_csv(rows: Iterator[ExportRow], out: TextIO) -> int:
+    """Writes the rows as CSV with a header, returning the number of rows."""
+    writer = csv.writer(out)
+    writer.writerow(_columns)
+    n = 0
+    for row in rows:
+        values = (getattr(row, c) for c in _columns)
+        writer.writerow(["" if v is None else _value(v) for v in values])
+        n += 1
+    return n
+
+
+def write_jsonl(rows: Iterator[ExportRow], out: TextIO) -> int:
+    """Writes the rows as one JSON object per line, returning the number of rows."""
+    n = 0
+    for row in rows:
+        obj = {c: _value(getattr(row, c)) for c in _columns}
+        out.write(json.dumps(obj, ensure_ascii=False))
+        out.write("\n")
+        n += 1
+    return n
+
+
+def export(
+    session: orm.Session,
+    book_id: int,
+    out: TextIO,
+    format: ExportFormat = ExportFormat.csv,
+    **filters,
+) -> int:
+    """
+    Writes the transactions of a book to `out`, returning the number written.
+    `filters` are those of `statement`.
+    """
+    rows = transactions(session, book_id, **filters)
+    match format:
+        case ExportFormat.csv:
+            return write_csv(rows, out)
+        case ExportFormat.jsonl:
+            return write_jsonl(rows, out)
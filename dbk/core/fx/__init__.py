@@ -0,0 +1,183 @@
+"""
+Conversion of amounts between currencies, with exchange rates imported from CSV
+files into `fx_rates`.
+
+The rates into a currency are loaded once into `Rates`, sorted by (currency, day)
+and packed into one array of integer keys. Converting an array of amounts is then a
+merge-asof on those keys: one `searchsorted` finds, for every amount, the last rate
+of its currency on or before its day, whatever the number of amounts or currencies.
+"""
+
+import csv
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import numpy as np
+import sqlalchemy as sa
+import sqlalchemy.dialects.sqlite as sa_sqlite
+import sqlalchemy.orm as orm
+
+from dbk.core import models
+from dbk.errors import DbkError
+
+INSERT_BATCH = 5000
+"""Number of rates written per statement by `import_rates`."""
+
+_DAY_BITS = 32
+_DAY_OFFSET = 1 << (_DAY_BITS - 1)
+"""Added to days since the epoch, so days before it still sort as keys."""
+
+
+class InvalidRateFile(DbkError):
+    pass
+
+
+def read_rate_file(
+    path: Path, base: str | None = None, quote: str | None = None
+) -> Iterator[models.FxRate]:
+    """
+    Rates in a CSV file with a header, with a `date` column, a `rate` or `close`
+    column, and `base` and `quote` columns unless `base` and `quote` are given.
+
+    :raises InvalidRateFile: if a column is missing or a row is malformed
+    """
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        columns = {c.strip().lower(): c for c in reader.fieldnames or []}
+        day_column = columns.get("date")
+        rate_column = columns.get("rate") or columns.get("close")
+        base_column = columns.get("base")
+        quote_column = columns.get("quote")
+        if not day_column or not rate_column:
+            raise InvalidRateFile(f"{path} needs a date and a rate or close column.")
+        if not (base or base_column) or not (quote or quote_column):
+            raise InvalidRateFile(f"{path} has no base or quote column, specify them.")
+
+        for n, row in enumerate(reader, start=2):
+            try:
+                rate = float(row[rate_column])
+                if not rate > 0:
+                    raise ValueError(f"rate {rate} is not positive")
+                yield models.FxRate(
+                    base=(base or row[base_column]).strip().upper(),  # type: ignore
+                    quote=(quote or row[quote_column]).strip().upper(),  # type: ignore
+                    day=date.fromisoformat(row[day_column].strip()),
+                    rate=rate,
+                )
+            except (AttributeError, TypeError, ValueError) as e:
+                raise InvalidRateFile(f"{path}, line {n}: {e}") from e
+
+
+def import_rates(session: orm.Session, rates: Iterable[models.FxRate]) -> int:
+    """Adds the rates, replacing those of the same currencies and day."""
+    stmt = sa_sqlite.insert(models.FxRate)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["base", "quote", "day"], set_={"rate": stmt.excluded.rate}
+    )
+    n = 0
+    batch = []
+    for r in rates:
+        batch.append(dict(base=r.base, quote=r.quote, day=r.day, rate=r.rate))
+        if len(batch) == INSERT_BATCH:
+            session.execute(stmt, batch)
+            n += len(batch)
+            batch = []
+    if batch:
+        session.execute(stmt, batch)
+        n += len(batch)
+    return n
+
+
+def _keys(codes: np.ndarray, days: np.ndarray) -> np.ndarray:
+    days = days.astype("datetime64[D]").astype(np.int64) + _DAY_OFFSET
+    return (codes.astype(np.int64) << _DAY_BITS) | days
+
+
+@dataclass(frozen=True, eq=False)
+class Rates:
+    """
+    Rates of currencies into `target`. A rate is taken as quoted into `target`, or
+    as the inverse of a rate quoted from it; there is no conversion through a third
+    currency.
+    """
+
+    target: str
+    """Upper case, like all currencies of rates."""
+    currencies: list[str]
+    """Currencies with rates, by their code in `codes`."""
+    keys: np.ndarray
+    """Code of the currency and day of each rate, sorted, see `_keys`."""
+    rates: np.ndarray
+
+    def codes(self, currencies: Iterable[str]) -> np.ndarray:
+        """
+        Codes of the currencies, in any case, -1 for `target` and -2 for ones without
+        rates.
+        """
+        index = {c: i for i, c in enumerate(self.currencies)}
+        index[self.target] = -1
+        return np.array([index.get(c.upper(), -2) for c in currencies], np.int64)
+
+    def factors(self, codes: np.ndarray, days: np.ndarray) -> np.ndarray:
+        """
+        The rate of each currency, by code, as of each day: the last one on or
+        before it, 1 for `target`, or nan if there is none.
+        """
+        codes = np.asarray(codes, np.int64)
+        keys = _keys(np.maximum(codes, 0), np.asarray(days))
+        i = np.searchsorted(self.keys, keys, side="right") - 1
+        found = i >= 0
+        i = np.maximum(i, 0)
+        if len(self.keys):
+            found &= (self.keys[i] >> _DAY_BITS) == codes
+            factors = np.where(found, self.rates[i], np.nan)
+        else:
+            factors = np.full(len(codes), np.nan)
+        return np.where(codes == -1, 1.0, factors)
+
+    def convert(
+        self, amounts: np.ndarray, currencies: np.ndarray, days: np.ndarray
+    ) -> np.ndarray:
+        """
+        The amounts in `target`, at the rates as of their days, nan for amounts
+        without a rate.
+
+        :param currencies: codes of the currencies of the amounts, see `codes`
+        :param days: days of the amounts, as datetime64
+        """
+        return np.asarray(amounts, np.float64) * self.factors(currencies, days)
+
+
+def rates(session: orm.Session, target: str) -> Rates:
+    """All the rates into `target`, direct or inverse."""
+    # imported rates are upper case, like the codes of `models.currency_exponent`
+    target = target.upper()
+    R = models.FxRate
+    stmt = sa.select(R.base, R.quote, R.day, R.rate).where(
+        sa.or_(R.quote == target, R.base == target), R.base != R.quote
+    )
+    by_day: dict[tuple[str, date], float] = {}
+    inverse: dict[tuple[str, date], float] = {}
+    for base, quote, day, rate in session.execute(stmt):
+        if quote == target:
+            by_day[base, day] = rate
+        else:
+            inverse[quote, day] = 1 / rate
+    # a rate quoted into the target wins over the inverse of one out of it
+    for key, rate in inverse.items():
+        by_day.setdefault(key, rate)
+
+    currencies = sorted({c for c, _ in by_day})
+    index = {c: i for i, c in enumerate(currencies)}
+    codes = np.array([index[c] for c, _ in by_day], np.int64)
+    days = np.array([d for _, d in by_day], "datetime64[D]")
+    keys = _keys(codes, days)
+    order = np.argsort(keys)
+    return Rates(
+        target=target,
+        currencies=currencies,
+        keys=keys[order],
+        rates=np.array(list(by_day.values()), np.float64)[order],
+    )
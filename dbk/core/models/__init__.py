@@ -3,9 +3,41 @@ from ._models import (
     Book,
     Connection,
     DataSource,
+    DataSourceBlob,
     DataSourceType,
     Account,
     Transaction,
     AccountType,
     TransactionType,
+    CountScope,
+    TransactionCount,
+    AccountDailyBalance,
+    AccountBalanceDirty,
+    AccountClosure,
+    TransactionDayChange,
+    Price,
+    FxRate,
+    DataVersion,
+)
+from ._types import (
+    DEFAULT_EXPONENT,
+    EXPONENTS,
+    EpochTime,
+    InexactAmount,
+    currency_exponent,
+    from_units,
+    to_units,
+)
+from ._triggers import (
+    create_triggers,
+    rebuild_account_closure,
+    rebuild_daily_balances,
+    rebuild_transaction_counts,
+    refresh_daily_balances,
+)
+from ._search import (
+    matches,
+    rebuild_search_index,
+    search_expression,
+    transactions_fts,
 )
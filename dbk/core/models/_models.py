@@ -1,12 +1,20 @@
 import enum
-from datetime import datetime
-from typing import Any, Sequence
+from datetime import date, datetime
+from typing import Any, ClassVar, Sequence
 
 import sqlalchemy as sa
 import sqlalchemy.orm as orm
 from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.ext.hybrid import hybrid_property
 
+from ._types import (
+    DEFAULT_EXPONENT,
+    EpochTime,
+    from_units,
+    to_units,
+    units_scale,
+)
+
 
 class _Base:
     @property
@@ -21,8 +29,42 @@ class Base(orm.DeclarativeBase, _Base):
     pass
 
 
-class Book(Base):
+class CountScope(enum.StrEnum):
+    all = "all"
+    book = "book"
+    connection = "connection"
+    source = "source"
+    account = "account"
+
+
+class _ContainsTransactions(_Base):
+    id: orm.Mapped[int]
+    count_scope: ClassVar[CountScope]
+
+    @declared_attr
+    def num_transactions(self) -> orm.Mapped[int]:
+        return orm.query_expression()  # type: ignore
+
+    @classmethod
+    def num_transactions_expr(cls, uncategorized: bool = False):
+        count = (
+            TransactionCount.uncategorized if uncategorized else TransactionCount.total
+        )
+        return sa.func.coalesce(
+            sa.select(count)
+            .where(
+                TransactionCount.scope == cls.count_scope,
+                TransactionCount.key_id == cls.id,
+            )
+            .correlate_except(TransactionCount)
+            .scalar_subquery(),
+            0,
+        )
+
+
+class Book(Base, _ContainsTransactions):
     __tablename__ = "books"
+    count_scope = CountScope.book
     id: orm.Mapped[int] = orm.mapped_column(primary_key=True)
     name: orm.Mapped[str] = orm.mapped_column(unique=True)
 
@@ -43,25 +85,9 @@ class Book(Base):
         ).all()
 
 
-class _ContainsTransactions(_Base):
-    id: orm.Mapped[int]
-
-    @declared_attr
-    def num_transactions(self) -> orm.Mapped[int]:
-        return orm.query_expression()  # type: ignore
-
-    @classmethod
-    def num_transactions_expr(cls, crit):
-        return (
-            sa.select(sa.func.count(Transaction.id))
-            .where(crit == cls.id)
-            .correlate_except(Transaction)
-            .scalar_subquery()
-        )
-
-
 class Connection(Base, _ContainsTransactions):
     __tablename__ = "connections"
+    count_scope = CountScope.connection
     __table_args__ = (
         sa.UniqueConstraint(
             "book_id",
@@ -91,6 +117,7 @@ class DataSourceType(enum.StrEnum):
 
 class DataSource(Base, _ContainsTransactions):
     __tablename__ = "data_sources"
+    count_scope = CountScope.source
     __table_args__ = (
         sa.UniqueConstraint(
             "conn_id",
@@ -107,11 +134,28 @@ class DataSource(Base, _ContainsTransactions):
     type: orm.Mapped[DataSourceType]
     hash: orm.Mapped[str | None]
     last_synced: orm.Mapped[datetime | None]
+    """When the data source was completely synced."""
     last_sync_error: orm.Mapped[str | None]
+    sync_row: orm.Mapped[int | None]
+    """Number of rows written by an unfinished sync."""
+    sync_offset: orm.Mapped[int | None]
+    """Stream position after the last row written by an unfinished sync, if known."""
 
     connection: orm.Mapped[Connection] = orm.relationship()
 
 
+class DataSourceBlob(Base):
+    """Contents of a file data source, when they are stored in the database."""
+
+    __tablename__ = "data_source_blobs"
+    source_id: orm.Mapped[int] = orm.mapped_column(
+        sa.ForeignKey(DataSource.id, ondelete="cascade"),
+        primary_key=True,
+    )
+    size: orm.Mapped[int]
+    data: orm.Mapped[bytes] = orm.mapped_column(sa.LargeBinary, deferred=True)
+
+
 class AccountType(enum.StrEnum):
     asset = "asset"
     liability = "liability"
@@ -119,8 +163,9 @@ class AccountType(enum.StrEnum):
     expense = "expense"
 
 
-class Account(Base):
+class Account(Base, _ContainsTransactions):
     __tablename__ = "accounts"
+    count_scope = CountScope.account
     __table_args__ = (
         sa.UniqueConstraint(
             "book_id",
@@ -142,10 +187,10 @@ class Account(Base):
     currency: orm.Mapped[str | None]
     """Currency of this account. Cannot be None if this account is not a group."""
     parent_id: orm.Mapped[int | None] = orm.mapped_column(
-        sa.ForeignKey("accounts.id", ondelete="cascade")
+        sa.ForeignKey("accounts.id", ondelete="cascade"), index=True
     )
     conn_id: orm.Mapped[int | None] = orm.mapped_column(
-        sa.ForeignKey(Connection.id, ondelete="cascade")
+        sa.ForeignKey(Connection.id, ondelete="cascade"), index=True
     )
     conn_label: orm.Mapped[str | None]
     """Label assigned by a connection provider to identify this account."""
@@ -171,25 +216,96 @@ class Account(Base):
         return self.parent_id is None and self.is_root == False
 
 
+class AccountClosure(Base):
+    """
+    Every account paired with each account under it, at any depth, and with itself at
+    depth 0, kept up to date by triggers on the accounts table. A subtree is the rows
+    of its top account, so rolling up a category is one indexed join instead of a walk
+    down the tree.
+    """
+
+    __tablename__ = "account_closure"
+    ancestor_id: orm.Mapped[int] = orm.mapped_column(
+        sa.ForeignKey(Account.id, ondelete="cascade"),
+        primary_key=True,
+    )
+    descendant_id: orm.Mapped[int] = orm.mapped_column(
+        sa.ForeignKey(Account.id, ondelete="cascade"),
+        primary_key=True,
+        index=True,
+    )
+    depth: orm.Mapped[int]
+    """Number of levels from the ancestor down to the descendant."""
+
+    @classmethod
+    def subtree(cls, account_id: int, include_self: bool = True):
+        """Query for the ids of the account and all accounts under it."""
+        stmt = sa.select(cls.descendant_id).where(cls.ancestor_id == account_id)
+        if not include_self:
+            stmt = stmt.where(cls.depth > 0)
+        return stmt
+
+
 class TransactionType(enum.StrEnum):
     unknown = "unknown"
     transfer = "transfer"
     receive = "receive"
     spend = "spend"
     trade = "trade"
+    """
+    Exchange of an instrument and cash. The quantity of the instrument is stored in
+    units of the transaction's `amount_exponent`, like the cash, so quantities with
+    more decimals are rejected rather than rounded, see `Transaction.credit_amount`.
+    """
+
+
+_uncategorized = sa.text("credit_account_id IS NULL OR debit_account_id IS NULL")
+"""
+Condition of the partial indexes on uncategorized transactions. SQLite only uses them
+for queries whose WHERE clause contains this exact term.
+"""
 
 
 class Transaction(Base):
     __tablename__ = "transactions"
     __table_args__ = (
-        sa.UniqueConstraint(
+        # Transactions without a reference from the provider are considered
+        # duplicates when they look the same.
+        sa.Index(
+            "unique_transaction_per_connection",
             "conn_id",
             "time",
             "description",
-            "credit_amount",
-            "debit_amount",
-            name="unique_transaction_per_connection",
-            sqlite_on_conflict="IGNORE",
+            "credit_units",
+            "debit_units",
+            unique=True,
+            sqlite_where=sa.text("external_ref IS NULL"),
+        ),
+        # Otherwise the reference is the exact key.
+        sa.Index(
+            "unique_external_ref_per_connection",
+            "conn_id",
+            "external_ref",
+            unique=True,
+            sqlite_where=sa.text("external_ref IS NOT NULL"),
+        ),
+        # Listing transactions newest first, in a book or across all of them.
+        sa.Index("ix_transactions_book_time", "book_id", "time", "id"),
+        sa.Index("ix_transactions_time", "time", "id"),
+        # Uncategorized transactions are what rules run on and what the user works
+        # through, and usually a small part of the table.
+        sa.Index(
+            "ix_transactions_uncategorized_book_time",
+            "book_id",
+            "time",
+            "id",
+            sqlite_where=_uncategorized,
+        ),
+        sa.Index(
+            "ix_transactions_uncategorized_time",
+            "time",
+            "id",
+            sqlite_where=_uncategorized,
         ),
     )
 
@@ -198,27 +314,37 @@ class Transaction(Base):
         sa.ForeignKey(Book.id, ondelete="cascade"),
     )
     conn_id: orm.Mapped[int | None] = orm.mapped_column(
-        sa.ForeignKey(Connection.id, ondelete="cascade")
+        sa.ForeignKey(Connection.id, ondelete="cascade"), index=True
     )
     source_id: orm.Mapped[int | None] = orm.mapped_column(
-        sa.ForeignKey(DataSource.id, ondelete="cascade")
+        sa.ForeignKey(DataSource.id, ondelete="cascade"), index=True
     )
     credit_account_id: orm.Mapped[int | None] = orm.mapped_column(
         sa.ForeignKey(Account.id, ondelete="cascade"),
+        index=True,
     )
     debit_account_id: orm.Mapped[int | None] = orm.mapped_column(
         sa.ForeignKey(Account.id, ondelete="cascade"),
+        index=True,
     )
     duplicate_id: orm.Mapped[int | None] = orm.mapped_column(
-        sa.ForeignKey("transactions.id")
+        sa.ForeignKey("transactions.id"), index=True
     )
     type: orm.Mapped[TransactionType]
-    time: orm.Mapped[datetime]
+    time: orm.Mapped[datetime] = orm.mapped_column(EpochTime)
     description: orm.Mapped[str]
     user_description: orm.Mapped[str | None]
-    credit_amount: orm.Mapped[float | None]
-    debit_amount: orm.Mapped[float | None]
+    credit_units: orm.Mapped[int | None]
+    """Credit amount in minor units of the currency, see `credit_amount`."""
+    debit_units: orm.Mapped[int | None]
+    """Debit amount in minor units of the currency, see `debit_amount`."""
+    amount_exponent: orm.Mapped[int] = orm.mapped_column(default=DEFAULT_EXPONENT)
+    """
+    Decimals of the currency of the amounts, from the account the transaction was
+    imported into, e.g. 2 when 1234 units are 12.34.
+    """
     external_ref: orm.Mapped[str | None]
+    """Identifier assigned by the provider, e.g. the FITID of an OFX transaction."""
 
     credit_account: orm.Mapped[Account | None] = orm.relationship(
         foreign_keys=[credit_account_id]
@@ -226,3 +352,193 @@ class Transaction(Base):
     debit_account: orm.Mapped[Account | None] = orm.relationship(
         foreign_keys=[debit_account_id]
     )
+
+    def __init__(self, **kwargs: Any):
+        # the amounts are encoded with the exponent and checked by the type, so both
+        # have to be set first
+        for name in ("amount_exponent", "type"):
+            if name in kwargs:
+                setattr(self, name, kwargs.pop(name))
+        super().__init__(**kwargs)
+
+    def _exponent(self) -> int:
+        if self.amount_exponent is None:
+            return DEFAULT_EXPONENT
+        return self.amount_exponent
+
+    @staticmethod
+    def _exact(transaction_type: TransactionType | str | None) -> bool:
+        """Whether amounts of the type must not be rounded: quantities of trades."""
+        return transaction_type == TransactionType.trade
+
+    @classmethod
+    def _units_expression(cls, amount: float | None):
+        """SQL for `to_units` of an amount, for bulk updates of many rows."""
+        if amount is None:
+            return None
+        scaled = sa.literal(amount) * units_scale(cls.amount_exponent)
+        return sa.cast(sa.func.round(scaled), sa.Integer)
+
+    @hybrid_property
+    def credit_amount(self) -> float | None:
+        return from_units(self.credit_units, self._exponent())
+
+    @credit_amount.inplace.setter
+    def _credit_amount_setter(self, value: float | None):
+        self.credit_units = to_units(value, self._exponent(), self._exact(self.type))
+
+    @credit_amount.inplace.expression
+    @classmethod
+    def _credit_amount_expression(cls):
+        return cls.credit_units * 1.0 / units_scale(cls.amount_exponent)
+
+    @credit_amount.inplace.update_expression
+    @classmethod
+    def _credit_amount_update(cls, value: float | None):
+        return [(cls.credit_units, cls._units_expression(value))]
+
+    @credit_amount.inplace.bulk_dml
+    @classmethod
+    def _credit_amount_bulk_dml(cls, mapping: dict[str, Any], value: float | None):
+        exponent = mapping.get("amount_exponent", DEFAULT_EXPONENT)
+        exact = cls._exact(mapping.get("type"))
+        mapping["credit_units"] = to_units(value, exponent, exact)
+
+    @hybrid_property
+    def debit_amount(self) -> float | None:
+        return from_units(self.debit_units, self._exponent())
+
+    @debit_amount.inplace.setter
+    def _debit_amount_setter(self, value: float | None):
+        self.debit_units = to_units(value, self._exponent(), self._exact(self.type))
+
+    @debit_amount.inplace.expression
+    @classmethod
+    def _debit_amount_expression(cls):
+        return cls.debit_units * 1.0 / units_scale(cls.amount_exponent)
+
+    @debit_amount.inplace.update_expression
+    @classmethod
+    def _debit_amount_update(cls, value: float | None):
+        return [(cls.debit_units, cls._units_expression(value))]
+
+    @debit_amount.inplace.bulk_dml
+    @classmethod
+    def _debit_amount_bulk_dml(cls, mapping: dict[str, Any], value: float | None):
+        exponent = mapping.get("amount_exponent", DEFAULT_EXPONENT)
+        exact = cls._exact(mapping.get("type"))
+        mapping["debit_units"] = to_units(value, exponent, exact)
+
+
+class TransactionCount(Base):
+    """
+    Number of transactions in each book, connection, data source and account, and
+    in all books, kept up to date by triggers on the transactions table.
+    """
+
+    __tablename__ = "transaction_counts"
+    scope: orm.Mapped[CountScope] = orm.mapped_column(primary_key=True)
+    key_id: orm.Mapped[int] = orm.mapped_column(primary_key=True)
+    """Id of the counted book, connection, data source or account, 0 for `all`."""
+    total: orm.Mapped[int] = orm.mapped_column(default=0)
+    uncategorized: orm.Mapped[int] = orm.mapped_column(default=0)
+    """Transactions with a credit or debit account missing."""
+
+
+class AccountDailyBalance(Base):
+    """
+    Net change and closing balance of an account on each day it has transactions,
+    kept up to date by triggers on the transactions table. Amounts are in minor units,
+    like `Transaction.credit_units`, and positive when the account is debited. The
+    triggers only update `net_change`, and mark the account in `AccountBalanceDirty`;
+    `balance` is brought up to date lazily by `refresh_daily_balances`.
+    """
+
+    __tablename__ = "account_daily_balances"
+    account_id: orm.Mapped[int] = orm.mapped_column(
+        sa.ForeignKey(Account.id, ondelete="cascade"),
+        primary_key=True,
+    )
+    day: orm.Mapped[date] = orm.mapped_column(primary_key=True)
+    net_change: orm.Mapped[int] = orm.mapped_column(default=0)
+    balance: orm.Mapped[int] = orm.mapped_column(default=0)
+    """Sum of `net_change` up to and including the day."""
+
+
+class AccountBalanceDirty(Base):
+    """Accounts whose balances are out of date, from a day onwards."""
+
+    __tablename__ = "account_balance_dirty"
+    account_id: orm.Mapped[int] = orm.mapped_column(
+        sa.ForeignKey(Account.id, ondelete="cascade"),
+        primary_key=True,
+    )
+    from_day: orm.Mapped[date]
+
+
+class TransactionDayChange(Base):
+    """
+    Days of each book whose transactions were added, removed or changed, with the
+    `version` of the latest change, which grows with every change to any book. Caches
+    of aggregates by day remember the highest version they have seen, and recompute
+    only the days changed since. Kept up to date by triggers on the transactions
+    table.
+    """
+
+    __tablename__ = "transaction_day_changes"
+    __table_args__ = (sa.Index("ix_transaction_day_changes_version", "version"),)
+
+    # no foreign key: rows of a deleted book stay, so versions never go back
+    book_id: orm.Mapped[int] = orm.mapped_column(primary_key=True)
+    day: orm.Mapped[date] = orm.mapped_column(primary_key=True)
+    version: orm.Mapped[int]
+
+
+class Price(Base):
+    """
+    Closing price of an instrument on a day, as imported from price files.
+    Instruments are named like the currency of the accounts that hold them, e.g. an
+    account in "VTI" holds shares of VTI.
+    """
+
+    __tablename__ = "prices"
+    # the key is the table, and one B-tree is half the size of a table and an index
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    instrument: orm.Mapped[str] = orm.mapped_column(primary_key=True)
+    day: orm.Mapped[date] = orm.mapped_column(primary_key=True)
+    price: orm.Mapped[float]
+    currency: orm.Mapped[str | None] = orm.mapped_column(default=None)
+    """Currency of the price, upper case, None for that of the book valuing it."""
+
+
+class FxRate(Base):
+    """
+    Exchange rate on a day: one unit of `base` is worth `rate` units of `quote`, as
+    imported from rate files.
+    """
+
+    __tablename__ = "fx_rates"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    base: orm.Mapped[str] = orm.mapped_column(primary_key=True)
+    quote: orm.Mapped[str] = orm.mapped_column(primary_key=True)
+    day: orm.Mapped[date] = orm.mapped_column(primary_key=True)
+    rate: orm.Mapped[float]
+
+
+class DataVersion(Base):
+    """
+    Version of the data of each book, which grows whenever its transactions, its
+    accounts or the book itself change. `book_id` 0 is the version of the data that
+    all books share, prices and exchange rates. Versions are taken from one
+    counter for all books, so the version of a book's view of the data is the
+    highest of its own and the shared one, see `dbk.core.cache.data_version`. Kept
+    up to date by triggers.
+    """
+
+    __tablename__ = "data_versions"
+
+    # no foreign key: like transaction_day_changes, a deleted book's version stays
+    book_id: orm.Mapped[int] = orm.mapped_column(primary_key=True)
+    version: orm.Mapped[int]
@@ -0,0 +1,132 @@
+"""
+Full-text search over the descriptions of transactions, with an FTS5 table that
+indexes the `transactions` table without keeping a copy of the text. Triggers keep
+the index in step with the transactions.
+"""
+
+import sqlalchemy as sa
+
+from ._models import Transaction
+from ._triggers import trigger
+
+_metadata = sa.MetaData()
+
+transactions_fts = sa.Table(
+    "transactions_fts",
+    _metadata,
+    sa.Column("rowid", sa.Integer, primary_key=True),
+    sa.Column("description", sa.String),
+    sa.Column("user_description", sa.String),
+    sa.Column("rank", sa.Float),
+)
+"""
+The search index, for queries. Its `rowid` is the id of the transaction, and `rank`
+is the bm25 relevance of a match, lower is better.
+"""
+
+_create = """
+    CREATE VIRTUAL TABLE transactions_fts USING fts5(
+        description,
+        user_description,
+        content='transactions',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """
+
+
+def create_search_index(conn: sa.Connection):
+    conn.exec_driver_sql(_create)
+
+
+def rebuild_search_index(conn: sa.Connection):
+    """Indexes all transactions again, e.g. to fill the index when it is added."""
+    conn.exec_driver_sql(
+        "INSERT INTO transactions_fts (transactions_fts) VALUES ('rebuild')"
+    )
+
+
+def search_expression(text: str) -> str | None:
+    """
+    FTS5 query for the words of `text`, as the user typed them: transactions match
+    when they have all the words, or words starting with them. None if there are
+    no words.
+    """
+    words = [w.replace('"', "") for w in text.split()]
+    terms = [f'"{w}"*' for w in words if w]
+    return " ".join(terms) or None
+
+
+def matches(expression: str) -> sa.ColumnElement[bool]:
+    """Condition on `transactions_fts` for rows that match an FTS5 query."""
+    return sa.literal_column(transactions_fts.name).match(expression)
+
+
+_transactions = Transaction.__table__
+
+sa.event.listen(
+    _transactions,
+    "after_create",
+    lambda target, conn, **kwargs: create_search_index(conn),
+)
+sa.event.listen(
+    _transactions,
+    "before_drop",
+    lambda target, conn, **kwargs: conn.exec_driver_sql(
+        "DROP TABLE IF EXISTS transactions_fts"
+    ),
+)
+
+
+def _index(row: str) -> str:
+    return f"""
+        INSERT INTO transactions_fts (rowid, description, user_description)
+        VALUES ({row}.id, {row}.description, {row}.user_description);
+    """
+
+
+def _unindex(row: str) -> str:
+    return f"""
+        INSERT INTO transactions_fts
+            (transactions_fts, rowid, description, user_description)
+        VALUES ('delete', {row}.id, {row}.description, {row}.user_description);
+    """
+
+
+trigger(
+    _transactions,  # type: ignore
+    "transactions_fts_insert",
+    f"""
+    CREATE TRIGGER transactions_fts_insert AFTER INSERT ON transactions
+    BEGIN
+        {_index("NEW")}
+    END
+    """,
+    requires=("transactions_fts",),
+)
+
+trigger(
+    _transactions,  # type: ignore
+    "transactions_fts_delete",
+    f"""
+    CREATE TRIGGER transactions_fts_delete AFTER DELETE ON transactions
+    BEGIN
+        {_unindex("OLD")}
+    END
+    """,
+    requires=("transactions_fts",),
+)
+
+trigger(
+    _transactions,  # type: ignore
+    "transactions_fts_update",
+    f"""
+    CREATE TRIGGER transactions_fts_update
+    AFTER UPDATE OF description, user_description ON transactions
+    BEGIN
+        {_unindex("OLD")}
+        {_index("NEW")}
+    END
+    """,
+    requires=("transactions_fts",),
+)
@@ -0,0 +1,444 @@
+"""
+SQLite triggers that keep derived tables, like `transaction_counts` and
+`account_daily_balances`, in step with the tables they are derived from. Triggers are
+created with their table by `create_all`, and migrations bring existing databases to
+the current definitions with `create_triggers`.
+"""
+
+from dataclasses import dataclass
+
+import sqlalchemy as sa
+
+from ._models import Account, Book, FxRate, Price, Transaction
+
+
+@dataclass(frozen=True)
+class Trigger:
+    name: str
+    table: str
+    sql: str
+    requires: tuple[str, ...] = ()
+    """
+    Other tables the trigger writes to, and columns it uses as `table.column`, it is
+    only created once they exist.
+    """
+
+
+_triggers: dict[str, Trigger] = {}
+
+
+def trigger(table: sa.Table, name: str, sql: str, requires: tuple[str, ...] = ()):
+    """Registers a trigger on `table`, created whenever the table is created."""
+    _triggers[name] = Trigger(name, table.name, sql, requires)
+    sa.event.listen(
+        table,
+        "after_create",
+        lambda target, conn, **kwargs: conn.exec_driver_sql(sql),
+    )
+
+
+def create_triggers(conn: sa.Connection):
+    """Recreates the triggers of all existing tables from their current definition."""
+    inspector = sa.inspect(conn)
+    tables = set(inspector.get_table_names())
+    columns: dict[str, set[str]] = {}
+
+    def exists(name: str) -> bool:
+        table, _, column = name.partition(".")
+        if table not in tables:
+            return False
+        if column and table not in columns:
+            columns[table] = {c["name"] for c in inspector.get_columns(table)}
+        return not column or column in columns[table]
+
+    for t in _triggers.values():
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {t.name}")
+        # a migration before the one adding what a trigger requires must not create
+        # it: SQLite checks triggers against the schema when renaming tables, and
+        # fails writes to their table
+        if t.table in tables and all(exists(r) for r in t.requires):
+            conn.exec_driver_sql(t.sql)
+
+
+def _count(row: str, sign: str) -> str:
+    """Adds the transaction `row`, NEW or OLD, to its counters, or subtracts it."""
+    uncategorized = (
+        f"({row}.credit_account_id IS NULL OR {row}.debit_account_id IS NULL)"
+    )
+    return f"""
+        INSERT INTO transaction_counts (scope, key_id, total, uncategorized)
+        SELECT scope, key_id, {sign}1, {sign}{uncategorized} FROM (
+            SELECT 'all' AS scope, 0 AS key_id
+            UNION ALL SELECT 'book', {row}.book_id
+            UNION ALL SELECT 'connection', {row}.conn_id
+            UNION ALL SELECT 'source', {row}.source_id
+            UNION ALL SELECT 'account', {row}.credit_account_id
+            UNION ALL SELECT 'account', {row}.debit_account_id
+                WHERE {row}.debit_account_id IS NOT {row}.credit_account_id
+        )
+        WHERE key_id IS NOT NULL
+        ON CONFLICT (scope, key_id) DO UPDATE SET
+            total = total + excluded.total,
+            uncategorized = uncategorized + excluded.uncategorized;
+    """
+
+
+def rebuild_transaction_counts(conn: sa.Connection):
+    """Recounts all transactions, e.g. to fill `transaction_counts` when it is added."""
+    conn.exec_driver_sql("DELETE FROM transaction_counts")
+    # one pass per scope, each is an index scan on its column
+    for scope, column in [
+        ("book", "book_id"),
+        ("connection", "conn_id"),
+        ("source", "source_id"),
+    ]:
+        conn.exec_driver_sql(f"""
+            INSERT INTO transaction_counts (scope, key_id, total, uncategorized)
+            SELECT '{scope}', {column}, count(*),
+                sum(credit_account_id IS NULL OR debit_account_id IS NULL)
+            FROM transactions
+            WHERE {column} IS NOT NULL
+            GROUP BY {column}
+            """)
+    conn.exec_driver_sql("""
+        INSERT INTO transaction_counts (scope, key_id, total, uncategorized)
+        SELECT 'all', 0, count(*),
+            coalesce(sum(credit_account_id IS NULL OR debit_account_id IS NULL), 0)
+        FROM transactions
+        """)
+    conn.exec_driver_sql("""
+        INSERT INTO transaction_counts (scope, key_id, total, uncategorized)
+        SELECT 'account', account_id, count(*), sum(uncategorized) FROM (
+            SELECT credit_account_id AS account_id,
+                debit_account_id IS NULL AS uncategorized
+            FROM transactions
+            WHERE credit_account_id IS NOT NULL
+            UNION ALL
+            SELECT debit_account_id, credit_account_id IS NULL
+            FROM transactions
+            WHERE debit_account_id IS NOT NULL
+                AND debit_account_id IS NOT credit_account_id
+        )
+        GROUP BY account_id
+        """)
+
+
+def _day(column: str) -> str:
+    """Day of a transaction time, as stored in `account_daily_balances`."""
+    return f"date({column}, 'unixepoch')"
+
+
+def _change_balances(row: str, sign: str) -> str:
+    """Adds the amounts of the transaction `row` to its accounts' days, or subtracts."""
+    return f"""
+        INSERT INTO account_daily_balances (account_id, day, net_change, balance)
+        SELECT account_id, {_day(f"{row}.time")}, amount, 0 FROM (
+            SELECT {row}.debit_account_id AS account_id,
+                {sign}coalesce({row}.debit_units, 0) AS amount
+            UNION ALL SELECT {row}.credit_account_id,
+                -({sign}coalesce({row}.credit_units, 0))
+        )
+        -- the account is gone when its transactions are deleted by cascade
+        WHERE account_id IN (SELECT id FROM accounts)
+        ON CONFLICT (account_id, day) DO UPDATE SET
+            net_change = net_change + excluded.net_change;
+        INSERT INTO account_balance_dirty (account_id, from_day)
+        SELECT account_id, {_day(f"{row}.time")} FROM (
+            SELECT {row}.debit_account_id AS account_id
+            UNION ALL SELECT {row}.credit_account_id
+        )
+        WHERE account_id IN (SELECT id FROM accounts)
+        ON CONFLICT (account_id) DO UPDATE SET
+            from_day = min(from_day, excluded.from_day);
+    """
+
+
+def _change_day(row: str) -> str:
+    """Marks the day of the transaction `row` as changed, with the next version."""
+    return f"""
+        INSERT INTO transaction_day_changes (book_id, day, version)
+        SELECT {row}.book_id, {_day(f"{row}.time")},
+            coalesce((SELECT max(version) FROM transaction_day_changes), 0) + 1
+        WHERE true
+        ON CONFLICT (book_id, day) DO UPDATE SET version = excluded.version;
+    """
+
+
+def _bump_version(book_id: str) -> str:
+    """Moves the data version of the book `book_id`, 0 for shared data, to the next."""
+    return f"""
+        INSERT INTO data_versions (book_id, version)
+        SELECT {book_id}, coalesce((SELECT max(version) FROM data_versions), 0) + 1
+        WHERE true
+        ON CONFLICT (book_id) DO UPDATE SET version = excluded.version;
+    """
+
+
+def refresh_daily_balances(conn: sa.Connection):
+    """
+    Recomputes the running balances of the dirty accounts, from the first day that
+    changed, starting at the balance of the day before it.
+    """
+    conn.exec_driver_sql("""
+        UPDATE account_daily_balances AS b SET balance = w.balance
+        FROM (
+            SELECT c.account_id, c.day,
+                coalesce((
+                    SELECT p.balance FROM account_daily_balances AS p
+                    WHERE p.account_id = d.account_id AND p.day < d.from_day
+                    ORDER BY p.day DESC LIMIT 1
+                ), 0) + sum(c.net_change) OVER (
+                    PARTITION BY c.account_id ORDER BY c.day
+                ) AS balance
+            FROM account_balance_dirty AS d
+            JOIN account_daily_balances AS c
+                ON c.account_id = d.account_id AND c.day >= d.from_day
+        ) AS w
+        WHERE b.account_id = w.account_id AND b.day = w.day
+        """)
+    conn.exec_driver_sql("DELETE FROM account_balance_dirty")
+
+
+def rebuild_daily_balances(conn: sa.Connection):
+    """Recomputes all daily balances from the transactions."""
+    conn.exec_driver_sql("DELETE FROM account_balance_dirty")
+    conn.exec_driver_sql("DELETE FROM account_daily_balances")
+    conn.exec_driver_sql(f"""
+        INSERT INTO account_daily_balances (account_id, day, net_change, balance)
+        SELECT account_id, day, sum(amount), 0 FROM (
+            SELECT debit_account_id AS account_id, {_day("time")} AS day,
+                coalesce(debit_units, 0) AS amount
+            FROM transactions
+            WHERE debit_account_id IS NOT NULL
+            UNION ALL
+            SELECT credit_account_id, {_day("time")}, -coalesce(credit_units, 0)
+            FROM transactions
+            WHERE credit_account_id IS NOT NULL
+        )
+        GROUP BY account_id, day
+        """)
+    conn.exec_driver_sql("""
+        INSERT INTO account_balance_dirty (account_id, from_day)
+        SELECT account_id, min(day) FROM account_daily_balances GROUP BY account_id
+        """)
+    refresh_daily_balances(conn)
+
+
+def rebuild_account_closure(conn: sa.Connection):
+    """Recomputes the closure of the account tree from the parents of the accounts."""
+    conn.exec_driver_sql("DELETE FROM account_closure")
+    conn.exec_driver_sql("""
+        WITH RECURSIVE closure (ancestor_id, descendant_id, depth) AS (
+            SELECT id, id, 0 FROM accounts
+            UNION ALL
+            SELECT c.ancestor_id, a.id, c.depth + 1
+            FROM closure AS c
+            JOIN accounts AS a ON a.parent_id = c.descendant_id
+        )
+        INSERT INTO account_closure (ancestor_id, descendant_id, depth)
+        SELECT ancestor_id, descendant_id, depth FROM closure
+        """)
+
+
+_transactions = Transaction.__table__
+_accounts = Account.__table__
+
+# the triggers on transactions use the units and times of integer amounts
+_balances_require = (
+    "account_daily_balances",
+    "account_balance_dirty",
+    "transactions.credit_units",
+)
+_day_changes_require = ("transaction_day_changes", "transactions.amount_exponent")
+
+trigger(
+    _transactions,  # type: ignore
+    "transactions_count_insert",
+    f"""
+    CREATE TRIGGER transactions_count_insert AFTER INSERT ON transactions
+    BEGIN
+        {_count("NEW", "")}
+    END
+    """,
+    requires=("transaction_counts",),
+)
+
+trigger(
+    _transactions,  # type: ignore
+    "transactions_count_delete",
+    f"""
+    CREATE TRIGGER transactions_count_delete AFTER DELETE ON transactions
+    BEGIN
+        {_count("OLD", "-")}
+    END
+    """,
+    requires=("transaction_counts",),
+)
+
+trigger(
+    _transactions,  # type: ignore
+    "transactions_count_update",
+    f"""
+    CREATE TRIGGER transactions_count_update
+    AFTER UPDATE OF book_id, conn_id, source_id, credit_account_id, debit_account_id
+    ON transactions
+    BEGIN
+        {_count("OLD", "-")}
+        {_count("NEW", "")}
+    END
+    """,
+    requires=("transaction_counts",),
+)
+
+trigger(
+    _transactions,  # type: ignore
+    "transactions_balance_insert",
+    f"""
+    CREATE TRIGGER transactions_balance_insert AFTER INSERT ON transactions
+    BEGIN
+        {_change_balances("NEW", "")}
+    END
+    """,
+    requires=_balances_require,
+)
+
+trigger(
+    _transactions,  # type: ignore
+    "transactions_balance_delete",
+    f"""
+    CREATE TRIGGER transactions_balance_delete AFTER DELETE ON transactions
+    BEGIN
+        {_change_balances("OLD", "-")}
+    END
+    """,
+    requires=_balances_require,
+)
+
+trigger(
+    _transactions,  # type: ignore
+    "transactions_balance_update",
+    f"""
+    CREATE TRIGGER transactions_balance_update
+    AFTER UPDATE OF time, credit_account_id, debit_account_id, credit_units,
+        debit_units
+    ON transactions
+    BEGIN
+        {_change_balances("OLD", "-")}
+        {_change_balances("NEW", "")}
+    END
+    """,
+    requires=_balances_require,
+)
+
+trigger(
+    _transactions,  # type: ignore
+    "transactions_day_change_insert",
+    f"""
+    CREATE TRIGGER transactions_day_change_insert AFTER INSERT ON transactions
+    BEGIN
+        {_change_day("NEW")}
+    END
+    """,
+    requires=_day_changes_require,
+)
+
+trigger(
+    _transactions,  # type: ignore
+    "transactions_day_change_delete",
+    f"""
+    CREATE TRIGGER transactions_day_change_delete AFTER DELETE ON transactions
+    BEGIN
+        {_change_day("OLD")}
+    END
+    """,
+    requires=_day_changes_require,
+)
+
+trigger(
+    _transactions,  # type: ignore
+    "transactions_day_change_update",
+    f"""
+    CREATE TRIGGER transactions_day_change_update
+    AFTER UPDATE OF book_id, time, type, credit_account_id, debit_account_id,
+        credit_units, debit_units, amount_exponent, description
+    ON transactions
+    BEGIN
+        {_change_day("OLD")}
+        {_change_day("NEW")}
+    END
+    """,
+    requires=_day_changes_require,
+)
+
+# any change to a book's data, or to the data all books share, moves its version
+for table, book_id in [
+    (_transactions, "book_id"),
+    (_accounts, "book_id"),
+    (Book.__table__, "id"),
+    (Price.__table__, None),
+    (FxRate.__table__, None),
+]:
+    for event, rows in [
+        ("insert", ["NEW"]),
+        ("delete", ["OLD"]),
+        ("update", ["OLD", "NEW"]),
+    ]:
+        name = f"{table.name}_version_{event}"
+        bumps = "".join(
+            _bump_version(f"{row}.{book_id}" if book_id else "0") for row in rows
+        )
+        trigger(
+            table,  # type: ignore
+            name,
+            f"""
+            CREATE TRIGGER {name} AFTER {event.upper()} ON {table.name}
+            BEGIN
+                {bumps}
+            END
+            """,
+            requires=("data_versions",),
+        )
+
+# rows of deleted accounts are removed by the foreign keys of account_closure
+
+trigger(
+    _accounts,  # type: ignore
+    "accounts_closure_insert",
+    """
+    CREATE TRIGGER accounts_closure_insert AFTER INSERT ON accounts
+    BEGIN
+        INSERT INTO account_closure (ancestor_id, descendant_id, depth)
+        SELECT NEW.id, NEW.id, 0
+        UNION ALL
+        SELECT ancestor_id, NEW.id, depth + 1
+        FROM account_closure
+        WHERE descendant_id = NEW.parent_id;
+    END
+    """,
+    requires=("account_closure",),
+)
+
+trigger(
+    _accounts,  # type: ignore
+    "accounts_closure_move",
+    """
+    CREATE TRIGGER accounts_closure_move AFTER UPDATE OF parent_id ON accounts
+    WHEN OLD.parent_id IS NOT NEW.parent_id
+    BEGIN
+        -- unlink the subtree from the ancestors of its old parent
+        DELETE FROM account_closure
+        WHERE descendant_id IN (
+            SELECT descendant_id FROM account_closure WHERE ancestor_id = NEW.id
+        )
+        AND ancestor_id NOT IN (
+            SELECT descendant_id FROM account_closure WHERE ancestor_id = NEW.id
+        );
+        -- and link it to the new parent and its ancestors
+        INSERT INTO account_closure (ancestor_id, descendant_id, depth)
+        SELECT a.ancestor_id, d.descendant_id, a.depth + d.depth + 1
+        FROM account_closure AS a, account_closure AS d
+        WHERE a.descendant_id = NEW.parent_id AND d.ancestor_id = NEW.id;
+    END
+    """,
+    requires=("account_closure",),
+)
@@ -0,0 +1,115 @@
+"""
+Compact encodings for columns of large tables: amounts as integers in the minor unit
+of their currency, and times as integer seconds since the epoch. Integers sum
+exactly, and compare and index smaller and faster than floats and ISO text.
+"""
+
+import calendar
+from datetime import UTC, datetime, timedelta
+from decimal import ROUND_HALF_EVEN, Decimal
+
+import sqlalchemy as sa
+
+from dbk.errors import DbkError
+
+DEFAULT_EXPONENT = 2
+"""Decimals of currencies not in `EXPONENTS`, which is most of them."""
+
+EXPONENTS = {
+    "BHD": 3,
+    "BIF": 0,
+    "CLF": 4,
+    "CLP": 0,
+    "DJF": 0,
+    "GNF": 0,
+    "IQD": 3,
+    "ISK": 0,
+    "JOD": 3,
+    "JPY": 0,
+    "KMF": 0,
+    "KRW": 0,
+    "KWD": 3,
+    "LYD": 3,
+    "OMR": 3,
+    "PYG": 0,
+    "RWF": 0,
+    "TND": 3,
+    "UGX": 0,
+    "UYI": 0,
+    "UYW": 4,
+    "VND": 0,
+    "VUV": 0,
+    "XAF": 0,
+    "XOF": 0,
+    "XPF": 0,
+}
+"""Decimals of the minor unit of currencies, per ISO 4217, where it is not 2."""
+
+_epoch = datetime(1970, 1, 1)
+
+
+def currency_exponent(currency: str | None) -> int:
+    """Number of decimals amounts in `currency` are stored with."""
+    if currency is None:
+        return DEFAULT_EXPONENT
+    return EXPONENTS.get(currency.upper(), DEFAULT_EXPONENT)
+
+
+class InexactAmount(DbkError):
+    pass
+
+
+def to_units(
+    amount: float | Decimal | None, exponent: int, exact: bool = False
+) -> int | None:
+    """
+    Amount in minor units, e.g. 12.34 with exponent 2 is 1234.
+
+    :param exact: raise rather than round an amount with more decimals than `exponent`
+    :raises InexactAmount: if `exact` and the amount would be rounded
+    """
+    if amount is None:
+        return None
+    # through the shortest repr of floats, so 1.005 is 1.005 and not 1.00499...
+    d = amount if isinstance(amount, Decimal) else Decimal(str(amount))
+    scaled = d.scaleb(exponent)
+    units = int(scaled.to_integral_value(ROUND_HALF_EVEN))
+    if exact and units != scaled:
+        raise InexactAmount(f"{amount} has more than {exponent} decimals")
+    return units
+
+
+def from_units(units: int | None, exponent: int) -> float | None:
+    """Amount of a number of minor units, the inverse of `to_units`."""
+    if units is None:
+        return None
+    return units / 10**exponent
+
+
+def units_scale(exponent: sa.ColumnElement[int]) -> sa.ColumnElement[int]:
+    """SQL expression for `10**exponent`, as SQLite may be built without `pow`."""
+    exponents = {DEFAULT_EXPONENT, *EXPONENTS.values()}
+    return sa.case({e: 10**e for e in sorted(exponents)}, value=exponent)
+
+
+class EpochTime(sa.TypeDecorator[datetime]):
+    """
+    A naive datetime stored as whole seconds since the epoch, read back as the same
+    wall-clock time, so `date(time, 'unixepoch')` in SQL is its calendar day. Aware
+    datetimes are converted to UTC. Fractions of a second are dropped.
+    """
+
+    impl = sa.Integer
+    cache_ok = True
+
+    def process_bind_param(self, value: datetime | None, dialect) -> int | None:
+        if value is None:
+            return None
+        if value.tzinfo is not None:
+            value = value.astimezone(UTC).replace(tzinfo=None)
+        return calendar.timegm(value.timetuple())
+
+    def process_result_value(self, value: int | None, dialect) -> datetime | None:
+        if value is None:
+            return None
+        return _epoch + timedelta(seconds=value)
@@ -1,45 +1,36 @@
-from abc import ABC, abstractmethod
-from pathlib import Path
-from typing import TextIO, override
+import sqlalchemy as sa
 
-from dbk import errors
-from dbk.core import models
+from dbk.errors import DbkError
 from dbk.settings import UserConfig
 
-
-class Storage(ABC):
-    @abstractmethod
-    def write_stream(self, ds: models.DataSource, stream: TextIO):
-        """Write the contents of the given stream to the storage for the data source."""
-
-    @abstractmethod
-    def read_stream(self, ds: models.DataSource) -> TextIO:
-        """Read the contents of the given data source from the storage."""
-
-
-class LocalStorage(Storage):
-    def __init__(self, config: UserConfig | None = None):
-        self.config = config or UserConfig()
-
-    def get_data_source_path(self, ds: models.DataSource) -> Path:
-        assert ds.type == models.DataSourceType.file
-        assert ds.id is not None
-        assert ds.conn_id is not None
-
-        wd = self.config.working_dir
-        conn_d = wd / "user_data" / "connections" / str(ds.conn_id)
-        conn_d.mkdir(parents=True, exist_ok=True)
-        return conn_d / str(ds.id)
-
-    @override
-    def write_stream(self, ds: models.DataSource, stream: TextIO):
-        if ds.type != models.DataSourceType.file:
-            raise errors.DbkError(f"Expected file data source, got {ds.type}")
-        with open(self.get_data_source_path(ds), "w") as f:
-            f.write(stream.read())
-
-    @override
-    def read_stream(self, ds: models.DataSource) -> TextIO:
-        if ds.type != models.DataSourceType.file:
-            raise errors.DbkError(f"Expected file data source, got {ds.type}")
-        return open(self.get_data_source_path(ds), "r")
+from ._storage import LocalStorage, Storage, UnsupportedOperation
+from ._cas import ContentAddressedStorage
+from ._compressed import CompressedStorage
+from ._sqlite import SqliteBlobStorage
+
+
+def make_storage(
+    config: UserConfig | None = None,
+    engine: sa.Engine | None = None,
+) -> Storage:
+    """
+    Creates the storage backend selected by `UserConfig.storage_backend`.
+
+    :param engine: database of the book, required by the `sqlite` backend
+    """
+    config = config or UserConfig()
+    match config.storage_backend:
+        case "local":
+            return LocalStorage(config)
+        case "cas":
+            return ContentAddressedStorage(config)
+        case "compressed":
+            return CompressedStorage(
+                config,
+                codec=config.storage_codec,
+                level=config.storage_compression_level,
+            )
+        case "sqlite":
+            if engine is None:
+                raise DbkError("The sqlite storage backend requires a database")
+            return SqliteBlobStorage(engine)
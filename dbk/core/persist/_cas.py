@@ -0,0 +1,122 @@
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Callable, TextIO, override
+
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+from dbk import errors
+from dbk.core import models
+from dbk.settings import UserConfig
+
+from ._storage import LocalStorage
+
+log = logging.getLogger(__name__)
+
+
+class ContentAddressedStorage(LocalStorage):
+    """
+    Stores the contents of file data sources once per distinct sha256, in a fanout
+    tree like `user_data/blobs/ab/cd/abcd...`. Data sources reference their blob by
+    `DataSource.hash`, so the same statement added to several connections, or under
+    several names, shares one blob, and adding it again copies nothing.
+
+    A blob's reference count is the number of data sources with its hash; blobs
+    that are no longer referenced are removed by `collect_garbage`.
+    """
+
+    def __init__(self, config: UserConfig | None = None):
+        super().__init__(config)
+        self._dirs: set[Path] = set()
+        """Fanout directories known to exist."""
+
+    @property
+    def blobs_dir(self) -> Path:
+        return self.config.working_dir / "user_data" / "blobs"
+
+    def blob_path(self, blob_hash: str) -> Path:
+        return self.blobs_dir / blob_hash[:2] / blob_hash[2:4] / blob_hash
+
+    @override
+    def get_data_source_path(self, ds: models.DataSource) -> Path:
+        assert ds.type == models.DataSourceType.file
+        if not ds.hash:
+            raise errors.DbkError(f"Data source {ds.name} has no hash")
+        return self.blob_path(ds.hash)
+
+    @override
+    def write_stream(self, ds: models.DataSource, stream: TextIO):
+        if ds.type != models.DataSourceType.file:
+            raise errors.DbkError(f"Expected file data source, got {ds.type}")
+        self._write_blob(
+            self.get_data_source_path(ds),
+            lambda path: _copy_stream(stream, path),
+        )
+
+    @override
+    def write_file(self, ds: models.DataSource, fname: Path):
+        if ds.type != models.DataSourceType.file:
+            raise errors.DbkError(f"Expected file data source, got {ds.type}")
+        self._write_blob(
+            self.get_data_source_path(ds),
+            lambda path: shutil.copyfile(fname, path),
+        )
+
+    def _write_blob(self, path: Path, write: Callable[[Path], object]):
+        if path.exists():
+            log.debug("blob %s already stored", path.name)
+            return
+
+        if path.parent not in self._dirs:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._dirs.add(path.parent)
+
+        # write to a temporary file first so a blob is never seen half written
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        os.close(fd)
+        try:
+            write(Path(tmp))
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def refcounts(self, session: orm.Session) -> dict[str, int]:
+        """Number of data sources referencing each blob."""
+        stmt = (
+            sa.select(models.DataSource.hash, sa.func.count(models.DataSource.id))
+            .where(
+                models.DataSource.type == models.DataSourceType.file,
+                models.DataSource.hash != None,
+            )
+            .group_by(models.DataSource.hash)
+        )
+        return {h: n for h, n in session.execute(stmt)}
+
+    def collect_garbage(self, session: orm.Session) -> list[str]:
+        """
+        Removes the blobs that are not referenced by any data source.
+
+        :return: hashes of the removed blobs
+        """
+        if not self.blobs_dir.exists():
+            return []
+
+        referenced = self.refcounts(session)
+        removed = []
+        for path in self.blobs_dir.glob("*/*/*"):
+            if path.name.startswith(".") or path.name in referenced:
+                continue
+            path.unlink()
+            removed.append(path.name)
+
+        log.info("removed %s unreferenced blobs", len(removed))
+        return removed
+
+
+def _copy_stream(stream: TextIO, path: Path):
+    with open(path, "w") as f:
+        shutil.copyfileobj(stream, f)
@@ -0,0 +1,91 @@
+import gzip
+import lzma
+import mmap
+import shutil
+from pathlib import Path
+from typing import IO, BinaryIO, Literal, TextIO, override
+
+from dbk import errors
+from dbk.core import models
+from dbk.settings import UserConfig
+
+from ._storage import BUFFER_SIZE, LocalStorage, UnsupportedOperation
+
+Codec = Literal["gzip", "lzma"]
+
+
+class CompressedStorage(LocalStorage):
+    """
+    Stores the contents of file data sources compressed with gzip or lzma. Data is
+    compressed and decompressed while it streams through a bounded buffer, so a
+    file is never held in memory as a whole.
+    """
+
+    def __init__(
+        self,
+        config: UserConfig | None = None,
+        codec: Codec = "gzip",
+        level: int = 6,
+    ):
+        super().__init__(config)
+        self.codec = codec
+        self.level = level
+
+    @property
+    def suffix(self) -> str:
+        match self.codec:
+            case "gzip":
+                return ".gz"
+            case "lzma":
+                return ".xz"
+
+    @override
+    def get_data_source_path(self, ds: models.DataSource) -> Path:
+        path = super().get_data_source_path(ds)
+        return path.with_name(path.name + self.suffix)
+
+    def _open(self, path: Path, mode: str) -> IO:
+        match self.codec, mode:
+            case "gzip", ("wt" | "wb"):
+                return gzip.open(path, mode, compresslevel=self.level)
+            case "lzma", ("wt" | "wb"):
+                return lzma.open(path, mode, preset=self.level)
+            case "gzip", _:
+                return gzip.open(path, mode)
+            case "lzma", _:
+                return lzma.open(path, mode)
+        raise ValueError(f"unknown codec {self.codec}")
+
+    @override
+    def write_stream(self, ds: models.DataSource, stream: TextIO):
+        if ds.type != models.DataSourceType.file:
+            raise errors.DbkError(f"Expected file data source, got {ds.type}")
+        path = self.get_data_source_path(ds)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._open(path, "wt") as f:
+            shutil.copyfileobj(stream, f, BUFFER_SIZE)
+
+    @override
+    def write_file(self, ds: models.DataSource, fname: Path):
+        if ds.type != models.DataSourceType.file:
+            raise errors.DbkError(f"Expected file data source, got {ds.type}")
+        path = self.get_data_source_path(ds)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(fname, "rb") as src, self._open(path, "wb") as dst:
+            shutil.copyfileobj(src, dst, BUFFER_SIZE)
+
+    @override
+    def read_stream(self, ds: models.DataSource) -> TextIO:
+        if ds.type != models.DataSourceType.file:
+            raise errors.DbkError(f"Expected file data source, got {ds.type}")
+        return self._open(self.get_data_source_path(ds), "rt")  # type: ignore
+
+    @override
+    def read_binary(self, ds: models.DataSource) -> BinaryIO:
+        if ds.type != models.DataSourceType.file:
+            raise errors.DbkError(f"Expected file data source, got {ds.type}")
+        return self._open(self.get_data_source_path(ds), "rb")  # type: ignore
+
+    @override
+    def map(self, ds: models.DataSource) -> mmap.mmap:
+        raise UnsupportedOperation("Compressed data sources cannot be mapped")
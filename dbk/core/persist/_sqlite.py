@@ -0,0 +1,122 @@
+import io
+import os
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+from typing import BinaryIO, TextIO, override
+
+import sqlalchemy as sa
+import sqlalchemy.dialects.sqlite as sa_sqlite
+
+from dbk import errors
+from dbk.core import models
+
+from ._storage import BUFFER_SIZE, Storage
+
+ENCODING = "utf-8"
+
+
+class SqliteBlobStorage(Storage):
+    """
+    Stores the contents of file data sources in the `data_source_blobs` table of the
+    book's database, so a book is a single file that is backed up, copied and
+    snapshotted together with its sources. Contents are written and read in chunks
+    with SQLite's incremental blob I/O, so a file is never held in memory as a whole.
+    Writes are serialized, as SQLite allows a single writer and a long blob write from
+    another thread would otherwise fail with "database is locked".
+    """
+
+    table = models.DataSourceBlob.__table__
+
+    def __init__(self, engine: sa.Engine):
+        if engine.dialect.name != "sqlite":
+            raise errors.DbkError("Blob storage requires a sqlite database")
+        self.engine = engine
+        self._write_lock = threading.Lock()
+
+    @override
+    def write_stream(self, ds: models.DataSource, stream: TextIO):
+        # the size of a blob is fixed when it is created, so encode to a temporary
+        # file first, which stays in memory unless the stream is large
+        with tempfile.SpooledTemporaryFile(max_size=BUFFER_SIZE) as tmp:
+            while chunk := stream.read(BUFFER_SIZE):
+                tmp.write(chunk.encode(ENCODING))
+            size = tmp.tell()
+            tmp.seek(0)
+            self._write(ds, tmp, size)  # type: ignore
+
+    @override
+    def write_file(self, ds: models.DataSource, fname: Path):
+        with open(fname, "rb") as f:
+            self._write(ds, f, os.fstat(f.fileno()).st_size)
+
+    def _write(self, ds: models.DataSource, src: BinaryIO, size: int):
+        if ds.type != models.DataSourceType.file:
+            raise errors.DbkError(f"Expected file data source, got {ds.type}")
+
+        values = dict(size=size, data=sa.func.zeroblob(size))
+        stmt = (
+            sa_sqlite.insert(self.table)
+            .values(source_id=ds.id, **values)
+            .on_conflict_do_update(index_elements=["source_id"], set_=values)
+        )
+
+        with self._write_lock, self.engine.begin() as conn:
+            conn.execute(stmt)
+            dbapi_conn: sqlite3.Connection = conn.connection.driver_connection  # type: ignore
+            with dbapi_conn.blobopen(self.table.name, "data", ds.id) as blob:
+                while chunk := src.read(BUFFER_SIZE):
+                    blob.write(chunk)
+
+    @override
+    def read_stream(self, ds: models.DataSource) -> TextIO:
+        return io.TextIOWrapper(self.read_binary(ds), encoding=ENCODING)
+
+    @override
+    def read_binary(self, ds: models.DataSource) -> BinaryIO:
+        if ds.type != models.DataSourceType.file:
+            raise errors.DbkError(f"Expected file data source, got {ds.type}")
+
+        conn = self.engine.raw_connection()
+        try:
+            dbapi_conn: sqlite3.Connection = conn.driver_connection  # type: ignore
+            blob = dbapi_conn.blobopen(self.table.name, "data", ds.id, readonly=True)
+        except sqlite3.OperationalError as e:
+            conn.close()
+            raise errors.DbkError(f"Data source {ds.name} is not stored") from e
+
+        return io.BufferedReader(_BlobReader(blob, conn), BUFFER_SIZE)  # type: ignore
+
+
+class _BlobReader(io.RawIOBase):
+    """Reads an open blob, returning its connection to the pool when closed."""
+
+    def __init__(self, blob: sqlite3.Blob, conn):
+        self._blob = blob
+        self._conn = conn
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        data = self._blob.read(len(b))
+        n = len(data)
+        b[:n] = data
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._blob.seek(offset, whence)
+        return self._blob.tell()
+
+    def tell(self) -> int:
+        return self._blob.tell()
+
+    def close(self):
+        if not self.closed:
+            self._blob.close()
+            self._conn.close()
+        super().close()
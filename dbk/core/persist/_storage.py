@@ -0,0 +1,95 @@
+import mmap
+import shutil
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import BinaryIO, TextIO, override
+
+from dbk import errors
+from dbk.core import models
+from dbk.settings import UserConfig
+
+BUFFER_SIZE = 1024 * 1024
+"""Size of the buffer used to copy data into and out of the storage."""
+
+
+class UnsupportedOperation(errors.DbkError):
+    pass
+
+
+class Storage(ABC):
+    @abstractmethod
+    def write_stream(self, ds: models.DataSource, stream: TextIO):
+        """Write the contents of the given stream to the storage for the data source."""
+
+    @abstractmethod
+    def read_stream(self, ds: models.DataSource) -> TextIO:
+        """Read the contents of the given data source from the storage."""
+
+    def write_file(self, ds: models.DataSource, fname: Path):
+        """Write the contents of the given file to the storage for the data source."""
+        with open(fname, "r") as f:
+            self.write_stream(ds, f)
+
+    def read_binary(self, ds: models.DataSource) -> BinaryIO:
+        """Read the raw bytes of the given data source from the storage."""
+        raise UnsupportedOperation(
+            f"{type(self).__name__} does not support binary reads"
+        )
+
+    def map(self, ds: models.DataSource) -> mmap.mmap:
+        """
+        Map the contents of the given data source into memory, read only. Processes
+        mapping the same data source share its pages in the page cache, and
+        `memoryview(m)` gives access to the bytes without copying them.
+        """
+        raise UnsupportedOperation(f"{type(self).__name__} does not support mapping")
+
+
+class LocalStorage(Storage):
+    def __init__(self, config: UserConfig | None = None):
+        self.config = config or UserConfig()
+
+    def get_data_source_path(self, ds: models.DataSource) -> Path:
+        assert ds.type == models.DataSourceType.file
+        assert ds.id is not None
+        assert ds.conn_id is not None
+
+        wd = self.config.working_dir
+        return wd / "user_data" / "connections" / str(ds.conn_id) / str(ds.id)
+
+    @override
+    def write_stream(self, ds: models.DataSource, stream: TextIO):
+        if ds.type != models.DataSourceType.file:
+            raise errors.DbkError(f"Expected file data source, got {ds.type}")
+        path = self.get_data_source_path(ds)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            shutil.copyfileobj(stream, f, BUFFER_SIZE)
+
+    @override
+    def write_file(self, ds: models.DataSource, fname: Path):
+        if ds.type != models.DataSourceType.file:
+            raise errors.DbkError(f"Expected file data source, got {ds.type}")
+        path = self.get_data_source_path(ds)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(fname, path)
+
+    @override
+    def read_stream(self, ds: models.DataSource) -> TextIO:
+        if ds.type != models.DataSourceType.file:
+            raise errors.DbkError(f"Expected file data source, got {ds.type}")
+        return open(self.get_data_source_path(ds), "r")
+
+    @override
+    def read_binary(self, ds: models.DataSource) -> BinaryIO:
+        if ds.type != models.DataSourceType.file:
+            raise errors.DbkError(f"Expected file data source, got {ds.type}")
+        return open(self.get_data_source_path(ds), "rb")
+
+    @override
+    def map(self, ds: models.DataSource) -> mmap.mmap:
+        with self.read_binary(ds) as f:
+            if f.seek(0, 2) == 0:
+                raise errors.DbkError(f"Data source {ds.name} is empty")
+            # the mapping stays valid after the file is closed
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
@@ -0,0 +1,379 @@
+"""
+Positions of a book in instruments, and their value, from its `trade` transactions
+and the imported prices of the instruments.
+
+A trade moves an instrument between an account that holds it, whose currency is the
+instrument, e.g. "VTI", and an account in the currency of the book, which pays or
+receives the cash. Both are stored in units of the trade's `amount_exponent`, and a
+quantity with more decimals than that is rejected when the trade is written, see
+`models.TransactionType.trade`. The quantity of each instrument, and its cost, the
+cash paid for it less the cash received for it, are cumulative sums of those integer
+units, so a position sold in full is exactly closed, and are only scaled to amounts
+for display.
+
+Prices are converted into the currency of the book when they are quoted in another
+one, see `fx`. They are kept sorted by day per instrument, and looked up as of a day
+with `searchsorted`, so valuing any number of days is a few array operations per
+instrument. Given a `snapshot.SnapshotCache`, the trades are taken from the columns
+of the snapshot of the book rather than queried.
+"""
+
+import csv
+import logging
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import numpy as np
+import sqlalchemy as sa
+import sqlalchemy.dialects.sqlite as sa_sqlite
+import sqlalchemy.orm as orm
+
+from dbk.core import fx, models, snapshot
+from dbk.errors import DbkError
+
+log = logging.getLogger(__name__)
+
+INSERT_BATCH = 5000
+"""Number of prices written per statement by `import_prices`."""
+
+
+class InvalidPriceFile(DbkError):
+    pass
+
+
+def _days(days: Iterable[date]) -> np.ndarray:
+    return np.array(list(days), dtype="datetime64[D]")
+
+
+def read_price_file(
+    path: Path, instrument: str | None = None, currency: str | None = None
+) -> Iterator[models.Price]:
+    """
+    Prices in a CSV file with a header, with a `date` column, a `close` or `price`
+    column, an `instrument` or `symbol` column unless `instrument` is given, and
+    optionally a `currency` column, else the prices are in `currency`, or in the
+    currency of the book valuing them if it is None.
+
+    :raises InvalidPriceFile: if a column is missing or a row is malformed
+    """
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        columns = {c.strip().lower(): c for c in reader.fieldnames or []}
+        day_column = columns.get("date")
+        price_column = columns.get("close") or columns.get("price")
+        instrument_column = columns.get("instrument") or columns.get("symbol")
+        currency_column = columns.get("currency")
+        if not day_column or not price_column:
+            raise InvalidPriceFile(f"{path} needs a date and a close or price column.")
+        if not instrument and not instrument_column:
+            raise InvalidPriceFile(f"{path} has no instrument column, specify one.")
+
+        for n, row in enumerate(reader, start=2):
+            try:
+                price_currency = row[currency_column] if currency_column else currency
+                yield models.Price(
+                    instrument=instrument or row[instrument_column],  # type: ignore
+                    day=date.fromisoformat(row[day_column].strip()),
+                    price=float(row[price_column]),
+                    currency=(
+                        price_currency.strip().upper() if price_currency else None
+                    ),
+                )
+            except (TypeError, ValueError) as e:
+                raise InvalidPriceFile(f"{path}, line {n}: {e}") from e
+
+
+def import_prices(session: orm.Session, prices: Iterable[models.Price]) -> int:
+    """Adds the prices, replacing those of the same instrument and day."""
+    stmt = sa_sqlite.insert(models.Price)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["instrument", "day"],
+        set_={"price": stmt.excluded.price, "currency": stmt.excluded.currency},
+    )
+    n = 0
+    batch = []
+    for p in prices:
+        batch.append(
+            dict(instrument=p.instrument, day=p.day, price=p.price, currency=p.currency)
+        )
+        if len(batch) == INSERT_BATCH:
+            session.execute(stmt, batch)
+            n += len(batch)
+            batch = []
+    if batch:
+        session.execute(stmt, batch)
+        n += len(batch)
+    return n
+
+
+@dataclass(frozen=True)
+class PriceHistory:
+    days: np.ndarray
+    """Days with a price, sorted, as datetime64[D]."""
+    prices: np.ndarray
+
+    def as_of(self, days: np.ndarray) -> np.ndarray:
+        """The last price on or before each of `days`, or nan if there is none."""
+        i = np.searchsorted(self.days, days, side="right") - 1
+        return np.where(i >= 0, self.prices[np.maximum(i, 0)], np.nan)
+
+
+def price_histories(
+    session: orm.Session, instruments: Iterable[str], currency: str | None = None
+) -> dict[str, PriceHistory]:
+    """
+    The prices of the instruments, in `currency` if it is given: prices in another
+    one are converted at its rate as of their day, see `fx.Rates`, and are nan
+    without one.
+    """
+    # imported prices and rates are upper case, see `fx.rates`
+    currency = currency.upper() if currency else None
+    P = models.Price
+    stmt = (
+        sa.select(P.instrument, P.day, P.price, P.currency)
+        .where(P.instrument.in_(list(instruments)))
+        .order_by(P.instrument, P.day)
+    )
+    rows: dict[str, tuple[list[date], list[float], list[str]]] = {}
+    for instrument, day, price, price_currency in session.execute(stmt):
+        days, prices, currencies = rows.setdefault(instrument, ([], [], []))
+        days.append(day)
+        prices.append(price)
+        currencies.append(price_currency or currency or "")
+
+    rates = None
+    if currency and any(c != currency for *_, cs in rows.values() for c in cs):
+        rates = fx.rates(session, currency)
+    histories = {}
+    for i, (days, prices, currencies) in rows.items():
+        history = PriceHistory(_days(days), np.array(prices, np.float64))
+        if rates is not None:
+            history = PriceHistory(
+                history.days,
+                rates.convert(history.prices, rates.codes(currencies), history.days),
+            )
+        histories[i] = history
+    return histories
+
+
+@dataclass(frozen=True)
+class TradeHistory:
+    """The trades of an instrument, by time, with the position after each."""
+
+    days: np.ndarray
+    """Days of the trades, as datetime64[D]."""
+    quantity: np.ndarray
+    """Quantity held after each trade, in units of `exponent` decimals."""
+    cost: np.ndarray
+    """
+    Cash paid for the instrument less cash received for it, after each trade, in
+    units of `exponent` decimals.
+    """
+    exponent: int
+
+    def at(self, days: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Quantity and cost at the end of each of `days`, in units."""
+        i = np.searchsorted(self.days, days, side="right") - 1
+        before = i < 0
+        i = np.maximum(i, 0)
+        return (
+            np.where(before, 0, self.quantity[i]),
+            np.where(before, 0, self.cost[i]),
+        )
+
+
+def _book_currency(session: orm.Session, book_id: int) -> str:
+    currency = session.scalar(
+        sa.select(models.Book.currency).where(models.Book.id == book_id)
+    )
+    assert currency is not None
+    return currency
+
+
+def _currencies(session: orm.Session, book_id: int) -> tuple[str, dict[int, str]]:
+    """The currency of the book, and that of each of its accounts."""
+    book_currency = _book_currency(session, book_id)
+    A = models.Account
+    accounts = session.execute(sa.select(A.id, A.currency).where(A.book_id == book_id))
+    return book_currency, {i: c or book_currency for i, c in accounts}
+
+
+_TRADE_COLUMNS = [
+    "id",
+    "time",
+    "credit_account_id",
+    "debit_account_id",
+    "credit_units",
+    "debit_units",
+    "amount_exponent",
+]
+
+
+def _trades(session: orm.Session, book_id: int) -> dict[str, np.ndarray]:
+    """The columns of the trades of the book, as in a `snapshot.Snapshot`."""
+    T = models.Transaction
+    stmt = sa.select(
+        T.id,
+        sa.type_coerce(T.time, sa.Integer),
+        sa.func.coalesce(T.credit_account_id, 0),
+        sa.func.coalesce(T.debit_account_id, 0),
+        sa.func.coalesce(T.credit_units, 0),
+        sa.func.coalesce(T.debit_units, 0),
+        T.amount_exponent,
+    ).where(T.book_id == book_id, T.type == models.TransactionType.trade)
+    rows = np.array(session.execute(stmt).all(), np.int64).reshape(-1, 7)
+    return dict(zip(_TRADE_COLUMNS, rows.T))
+
+
+def trade_histories(
+    session: orm.Session,
+    book_id: int,
+    snapshots: snapshot.SnapshotCache | None = None,
+) -> dict[str, TradeHistory]:
+    """
+    The trades of the book in each instrument it holds or held, from the snapshot of
+    the book in `snapshots`, refreshed first, or else from the database.
+    """
+    if snapshots is not None:
+        snap = snapshots.refresh(session, book_id)
+        trade = snap.type == snapshot.TYPES.index(models.TransactionType.trade)
+        trades = {name: getattr(snap, name)[trade] for name in _TRADE_COLUMNS}
+    else:
+        trades = _trades(session, book_id)
+    cash, currencies = _currencies(session, book_id)
+
+    order = np.lexsort((trades["id"], trades["time"]))
+    trades = {name: c[order] for name, c in trades.items()}
+
+    def currency(account_ids: np.ndarray) -> np.ndarray:
+        # an account missing from the book, or 0 for none, has no currency
+        return np.array([currencies.get(a, "") for a in account_ids.tolist()], object)
+
+    credited = currency(trades["credit_account_id"])
+    debited = currency(trades["debit_account_id"])
+    # bought: the holding account is debited the quantity, sold: it is credited
+    bought = (credited == cash) & (debited != cash) & (debited != "")
+    sold = (debited == cash) & (credited != cash) & (credited != "")
+    other = ~(bought | sold)
+    if other.any():
+        log.debug("%s trades are not between cash and an instrument", other.sum())
+
+    credit_units, debit_units = trades["credit_units"], trades["debit_units"]
+    instrument = np.where(bought, debited, credited)
+    quantity = np.where(bought, debit_units, -credit_units)
+    cost = np.where(bought, credit_units, -debit_units)
+    exponents = trades["amount_exponent"].astype(np.int64)
+    days = (trades["time"] // snapshot.DAY).astype("datetime64[D]")
+
+    result = {}
+    for i in sorted(set(instrument[~other])):
+        of = ~other & (instrument == i)
+        # summed as integers, in the units of the most precise of the trades, so
+        # selling all that was bought leaves exactly nothing
+        exponent = int(exponents[of].max())
+        scale = 10 ** (exponent - exponents[of])
+        result[i] = TradeHistory(
+            days[of],
+            np.cumsum(quantity[of] * scale),
+            np.cumsum(cost[of] * scale),
+            exponent,
+        )
+    return result
+
+
+@dataclass(frozen=True, slots=True)
+class Position:
+    instrument: str
+    quantity: float
+    cost: float
+    price: float | None
+    """
+    Last price on or before the day, in the currency of the book, None if there is
+    none or it has no rate into that currency.
+    """
+
+    @property
+    def value(self) -> float | None:
+        return None if self.price is None else self.quantity * self.price
+
+    @property
+    def gain(self) -> float | None:
+        value = self.value
+        return None if value is None else value - self.cost
+
+
+def positions(
+    session: orm.Session,
+    book_id: int,
+    day: date,
+    snapshots: snapshot.SnapshotCache | None = None,
+) -> list[Position]:
+    """Open positions of the book at the end of `day`, by instrument."""
+    trades = trade_histories(session, book_id, snapshots)
+    prices = price_histories(session, trades, _book_currency(session, book_id))
+    at = _days([day])
+    result = []
+    for instrument in sorted(trades):
+        trade = trades[instrument]
+        quantity, cost = trade.at(at)
+        if quantity[0] == 0:
+            continue
+        history = prices.get(instrument)
+        price = history.as_of(at)[0] if history else np.nan
+        result.append(
+            Position(
+                instrument=instrument,
+                quantity=int(quantity[0]) / 10**trade.exponent,
+                cost=int(cost[0]) / 10**trade.exponent,
+                price=None if np.isnan(price) else float(price),
+            )
+        )
+    return result
+
+
+@dataclass(frozen=True)
+class Valuation:
+    days: np.ndarray
+    """Every day of the period, as datetime64[D]."""
+    instruments: list[str]
+    values: np.ndarray
+    """Value of each instrument on each day, days by instruments, nan if unpriced."""
+    costs: np.ndarray
+
+    @property
+    def total(self) -> np.ndarray:
+        """Value of all priced positions on each day."""
+        return np.nansum(self.values, axis=1)
+
+
+def valuation(
+    session: orm.Session,
+    book_id: int,
+    start: date,
+    end: date,
+    snapshots: snapshot.SnapshotCache | None = None,
+) -> Valuation:
+    """The value of the positions of the book on every day from `start` to `end`."""
+    trades = trade_histories(session, book_id, snapshots)
+    prices = price_histories(session, trades, _book_currency(session, book_id))
+    instruments = sorted(trades)
+    days = np.arange(
+        np.datetime64(start, "D"),
+        np.datetime64(end, "D") + np.timedelta64(1, "D"),
+        dtype="datetime64[D]",
+    )
+
+    values = np.zeros((len(days), len(instruments)))
+    costs = np.zeros((len(days), len(instruments)))
+    for j, instrument in enumerate(instruments):
+        trade = trades[instrument]
+        quantity, cost = trade.at(days)
+        scale = 10.0**trade.exponent
+        costs[:, j] = cost / scale
+        history = prices.get(instrument)
+        price = history.as_of(days) if history else np.full(len(days), np.nan)
+        # no position is worth nothing, priced or not
+        values[:, j] = np.where(quantity == 0, 0.0, quantity / scale * price)
+    return Valuation(days, instruments, values, costs)
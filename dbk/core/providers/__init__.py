@@ -1,10 +1,12 @@
 from dbk import errors
 
-from ._providers import Provider, SyncContext
+from ._providers import ParseContext, Provider, SyncContext
 from .bofa import BofaProvider
+from .ofx import OfxProvider
 
 _providers: dict[str, type[Provider]] = {
     BofaProvider.provider_id(): BofaProvider,
+    OfxProvider.provider_id(): OfxProvider,
 }
 
 
@@ -1,13 +1,30 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, Optional, TextIO
+from typing import Any, ClassVar, Iterable, Optional, TextIO
 
 import sqlalchemy.orm as orm
 from pydantic import BaseModel
-from dbk.core import persist
+from dbk.core import models, persist
 
-if TYPE_CHECKING:
-    from dbk.core import models
+
+@dataclass(frozen=True)
+class ParseContext:
+    """
+    Everything a provider needs to turn a data source into transaction rows.
+    Unlike `SyncContext` it holds no session, so it can be sent to a worker process.
+    """
+
+    book_id: int
+    conn_id: int
+    source_id: int
+    provider_data: dict[str, Any]
+    accounts: dict[str | None, int]
+    """Ids of the connection's accounts, keyed by their `conn_label`."""
+    resume: bool = False
+    """
+    Whether the stream has been positioned at a checkpoint of an earlier sync, in
+    which case it starts with the next row instead of the header.
+    """
 
 
 @dataclass
@@ -28,8 +45,58 @@ class SyncContext[T: BaseModel]:
         assert self.data_source is not None, "data_source must be set"
         return self.storage.read_stream(self.data_source)
 
+    def ensure_account(
+        self,
+        conn_label: str,
+        account_type: models.AccountType,
+    ) -> models.Account:
+        """
+        Returns the connection's account with the given label, creating it under the
+        book's root account of the same type if it does not exist yet.
+        """
+        conn = self.connection
+        accounts = {a.conn_label: a for a in conn.accounts}
+        if (account := accounts.get(conn_label)) is not None:
+            return account
+
+        account = models.Account(
+            name=conn.conn_name,
+            account_type=account_type,
+            is_root=False,
+            is_virtual=False,
+            currency=conn.book.currency,
+            conn_id=conn.id,
+            conn_label=conn_label,
+            book_id=conn.book_id,
+        )
+        conn.accounts.append(account)
+
+        for ra in conn.book.root_accounts:
+            if ra.account_type == account.account_type:
+                ra.children.append(account)
+                break
+
+        self.session.commit()
+        return account
+
+    def parse_context(self) -> ParseContext:
+        assert self.data_source is not None, "data_source must be set"
+        return ParseContext(
+            book_id=self.connection.book_id,
+            conn_id=self.connection.id,
+            source_id=self.data_source.id,
+            provider_data=dict(self.connection.provider_data),
+            accounts={a.conn_label: a.id for a in self.connection.accounts},
+        )
+
 
 class Provider[T: BaseModel](ABC):
+    resumable: ClassVar[bool] = False
+    """
+    Whether `parse` reads the stream one row at a time, so that the stream position
+    after a row has been yielded is a valid place to resume parsing from.
+    """
+
     @classmethod
     @abstractmethod
     def provider_id(cls) -> str:
@@ -48,3 +115,10 @@ class Provider[T: BaseModel](ABC):
     @abstractmethod
     def sync(self, context: SyncContext):
         ...
+
+    @abstractmethod
+    def parse(self, context: ParseContext, f: TextIO) -> Iterable[dict[str, Any]]:
+        """
+        Parses the contents of a data source into rows for the transactions table.
+        Must not touch the database, it may run in a worker process.
+        """
@@ -3,13 +3,11 @@ import enum
 from datetime import datetime
 from typing import Any, Iterable, TextIO, override
 
-import sqlalchemy as sa
-import sqlalchemy.dialects.sqlite as sa_sqlite
 from pydantic import BaseModel
 
-from dbk.core import models, persist, sync
+from dbk.core import models, sync
 
-from ._providers import Provider, SyncContext
+from ._providers import ParseContext, Provider, SyncContext
 
 
 class BofaAccountType(enum.StrEnum):
@@ -30,6 +28,8 @@ class BofaData(BaseModel):
 
 
 class BofaProvider(Provider[BofaData]):
+    resumable = True
+
     def __init__(self):
         pass
 
@@ -52,35 +52,16 @@ class BofaProvider(Provider[BofaData]):
     def sync(self, context: SyncContext[BofaData]):
         context.session.expire_on_commit = False
 
-        conn = context.connection
-        provider = context.provider
         provider_data = context.provider_data
         bofa_account_type = provider_data.account_type
 
         # ==============================
         # Make Account
         # ==============================
-        accounts = {a.conn_label: a for a in conn.accounts}
-        conn_label = bofa_account_type.value
-        if (account := accounts.get(conn_label)) is None:
-            account = models.Account(
-                name=conn.conn_name,
-                account_type=bofa_account_type.to_account_type(),
-                is_root=False,
-                is_virtual=False,
-                currency=conn.book.currency,
-                conn_id=conn.id,
-                conn_label=conn_label,
-                book_id=conn.book_id,
-            )
-            conn.accounts.append(account)
-
-            for ra in conn.book.root_accounts:
-                if ra.account_type == account.account_type:
-                    ra.children.append(account)
-                    break
-
-            context.session.commit()
+        context.ensure_account(
+            bofa_account_type.value,
+            bofa_account_type.to_account_type(),
+        )
 
         # ==============================
         # Make Transactions
@@ -91,31 +72,32 @@ class BofaProvider(Provider[BofaData]):
         if source.type != models.DataSourceType.file:
             return
 
-        reader_factory = make_reader(bofa_account_type)
-        with context.storage.read_stream(source) as f:
-            txs = list(parse_txs(conn, source, account, reader_factory(f)))
+        sync.sync_data_source(context)
 
-        stmt = sa_sqlite.insert(models.Transaction).values(txs)
-        context.session.execute(stmt)
-        context.session.commit()
+    @override
+    def parse(self, context: ParseContext, f: TextIO) -> Iterable[dict[str, Any]]:
+        provider_data = BofaData.model_validate(context.provider_data)
+        account_id = context.accounts[provider_data.account_type.value]
+        reader_factory = make_reader(provider_data.account_type)
+        return parse_txs(context, account_id, reader_factory(f, context.resume))
 
 
-def parse_txs(conn, source, account, txs: Iterable[dict]):
+def parse_txs(context: ParseContext, account_id: int, txs: Iterable[dict]):
     for _tx in txs:
         credit_account_id, debit_account_id = None, None
         credit_amount, debit_amount = None, None
 
         if _tx["amount"] < 0:
-            credit_account_id = account.id
+            credit_account_id = account_id
             credit_amount = abs(_tx["amount"])
         else:
-            debit_account_id = account.id
+            debit_account_id = account_id
             debit_amount = abs(_tx["amount"])
 
         yield dict(
-            book_id=conn.book_id,
-            conn_id=conn.id,
-            source_id=source.id,
+            book_id=context.book_id,
+            conn_id=context.conn_id,
+            source_id=context.source_id,
             time=_tx["time"],
             type=models.TransactionType.unknown,
             description=_tx["description"],
@@ -142,13 +124,16 @@ def make_reader(account: BofaAccountType):
         case BofaAccountType.savings:
             raise NotImplementedError()
 
-    def reader(f: TextIO) -> Iterable[dict[str, Any]]:
-        for _ in range(skip_lines):
-            f.readline()
+    def reader(f: TextIO, resume: bool = False) -> Iterable[dict[str, Any]]:
+        if not resume:
+            for _ in range(skip_lines):
+                f.readline()
 
-        rdr = csv.reader(f)
-        for row in rdr:
-            yield {k: parse(row[i]) for k, i, parse in fields}
+        # read line by line so the stream position can be checkpointed
+        while line := f.readline():
+            for row in csv.reader([line]):
+                if row:
+                    yield {k: parse(row[i]) for k, i, parse in fields}
 
     return reader
 
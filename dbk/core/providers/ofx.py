@@ -0,0 +1,238 @@
+"""
+Provider for OFX and QFX files. Both OFX 1.x (SGML) and OFX 2.x (XML) documents are
+read incrementally: the input is converted to XML on the fly, fed to a pull parser,
+and every statement transaction is discarded once it has been yielded, so memory use
+does not grow with the size of the file.
+"""
+
+import enum
+import re
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from typing import Any, Iterable, Iterator, TextIO, override
+
+from pydantic import BaseModel
+
+from dbk.core import models, sync
+
+from ._providers import ParseContext, Provider, SyncContext
+
+CHUNK_SIZE = 64 * 1024
+
+_tag = re.compile(r"<(/?)([A-Za-z0-9.]+)[^<>]*>")
+_bare_ampersand = re.compile(r"&(?!(?:amp|lt|gt|quot|apos|#\d+|#x[0-9a-fA-F]+);)")
+
+AGGREGATES = frozenset("""
+    OFX SIGNONMSGSRSV1 SONRS STATUS FI
+    BANKMSGSRSV1 STMTTRNRS STMTRS BANKACCTFROM BANKACCTTO BANKTRANLIST
+    CREDITCARDMSGSRSV1 CCSTMTTRNRS CCSTMTRS CCACCTFROM CCACCTTO
+    INVSTMTMSGSRSV1 INVSTMTTRNRS INVSTMTRS INVACCTFROM INVTRANLIST INVBANKTRAN
+    STMTTRN PAYEE CURRENCY ORIGCURRENCY IMAGEDATA
+    LEDGERBAL AVAILBAL BALLIST BAL MKTGINFO
+    """.split())
+"""
+Tags of OFX elements that contain other elements. In OFX 1.x any other tag is a
+leaf, whose closing tag may be omitted, even when its value is empty.
+"""
+
+
+class OfxAccountType(enum.StrEnum):
+    checking = "checking"
+    savings = "savings"
+    credit = "credit"
+
+    def to_account_type(self) -> models.AccountType:
+        match self:
+            case OfxAccountType.checking | OfxAccountType.savings:
+                return models.AccountType.asset
+            case OfxAccountType.credit:
+                return models.AccountType.liability
+
+
+class OfxData(BaseModel):
+    account_type: OfxAccountType
+
+
+class OfxProvider(Provider[OfxData]):
+    @classmethod
+    @override
+    def provider_id(cls) -> str:
+        return "ofx"
+
+    @classmethod
+    @override
+    def provider_name(cls) -> str:
+        return "OFX/QFX File"
+
+    @classmethod
+    @override
+    def custom_data_model(cls):
+        return OfxData
+
+    @override
+    def sync(self, context: SyncContext[OfxData]):
+        context.session.expire_on_commit = False
+
+        account_type = context.provider_data.account_type
+        context.ensure_account(account_type.value, account_type.to_account_type())
+
+        if not (source := context.data_source):
+            return
+
+        if source.type != models.DataSourceType.file:
+            return
+
+        sync.sync_data_source(context)
+
+    @override
+    def parse(self, context: ParseContext, f: TextIO) -> Iterable[dict[str, Any]]:
+        provider_data = OfxData.model_validate(context.provider_data)
+        account_id = context.accounts[provider_data.account_type.value]
+
+        for stmttrn in read_statement_transactions(f):
+            amount = _parse_amount(stmttrn["TRNAMT"])
+            credit_account_id, debit_account_id = None, None
+            credit_amount, debit_amount = None, None
+
+            if amount < 0:
+                credit_account_id = account_id
+                credit_amount = abs(amount)
+            else:
+                debit_account_id = account_id
+                debit_amount = abs(amount)
+
+            yield dict(
+                book_id=context.book_id,
+                conn_id=context.conn_id,
+                source_id=context.source_id,
+                time=_parse_time(stmttrn["DTPOSTED"]),
+                type=models.TransactionType.unknown,
+                description=stmttrn.get("NAME") or stmttrn.get("MEMO") or "",
+                credit_account_id=credit_account_id,
+                debit_account_id=debit_account_id,
+                credit_amount=credit_amount,
+                debit_amount=debit_amount,
+                external_ref=stmttrn.get("FITID"),
+            )
+
+
+def read_statement_transactions(f: TextIO) -> Iterator[dict[str, str]]:
+    """
+    Yields the fields of each `STMTTRN` element in an OFX document, e.g.
+    `{"TRNTYPE": "DEBIT", "DTPOSTED": "20230105", "TRNAMT": "-12.50", ...}`.
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    stack: list[ET.Element] = []
+
+    def drain() -> Iterator[dict[str, str]]:
+        for event, elem in parser.read_events():
+            if event == "start":
+                stack.append(elem)
+                continue
+
+            stack.pop()
+            if elem.tag == "STMTTRN":
+                yield {child.tag: (child.text or "") for child in elem}
+                # detach the transaction so the tree never holds more than one
+                if stack:
+                    stack[-1].remove(elem)
+
+    for chunk in sgml_to_xml(f):
+        parser.feed(chunk)
+        yield from drain()
+
+    parser.close()
+    yield from drain()
+
+
+def sgml_to_xml(f: TextIO, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """
+    Converts the body of an OFX document to XML, one chunk at a time. The header,
+    which is not markup in OFX 1.x, is skipped. Elements without a closing tag,
+    as allowed by SGML, are closed: leaves after their value, aggregates, see
+    `AGGREGATES`, at the closing tag of an enclosing element. OFX 2.x documents
+    pass through unchanged, but for aggregates not in `AGGREGATES`, whose children
+    are read as children of their parent.
+    """
+    buf = ""
+    in_body = False
+    open_elements: list[str] = []
+    last_leaf: str | None = None
+
+    while True:
+        chunk = f.read(chunk_size)
+        buf += chunk
+
+        if not in_body:
+            start = buf.find("<OFX>")
+            if start < 0:
+                if not chunk:
+                    return
+                buf = buf[-len("<OFX>") :]
+                continue
+            buf = buf[start:]
+            in_body = True
+
+        # the text after the last '<' may continue in the next chunk
+        limit = buf.rfind("<") if chunk else len(buf)
+        if limit <= 0:
+            if not chunk:
+                break
+            continue
+
+        out: list[str] = []
+        matches = list(_tag.finditer(buf, 0, limit))
+        for i, m in enumerate(matches):
+            closing, name = m.group(1), m.group(2)
+            text_end = matches[i + 1].start() if i + 1 < len(matches) else limit
+            text = buf[m.end() : text_end].strip()
+
+            if closing:
+                if name == last_leaf:
+                    last_leaf = None
+                    continue
+                last_leaf = None
+                if name not in open_elements:
+                    continue
+                while open_elements:
+                    open_name = open_elements.pop()
+                    out.append(f"</{open_name}>")
+                    if open_name == name:
+                        break
+            elif text:
+                out.append(f"<{name}>{_bare_ampersand.sub('&amp;', text)}</{name}>")
+                last_leaf = name
+            elif name in AGGREGATES:
+                out.append(f"<{name}>")
+                open_elements.append(name)
+                last_leaf = None
+            else:
+                # an empty leaf, e.g. <NAME> with no payee, does not contain the
+                # elements after it
+                out.append(f"<{name}></{name}>")
+                last_leaf = name
+
+        yield "".join(out)
+        buf = buf[limit:]
+
+        if not chunk:
+            break
+
+    if open_elements:
+        yield "".join(f"</{name}>" for name in reversed(open_elements))
+
+
+def _parse_amount(x: str) -> float:
+    # e.g. -4.50, 1,234.56, or -4,50 where a comma is the decimal separator
+    x = x.strip()
+    if "." in x:
+        return float(x.replace(",", ""))
+    return float(x.replace(",", "."))
+
+
+def _parse_time(x: str) -> datetime:
+    # e.g. 20230105, 20230105120000 or 20230105120000.000[-5:EST]
+    digits = x.strip()[:14]
+    if len(digits) >= 14:
+        return datetime.strptime(digits, "%Y%m%d%H%M%S")
+    return datetime.strptime(digits[:8], "%Y%m%d")
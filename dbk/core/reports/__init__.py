@@ -0,0 +1,9 @@
+from ._balance_sheet import BalanceSheet, ReportLine, balance_sheet, credit_normal
+from ._spending import (
+    Category,
+    Granularity,
+    Spending,
+    SpendingCache,
+    spending,
+    spending_rows,
+)
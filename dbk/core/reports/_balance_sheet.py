@@ -0,0 +1,143 @@
+"""
+The balance sheet of a book: the balance of every account at the end of a day, and
+the total of each account with all accounts under it. Balances are read from
+`account_daily_balances` in one grouped query, see `balances.units_at`, and rolled up
+the account tree with numpy, a level at a time from the deepest, so the cost is two
+queries and a handful of array operations however many accounts the book has.
+Balances in other currencies are converted into the book currency at the rates as of
+the day before they are rolled up, see `fx.Rates`.
+"""
+
+from dataclasses import dataclass
+from datetime import date
+
+import numpy as np
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+from dbk.core import balances, fx, models
+
+
+@dataclass(frozen=True, slots=True)
+class ReportLine:
+    account_id: int
+    parent_id: int | None
+    name: str
+    account_type: models.AccountType
+    depth: int
+    """Number of accounts above this one, 0 for roots."""
+    currency: str
+    balance: float
+    """Balance of the account itself, in its currency, positive when debited."""
+    total: float
+    """
+    Balance of the account and all accounts under it, in the currency of the book,
+    nan if one of them has a balance in a currency without a rate.
+    """
+
+
+@dataclass(frozen=True)
+class BalanceSheet:
+    book_id: int
+    day: date
+    currency: str
+    """Currency of the book, of the totals."""
+    lines: list[ReportLine]
+    """Accounts in tree order, each followed by the accounts under it, by name."""
+
+    def roots(self) -> list[ReportLine]:
+        return [line for line in self.lines if line.parent_id is None]
+
+
+def credit_normal(account_type: models.AccountType) -> bool:
+    """Whether accounts of the type grow when credited, and are shown negated."""
+    return account_type in (models.AccountType.liability, models.AccountType.income)
+
+
+def _depths(parents: np.ndarray) -> np.ndarray:
+    """Depth of each account, from the index of its parent, or -1 for roots."""
+    depths = np.zeros(len(parents), np.int64)
+    ancestors = parents.copy()
+    # every account climbs one level per pass, so this takes as many passes as
+    # the tree has levels
+    while (above := ancestors >= 0).any():
+        depths += above
+        ancestors = np.where(above, parents[ancestors], -1)
+    return depths
+
+
+def balance_sheet(session: orm.Session, book_id: int, day: date) -> BalanceSheet:
+    """The balance sheet of the book at the end of `day`."""
+    currency = session.scalar(
+        sa.select(models.Book.currency).where(models.Book.id == book_id)
+    )
+    assert currency is not None
+
+    A = models.Account
+    accounts = session.execute(
+        sa.select(
+            A.id,
+            A.parent_id,
+            A.name,
+            A.account_type,
+            sa.func.coalesce(A.currency, models.Book.currency),
+        )
+        .join(models.Book)
+        .where(A.book_id == book_id)
+    ).all()
+
+    latest = session.execute(
+        balances.units_at(day, sa.select(A.id).where(A.book_id == book_id))
+    ).all()
+
+    index = {a.id: i for i, a in enumerate(accounts)}
+    parents = np.array(
+        [index.get(a.parent_id, -1) for a in accounts], np.int64  # type: ignore
+    )
+    scales = np.array(
+        [10.0 ** models.currency_exponent(a[4]) for a in accounts], np.float64
+    )
+    own = np.zeros(len(accounts), np.int64)
+    for account_id, units in latest:
+        own[index[account_id]] = units
+    own_amounts = own / scales
+
+    rates = fx.rates(session, currency)
+    converted = rates.convert(
+        own_amounts,
+        rates.codes(a[4] for a in accounts),
+        np.full(len(accounts), np.datetime64(day, "D")),
+    )
+    # an empty account needs no rate
+    converted[own == 0] = 0.0
+
+    depths = _depths(parents)
+    totals = converted
+    for depth in range(int(depths.max(initial=0)), 0, -1):
+        level = depths == depth
+        np.add.at(totals, parents[level], totals[level])
+
+    children: dict[int, list[int]] = {}
+    for i in np.argsort([a.name for a in accounts], kind="stable"):
+        children.setdefault(int(parents[i]), []).append(int(i))
+
+    lines: list[ReportLine] = []
+    stack = children.get(-1, [])[::-1]
+    while stack:
+        i = stack.pop()
+        a = accounts[i]
+        lines.append(
+            ReportLine(
+                account_id=a.id,
+                parent_id=a.parent_id,
+                name=a.name,
+                account_type=a.account_type,
+                depth=int(depths[i]),
+                currency=a[4],
+                balance=float(own_amounts[i]),
+                total=float(totals[i]),
+            )
+        )
+        stack.extend(children.get(i, [])[::-1])
+
+    return BalanceSheet(book_id, day, currency, lines)
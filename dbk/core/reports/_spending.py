@@ -0,0 +1,287 @@
+"""
+Spending of a book by expense category and by day, week or month: the amounts of
+`spend` transactions, grouped in SQL by the account they debit and the bucket of
+their time. Amounts are in the currency of the book; those spent in another
+currency are converted at its rate as of the first day of their bucket, see
+`fx.Rates`, and left out, with their currency noted in `Spending.missing_rates`,
+when there is none. `SpendingCache` keeps reports, and after new or changed
+transactions only queries again the buckets of the days that changed, see
+`models.TransactionDayChange`.
+"""
+
+import enum
+import math
+import threading
+from dataclasses import dataclass, field, replace
+from datetime import date, datetime, time, timedelta
+from typing import Iterable
+
+import numpy as np
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+from dbk.core import cache, fx, models
+
+
+class Granularity(enum.StrEnum):
+    day = "day"
+    week = "week"
+    month = "month"
+
+    def bucket(self, day: date) -> date:
+        """First day of the bucket of `day`. Weeks start on Monday."""
+        match self:
+            case Granularity.day:
+                return day
+            case Granularity.week:
+                return day - timedelta(days=day.weekday())
+            case Granularity.month:
+                return day.replace(day=1)
+
+    def next(self, bucket: date) -> date:
+        """First day of the bucket after `bucket`."""
+        match self:
+            case Granularity.day:
+                return bucket + timedelta(days=1)
+            case Granularity.week:
+                return bucket + timedelta(days=7)
+            case Granularity.month:
+                return (bucket + timedelta(days=31)).replace(day=1)
+
+    def previous(self, bucket: date) -> date:
+        """First day of the bucket before `bucket`."""
+        return self.bucket(bucket - timedelta(days=1))
+
+    def buckets(self, start: date, end: date) -> list[date]:
+        """Buckets from the one of `start` to the one of `end`."""
+        result = []
+        bucket = self.bucket(start)
+        while bucket <= end:
+            result.append(bucket)
+            bucket = self.next(bucket)
+        return result
+
+    def sql(self, time: sa.ColumnElement) -> sa.ColumnElement[str]:
+        """SQL for the first day of the bucket of a `models.EpochTime` column."""
+        match self:
+            case Granularity.day:
+                return sa.func.date(time, "unixepoch")
+            case Granularity.week:
+                # the Monday on or before the day
+                return sa.func.date(time, "unixepoch", "-6 days", "weekday 1")
+            case Granularity.month:
+                return sa.func.date(time, "unixepoch", "start of month")
+
+
+type Category = int | None
+"""Id of the expense account of spending, None for uncategorized spending."""
+
+
+@dataclass
+class Spending:
+    book_id: int
+    start: date
+    end: date
+    granularity: Granularity
+    buckets: list[date]
+    amounts: dict[Category, list[float]] = field(default_factory=dict)
+    """Spending of each category in each bucket, in the order of `buckets`."""
+    missing_rates: dict[date, set[str]] = field(default_factory=dict)
+    """
+    Currencies of spending in each bucket without a rate into the currency of the
+    book, which is left out of `amounts`.
+    """
+
+    def totals(self) -> list[float]:
+        """Spending of all categories in each bucket."""
+        return [sum(column) for column in zip(*self.amounts.values())] or [
+            0.0 for _ in self.buckets
+        ]
+
+    def with_rows(
+        self, rows: Iterable[tuple[date, Category, float, str]], buckets: Iterable[date]
+    ) -> "Spending":
+        """A copy with the amounts in `buckets` replaced by those of `rows`."""
+        positions = {b: i for i, b in enumerate(self.buckets)}
+        amounts = {c: list(a) for c, a in self.amounts.items()}
+        missing = dict(self.missing_rates)
+        for b in buckets:
+            missing.pop(b, None)
+            for column in amounts.values():
+                column[positions[b]] = 0.0
+        for bucket, category, amount, currency in rows:
+            if math.isnan(amount):
+                missing.setdefault(bucket, set()).add(currency)
+                continue
+            column = amounts.setdefault(category, [0.0] * len(self.buckets))
+            column[positions[bucket]] += amount
+        return replace(
+            self,
+            amounts={c: a for c, a in amounts.items() if any(a)},
+            missing_rates=missing,
+        )
+
+
+def _at(day: date) -> datetime:
+    return datetime.combine(day, time())
+
+
+def spending_rows(
+    session: orm.Session,
+    book_id: int,
+    granularity: Granularity,
+    ranges: Iterable[tuple[date, date]],
+) -> list[tuple[date, Category, float, str]]:
+    """
+    Spending of the book by bucket and category, in the days from the start to the
+    end, excluded, of each of `ranges`, in the currency of the book, nan without a
+    rate, with the currency it was spent in.
+    """
+    T = models.Transaction
+    bucket = granularity.sql(T.time)
+    units = sa.func.sum(sa.func.coalesce(T.debit_units, T.credit_units, 0))
+    stmt = (
+        sa.select(
+            bucket, T.debit_account_id, T.credit_account_id, units, T.amount_exponent
+        )
+        .where(
+            T.book_id == book_id,
+            T.type == models.TransactionType.spend,
+            sa.or_(*(sa.and_(T.time >= _at(a), T.time < _at(b)) for a, b in ranges)),
+        )
+        .group_by(bucket, T.debit_account_id, T.credit_account_id, T.amount_exponent)
+    )
+    rows = session.execute(stmt).all()
+    if not rows:
+        return []
+
+    book_currency, currencies = _currencies(session, book_id)
+    buckets = [date.fromisoformat(b) for b, *_ in rows]
+    # the currency of the account the amount was imported into, see `sync`
+    spent_in = [
+        currencies.get(credit or category, book_currency)  # type: ignore
+        for _, category, credit, _, _ in rows
+    ]
+    amounts = np.array([models.from_units(u, e) or 0.0 for *_, u, e in rows])
+    if any(c != book_currency for c in spent_in):
+        rates = fx.rates(session, book_currency)
+        amounts = rates.convert(
+            amounts, rates.codes(spent_in), np.array(buckets, "datetime64[D]")
+        )
+    return [
+        (b, r[1], float(a), c) for b, r, a, c in zip(buckets, rows, amounts, spent_in)
+    ]
+
+
+def _currencies(session: orm.Session, book_id: int) -> tuple[str, dict[int, str]]:
+    """The currency of the book, and that of each of its accounts."""
+    A = models.Account
+    book_currency = session.scalar(
+        sa.select(models.Book.currency).where(models.Book.id == book_id)
+    )
+    assert book_currency is not None
+    accounts = session.execute(sa.select(A.id, A.currency).where(A.book_id == book_id))
+    return book_currency.upper(), {a: (c or book_currency).upper() for a, c in accounts}
+
+
+def spending(
+    session: orm.Session,
+    book_id: int,
+    start: date,
+    end: date,
+    granularity: Granularity,
+) -> Spending:
+    """Spending of the book in the buckets from the one of `start` to that of `end`."""
+    buckets = granularity.buckets(start, end)
+    report = Spending(book_id, start, end, granularity, buckets)
+    if not buckets:
+        return report
+    ranges = [(buckets[0], granularity.next(buckets[-1]))]
+    return report.with_rows(spending_rows(session, book_id, granularity, ranges), [])
+
+
+def _version(session: orm.Session) -> int:
+    return (
+        session.scalar(sa.select(sa.func.max(models.TransactionDayChange.version))) or 0
+    )
+
+
+@dataclass
+class _Entry:
+    report: Spending
+    version: int
+    """Highest `TransactionDayChange.version` the report includes."""
+    rates: int
+    """Version of the data shared by books, with the rates the report converted at."""
+
+
+class SpendingCache:
+    """
+    Spending reports by (book, period, granularity). A report is kept with the
+    version of the latest change it includes; when it is asked for again, the days
+    changed since are looked up, and only their buckets are queried again. New
+    exchange rates, which move the version of the shared data, see
+    `cache.data_version`, rebuild it.
+
+    Safe to use from several threads.
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries: dict[tuple, _Entry] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        session: orm.Session,
+        book_id: int,
+        start: date,
+        end: date,
+        granularity: Granularity,
+    ) -> Spending:
+        key = (book_id, start, end, granularity)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        # read before the report, so changes made while it is built are seen next time
+        version = _version(session)
+        rates = cache.data_version(session, 0)
+
+        if entry is None or rates != entry.rates:
+            report = spending(session, book_id, start, end, granularity)
+            entry = _Entry(report, version, rates)
+        elif version > entry.version:
+            self._update(session, entry, version)
+
+        with self._lock:
+            # most recently used last
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                del self._entries[next(iter(self._entries))]
+        return entry.report
+
+    def _update(self, session: orm.Session, entry: _Entry, version: int):
+        report, seen = entry.report, entry.version
+        entry.version = version
+        if not report.buckets:
+            return
+
+        granularity = report.granularity
+        changes = models.TransactionDayChange
+        days = session.scalars(
+            sa.select(changes.day).where(
+                changes.version > seen,
+                changes.book_id == report.book_id,
+                changes.day >= report.buckets[0],
+                changes.day < granularity.next(report.buckets[-1]),
+            )
+        )
+        buckets = {granularity.bucket(d) for d in days}
+        if buckets:
+            # a new report, the old one may still be shown by its reader
+            ranges = [(b, granularity.next(b)) for b in sorted(buckets)]
+            rows = spending_rows(session, report.book_id, granularity, ranges)
+            entry.report = report.with_rows(rows, buckets)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
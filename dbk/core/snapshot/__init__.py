@@ -0,0 +1,351 @@
+"""
+Columnar snapshots of the transactions of a book: one numpy array per column, and
+the descriptions interned into a table of distinct strings. Reports, rule batches and
+matching passes scan the arrays instead of each querying and decoding the same rows
+from SQLite.
+
+Snapshots are saved as `.npy` files and loaded with `mmap_mode="r"`, so loading costs
+no copy, and processes that load the same snapshot share its pages in the page cache.
+A snapshot remembers the highest `models.TransactionDayChange` version it includes.
+It is refreshed by reading again only the days of the book changed since, so added,
+updated and deleted transactions are all seen, whatever their ids.
+"""
+
+import json
+import logging
+import os
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+from dbk.core import models
+from dbk.settings import UserConfig
+
+log = logging.getLogger(__name__)
+
+LAYOUT = 2
+"""Layout of the files of a snapshot, older snapshots are rebuilt."""
+
+LOAD_ATTEMPTS = 3
+"""Times `SnapshotCache.load` reads `CURRENT` again when its generation is removed."""
+
+MAX_RANGES = 64
+"""Ranges of changed days read by one refresh, more are read as one range."""
+
+DAY = 86400
+"""Seconds in a day, times divided by it are days since the epoch."""
+
+TYPES = list(models.TransactionType)
+"""Transaction types, by their code in `Snapshot.type`."""
+
+
+@dataclass(frozen=True, eq=False)
+class Strings:
+    """Interned strings, as their UTF-8 bytes end to end and the offset of each."""
+
+    data: np.ndarray
+    offsets: np.ndarray
+    """Start of each string in `data`, followed by the end of the last one."""
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return bytes(self.data[self.offsets[i] : self.offsets[i + 1]]).decode()
+
+    def codes(self) -> dict[str, int]:
+        return {self[i]: i for i in range(len(self))}
+
+    def extend(self, strings: list[str]) -> "Strings":
+        encoded = [s.encode() for s in strings]
+        ends = np.cumsum([len(b) for b in encoded], dtype=np.int64) + self.offsets[-1]
+        return Strings(
+            data=np.concatenate(
+                [self.data, np.frombuffer(b"".join(encoded), dtype=np.uint8)]
+            ),
+            offsets=np.concatenate([self.offsets, ends]),
+        )
+
+
+_no_strings = Strings(np.empty(0, np.uint8), np.zeros(1, np.int64))
+
+
+@dataclass(frozen=True, eq=False)
+class Snapshot:
+    """
+    The transactions of a book in id order, a column per field. Times are seconds
+    since the epoch, amounts are in minor units, see `models.to_units`, and missing
+    accounts and amounts are 0.
+    """
+
+    book_id: int
+    version: int
+    """Highest `models.TransactionDayChange` version of the book it includes."""
+    watermark: int
+    """Highest id in the snapshot."""
+    descriptions: Strings
+    id: np.ndarray
+    time: np.ndarray
+    type: np.ndarray
+    """Codes of the types, indexes into `TYPES`."""
+    credit_account_id: np.ndarray
+    debit_account_id: np.ndarray
+    credit_units: np.ndarray
+    debit_units: np.ndarray
+    amount_exponent: np.ndarray
+    description: np.ndarray
+    """Codes of the descriptions, indexes into `descriptions`."""
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+
+_dtypes = {
+    "id": np.int64,
+    "time": np.int64,
+    "type": np.int8,
+    "credit_account_id": np.int64,
+    "debit_account_id": np.int64,
+    "credit_units": np.int64,
+    "debit_units": np.int64,
+    "amount_exponent": np.int8,
+    "description": np.int32,
+}
+"""Columns of a snapshot, in the order of `Snapshot`."""
+
+
+def _statement(book_id: int, *where):
+    T = models.Transaction
+    return (
+        sa.select(
+            T.id,
+            # the stored integer, not a datetime
+            sa.type_coerce(T.time, sa.Integer),
+            sa.case(
+                {t.value: i for i, t in enumerate(TYPES)},
+                value=sa.type_coerce(T.type, sa.String),
+            ),
+            sa.func.coalesce(T.credit_account_id, 0),
+            sa.func.coalesce(T.debit_account_id, 0),
+            sa.func.coalesce(T.credit_units, 0),
+            sa.func.coalesce(T.debit_units, 0),
+            T.amount_exponent,
+            T.description,
+        )
+        .where(T.book_id == book_id, *where)
+        .order_by(T.id)
+    )
+
+
+def _on_days(days: np.ndarray):
+    """Condition on the times of the sorted `days`, one range per run of days."""
+    time = sa.type_coerce(models.Transaction.time, sa.Integer)
+    runs = np.split(days, np.flatnonzero(np.diff(days) != 1) + 1)
+    if len(runs) > MAX_RANGES:
+        # the rows of the days between the runs are dropped after reading them
+        runs = [days]
+    return sa.or_(
+        *(
+            sa.and_(time >= int(run[0]) * DAY, time < (int(run[-1]) + 1) * DAY)
+            for run in runs
+        )
+    )
+
+
+class SnapshotCache:
+    """
+    Snapshots of books under `directory`, one directory per book. Each refresh writes
+    a new generation of the files, then points `CURRENT` at it, so a snapshot that is
+    loaded, in this process or another, never changes under its reader. The previous
+    generation is kept until the next refresh, for readers that have just read
+    `CURRENT`, and so are newer ones, which another process may be about to point
+    `CURRENT` at.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+
+    def _book_dir(self, book_id: int) -> Path:
+        return self.directory / str(book_id)
+
+    def _current(self, book_id: int) -> dict | None:
+        try:
+            current = json.loads((self._book_dir(book_id) / "CURRENT").read_text())
+        except FileNotFoundError:
+            return None
+        return current if current.get("layout") == LAYOUT else None
+
+    def load(self, book_id: int) -> Snapshot | None:
+        """The saved snapshot of the book, mapped read-only, or None."""
+        for _ in range(LOAD_ATTEMPTS):
+            current = self._current(book_id)
+            if current is None:
+                return None
+            gen = self._book_dir(book_id) / current["generation"]
+
+            def array(name: str) -> np.ndarray:
+                return np.load(gen / f"{name}.npy", mmap_mode="r")
+
+            try:
+                return Snapshot(
+                    book_id=book_id,
+                    version=current["version"],
+                    watermark=current["watermark"],
+                    descriptions=Strings(array("strings"), array("string_offsets")),
+                    **{name: array(name) for name in _dtypes},
+                )
+            except FileNotFoundError:
+                # refreshed twice since CURRENT was read, it points to a newer one
+                log.debug("snapshot %s of book %s was removed", gen.name, book_id)
+        return None
+
+    def refresh(
+        self, session: orm.Session, book_id: int, full: bool = False
+    ) -> Snapshot:
+        """
+        Brings the snapshot of the book up to date with its transactions and returns
+        it. Only the transactions of the days changed since it was saved are read.
+
+        :param full: rebuild the snapshot from all transactions
+        """
+        C = models.TransactionDayChange
+        snapshot = None if full else self.load(book_id)
+        if snapshot is None:
+            # read before the rows, so changes made meanwhile are read again next time
+            version = session.scalar(
+                sa.select(sa.func.max(C.version)).where(C.book_id == book_id)
+            )
+            rows = session.execute(_statement(book_id)).all()
+            return self._save(book_id, version or 0, None, rows)
+
+        changes = session.execute(
+            sa.select(C.day, C.version).where(
+                C.book_id == book_id, C.version > snapshot.version
+            )
+        ).all()
+        if not changes:
+            return snapshot
+        version = max(v for _, v in changes)
+        days = np.array(sorted(d for d, _ in changes), "datetime64[D]")
+        days = days.astype(np.int64)
+        rows = session.execute(_statement(book_id, _on_days(days))).all()
+        log.debug("refreshing %s days of book %s", len(days), book_id)
+        return self._save(book_id, version, snapshot, rows, days)
+
+    def _save(
+        self,
+        book_id: int,
+        version: int,
+        base: Snapshot | None,
+        rows,
+        days: np.ndarray | None = None,
+    ) -> Snapshot:
+        """
+        Saves the rows as the new snapshot of the book, or, with a `base`, as its
+        rows on `days`, in place of those it had.
+        """
+        strings = base.descriptions if base else _no_strings
+        codes = strings.codes()
+        added: list[str] = []
+        description = np.empty(len(rows), np.int32)
+        for i, r in enumerate(rows):
+            code = codes.get(r[-1])
+            if code is None:
+                code = codes[r[-1]] = len(codes)
+                added.append(r[-1])
+            description[i] = code
+        strings = strings.extend(added)
+
+        numbers = np.array([r[:-1] for r in rows], dtype=np.int64)
+        numbers = numbers.reshape(len(rows), len(_dtypes) - 1)
+        columns = {
+            name: numbers[:, i].astype(dtype)
+            for i, (name, dtype) in enumerate(list(_dtypes.items())[:-1])
+        }
+        columns["description"] = description
+        if base is not None:
+            assert days is not None
+            kept = ~np.isin(base.time // DAY, days)
+            read = np.isin(columns["time"] // DAY, days)
+            columns = {
+                name: np.concatenate([getattr(base, name)[kept], c[read]])
+                for name, c in columns.items()
+            }
+            order = np.argsort(columns["id"], kind="stable")
+            columns = {name: c[order] for name, c in columns.items()}
+
+        book_dir = self._book_dir(book_id)
+        book_dir.mkdir(parents=True, exist_ok=True)
+        gen = _new_generation(book_dir, self._current(book_id))
+        for name, c in columns.items():
+            np.save(gen / f"{name}.npy", c)
+        np.save(gen / "strings.npy", strings.data)
+        np.save(gen / "string_offsets.npy", strings.offsets)
+
+        previous = self._current(book_id)
+        watermark = int(columns["id"][-1]) if len(columns["id"]) else 0
+        current = {
+            "layout": LAYOUT,
+            "generation": gen.name,
+            "version": version,
+            "watermark": watermark,
+        }
+        tmp = book_dir / "CURRENT.tmp"
+        tmp.write_text(json.dumps(current))
+        os.replace(tmp, book_dir / "CURRENT")
+
+        # readers of older generations keep their mappings of the removed files, the
+        # previous one stays for readers that read CURRENT before it was replaced, and
+        # newer ones for the processes writing them
+        if previous is not None:
+            oldest = _generation_number(previous["generation"])
+            for old in book_dir.glob("gen-*"):
+                if _generation_number(old.name) < oldest:
+                    shutil.rmtree(old, ignore_errors=True)
+
+        snapshot = self.load(book_id)
+        if snapshot is None:
+            # the book was cleared, or refreshed again and again, since CURRENT was
+            # replaced, the rows just saved are as fresh as any snapshot
+            log.warning("snapshot of book %s was removed while saving it", book_id)
+            snapshot = Snapshot(
+                book_id=book_id,
+                version=version,
+                watermark=watermark,
+                descriptions=strings,
+                **columns,
+            )
+        return snapshot
+
+    def clear(self, book_id: int):
+        shutil.rmtree(self._book_dir(book_id), ignore_errors=True)
+
+
+def _generation_number(name: str) -> int:
+    """Number of a generation directory, or -1 for one of an older naming."""
+    try:
+        return int(name.removeprefix("gen-"))
+    except ValueError:
+        return -1
+
+
+def _new_generation(book_dir: Path, current: dict | None) -> Path:
+    """Creates the directory of the generation that follows `current`."""
+    n = _generation_number(current["generation"]) + 1 if current else 0
+    while True:
+        gen = book_dir / f"gen-{n:08d}"
+        try:
+            gen.mkdir()
+            return gen
+        except FileExistsError:
+            # taken by another process refreshing the book
+            n += 1
+
+
+def make_snapshot_cache(config: UserConfig | None = None) -> SnapshotCache:
+    config = config or UserConfig()
+    return SnapshotCache(config.working_dir / "cache" / "snapshots")
@@ -1,19 +1,39 @@
+import glob
 import hashlib
+import itertools
 import logging
+import multiprocessing as mp
+import os
+import queue
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, replace
 from datetime import datetime
 from pathlib import Path
-from typing import BinaryIO, Sequence
+from typing import Any, BinaryIO, Iterable, Sequence
 
 import sqlalchemy as sa
+import sqlalchemy.dialects.sqlite as sa_sqlite
 import sqlalchemy.orm as orm
 
-from dbk.core import models, persist, providers, rules
+from dbk.core import balances, models, persist, providers, rules
 
 log = logging.getLogger(__name__)
 
+CHECKPOINT_EVERY = 10_000
+"""Default number of rows written between checkpoints of a data source sync."""
+
+CHUNK_ROWS = 5000
+"""Default number of rows a parsing process hands to the writer at once."""
+
 
 def blob_checksum(blob: BinaryIO) -> str:
-    return hashlib.sha256(blob.read()).hexdigest()
+    return hashlib.file_digest(blob, "sha256").hexdigest()
+
+
+def file_checksum(fname: Path) -> str:
+    with open(fname, "rb") as f:
+        return blob_checksum(f)
 
 
 def tx_checksum(conn_id: int, time: datetime, desc: str, amount: float) -> str:
@@ -44,27 +64,81 @@ def sync_connection(
     session: orm.Session,
     storage: persist.Storage,
     connection: models.Connection,
-    sources: list[models.DataSource],
+    sources: Sequence[models.DataSource],
 ):
+    """
+    Syncs the connection's accounts, then each of the given data sources. A data
+    source is only marked as synced once all of its rows have been written; a
+    source that fails keeps its checkpoint so the next sync can resume from it.
+    """
     provider = providers.find_provider(connection.provider_id)
     ctx = providers.SyncContext(session, storage, provider, connection)
-
-    if not sources:
-        provider.sync(ctx)
-        return
+    provider.sync(ctx)
 
     log.debug("found %s data sources to sync", len(sources))
 
     for source in sources:
         log.debug("syncing data source %s", source.name)
+        ctx.data_source = source
         try:
-            with session.begin_nested():
-                ctx.data_source = source
-                provider.sync(ctx)
+            provider.sync(ctx)
+            source.last_synced = datetime.now()
+            source.last_sync_error = None
         except Exception as e:
+            log.error("sync of data source %s failed", source.name, exc_info=e)
+            session.rollback()
             source.last_sync_error = str(e)
-        finally:
-            source.last_synced = datetime.now()
+        session.commit()
+
+
+def sync_data_source(
+    context: providers.SyncContext,
+    checkpoint_every: int | None = None,
+) -> int:
+    """
+    Parses the context's data source and writes its transactions, committing every
+    `checkpoint_every` rows. After each commit the number of rows written, and the
+    stream position if the provider is resumable, is recorded on the data source.
+    A later call continues from there instead of starting over.
+
+    :return: number of rows written by this call
+    """
+    session = context.session
+    provider = context.provider
+    source = context.data_source
+    assert source is not None, "data_source must be set"
+
+    checkpoint_every = checkpoint_every or CHECKPOINT_EVERY
+    start_row = source.sync_row or 0
+    resume = provider.resumable and source.sync_offset is not None
+
+    with context.storage.read_stream(source) as f:
+        parse_ctx = context.parse_context()
+        if resume:
+            f.seek(source.sync_offset)
+            parse_ctx = replace(parse_ctx, resume=True)
+            log.info("resuming %s at row %s", source.name, start_row)
+        elif start_row:
+            log.info("resuming %s after skipping %s rows", source.name, start_row)
+
+        rows = provider.parse(parse_ctx, f)
+        if not resume:
+            rows = itertools.islice(rows, start_row, None)
+
+        n = start_row
+        for batch in itertools.batched(rows, checkpoint_every):
+            insert_transactions(session, batch)
+            n += len(batch)
+            source.sync_row = n
+            source.sync_offset = f.tell() if provider.resumable else None
+            session.commit()
+            log.debug("checkpoint of %s at row %s", source.name, n)
+
+    source.sync_row = None
+    source.sync_offset = None
+    # once, rather than at every checkpoint: readers do not need it to be right
+    balances.refresh(session)
+    return n - start_row
 
 
 def create_file_data_source(
@@ -77,8 +151,7 @@ def create_file_data_source(
 
     fname = fname.absolute()
 
-    with open(fname, "rb") as f:
-        fhash = blob_checksum(f)
+    fhash = file_checksum(fname)
 
     ds = session.scalar(
         sa.select(models.DataSource).where(
@@ -106,12 +179,7 @@ def create_file_data_source(
         )
 
     try:
-        with open(fname, "r") as f:
-            storage.write_stream(ds, f)
-
-        # storage.write_stream()
-        # ds_fname = storage.get_data_source_path(ds)
-        # shutil.copyfile(fname, ds_fname)
+        storage.write_file(ds, fname)
         log.info("copied file '%s' to storage.", str(fname))
     except Exception as e:
         log.error("failed to copy file '%s'", str(fname), exc_info=e)
@@ -121,5 +189,324 @@ def create_file_data_source(
     return ds
 
 
+def insert_transactions(
+    session: orm.Session,
+    rows: Iterable[dict[str, Any]],
+    batch_size: int = 5000,
+) -> int:
+    """
+    Inserts parsed transaction rows in batches, so the rows of a large data source
+    never have to be held in memory at once. Rows that duplicate an existing
+    transaction of the connection are ignored.
+
+    Amounts are given as `credit_amount` and `debit_amount`, and stored in the minor
+    units of the currency of the account of the row, unless the row has an
+    `amount_exponent`.
+
+    :return: number of rows passed to the database
+    """
+    stmt = sa_sqlite.insert(models.Transaction).on_conflict_do_nothing()
+    encode = _AmountEncoder(session)
+    n = 0
+    for batch in itertools.batched(rows, batch_size):
+        session.execute(stmt, [encode(row) for row in batch])
+        n += len(batch)
+    return n
+
+
+class _AmountEncoder:
+    """Replaces the amounts of parsed rows by units, caching the account exponents."""
+
+    def __init__(self, session: orm.Session):
+        self._session = session
+        self._exponents: dict[tuple[int, int | None], int] = {}
+
+    def _exponent(self, book_id: int, account_id: int | None) -> int:
+        key = (book_id, account_id)
+        if key not in self._exponents:
+            currency = self._session.scalar(
+                sa.select(models.Book.currency).where(models.Book.id == book_id)
+            )
+            if account_id is not None:
+                currency = (
+                    self._session.scalar(
+                        sa.select(models.Account.currency).where(
+                            models.Account.id == account_id
+                        )
+                    )
+                    or currency
+                )
+            self._exponents[key] = models.currency_exponent(currency)
+        return self._exponents[key]
+
+    def __call__(self, row: dict[str, Any]) -> dict[str, Any]:
+        row = dict(row)
+        account_id = row.get("credit_account_id") or row.get("debit_account_id")
+        # a provider may store more decimals, e.g. for fractional quantities of trades
+        exponent = row.get("amount_exponent")
+        if exponent is None:
+            exponent = self._exponent(row["book_id"], account_id)
+        row["amount_exponent"] = exponent
+        # quantities of instruments are not rounded, see `models.TransactionType`
+        exact = row.get("type") == models.TransactionType.trade
+        for side in ("credit", "debit"):
+            amount = row.pop(f"{side}_amount", None)
+            row[f"{side}_units"] = models.to_units(amount, exponent, exact)
+        return row
+
+
+@dataclass
+class ImportStats:
+    files: int = 0
+    """Number of files that were parsed and written."""
+    skipped: int = 0
+    """Number of files that were already synced or failed to import."""
+    rows: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def files_per_sec(self) -> float:
+        return self.files / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def discover_files(pattern: str) -> list[Path]:
+    """
+    Finds the files to import. `pattern` is either a directory, which is searched
+    recursively, or a glob pattern.
+    """
+    path = Path(pattern)
+    if path.is_dir():
+        candidates = path.rglob("*")
+    else:
+        candidates = map(Path, glob.glob(pattern, recursive=True))
+
+    return sorted(
+        p.absolute() for p in candidates if p.is_file() and not p.name.startswith(".")
+    )
+
+
+class _ParseError(Exception):
+    """The error that stopped the parsing of a file, as sent back by its process."""
+
+
+_chunks: mp.Queue
+"""Where a parsing process puts the rows of its files, see `_parse_file`."""
+
+
+def _init_parser(chunks: mp.Queue):
+    global _chunks
+    _chunks = chunks
+
+
+def _parse_file(
+    provider_id: str,
+    context: providers.ParseContext,
+    fname: Path,
+    key: int,
+    chunk_rows: int,
+):
+    """
+    Parses a file in a process of the pool, putting its rows on `_chunks` in lists
+    of at most `chunk_rows`, then None, or a `_ParseError` if parsing fails.
+    """
+    chunks = _chunks
+    try:
+        provider = providers.find_provider(provider_id)
+        with open(fname, "r") as f:
+            for chunk in itertools.batched(provider.parse(context, f), chunk_rows):
+                chunks.put((key, list(chunk)))
+    except Exception as e:
+        # the error may not pickle, its message does
+        chunks.put((key, _ParseError(f"{type(e).__name__}: {e}")))
+        return
+    chunks.put((key, None))
+
+
+def import_files(
+    session: orm.Session,
+    storage: persist.Storage,
+    connection: models.Connection,
+    fnames: Sequence[Path],
+    n_jobs: int = 0,
+    chunk_rows: int | None = None,
+) -> ImportStats:
+    """
+    Adds many files to a connection and syncs them in one pass. Files are hashed
+    concurrently, their data sources are created in bulk, and parsing runs in a
+    process pool while this process is the only one writing to the database.
+
+    Parsed rows are streamed to this process in chunks through a bounded queue, so
+    neither side holds all the rows of a file, and parsing waits when writing falls
+    behind. Each chunk is committed when written; a file that fails keeps the rows
+    written so far, which a later import skips as duplicates.
+
+    :param n_jobs: number of threads and processes to use, defaults to the cpu count
+    :param chunk_rows: number of rows sent at once, defaults to `CHUNK_ROWS`
+    """
+    session.expire_on_commit = False
+    n_jobs = n_jobs if n_jobs > 0 else os.cpu_count() or 1
+    stats = ImportStats()
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(n_jobs) as pool:
+        hashes = dict(zip(pool.map(file_checksum, fnames), fnames))
+
+    existing = {
+        ds.hash: ds
+        for ds in session.scalars(
+            sa.select(models.DataSource).where(
+                models.DataSource.conn_id == connection.id,
+                models.DataSource.hash.in_(hashes),
+            )
+        )
+    }
+
+    new_rows = [
+        dict(
+            conn_id=connection.id,
+            name=fname.name,
+            hash=fhash,
+            type=models.DataSourceType.file,
+        )
+        for fhash, fname in hashes.items()
+        if fhash not in existing
+    ]
+    if new_rows:
+        created = session.scalars(
+            sa.insert(models.DataSource).returning(models.DataSource), new_rows
+        ).all()
+        existing.update((ds.hash, ds) for ds in created)
+    session.commit()
+
+    pending: list[tuple[models.DataSource, Path]] = []
+    for fhash, fname in hashes.items():
+        ds = existing[fhash]
+        if ds.last_synced is not None and ds.last_sync_error is None:
+            stats.skipped += 1
+        else:
+            pending.append((ds, fname))
+
+    log.info(
+        "importing %s files into connection %s, %s already synced",
+        len(pending),
+        connection.conn_name,
+        stats.skipped,
+    )
+
+    def copy_to_storage(item: tuple[models.DataSource, Path]):
+        storage.write_file(*item)
+
+    with ThreadPoolExecutor(n_jobs) as pool:
+        copies = list(zip(pending, pool.map(_capture_errors(copy_to_storage), pending)))
+
+    to_parse = []
+    for (ds, fname), error in copies:
+        if error is None:
+            to_parse.append((ds, fname))
+        else:
+            log.error("failed to copy file '%s'", str(fname), exc_info=error)
+            ds.last_sync_error = "failed to copy file"
+            stats.skipped += 1
+    session.commit()
+
+    # make sure the connection's accounts exist before parsing
+    provider = providers.find_provider(connection.provider_id)
+    provider.sync(providers.SyncContext(session, storage, provider, connection))
+    ctx = providers.SyncContext(session, storage, provider, connection)
+
+    chunks = mp.Queue(maxsize=2 * n_jobs)
+    with ProcessPoolExecutor(
+        n_jobs, initializer=_init_parser, initargs=(chunks,)
+    ) as pool:
+        parsing: dict[int, tuple[models.DataSource, Future]] = {}
+        for key, (ds, fname) in enumerate(to_parse):
+            ctx.data_source = ds
+            fut = pool.submit(
+                _parse_file,
+                connection.provider_id,
+                ctx.parse_context(),
+                fname,
+                key,
+                chunk_rows or CHUNK_ROWS,
+            )
+            parsing[key] = (ds, fut)
+        abandoned: list[Future] = []
+
+        while parsing:
+            try:
+                key, chunk = chunks.get(timeout=1.0)
+            except queue.Empty:
+                # a process that died never sends the end of its file
+                for key, (ds, fut) in list(parsing.items()):
+                    if fut.done() and (error := fut.exception()) is not None:
+                        del parsing[key]
+                        _import_failed(session, ds, stats, error)
+                continue
+            if key not in parsing:
+                # the rest of a file that failed
+                continue
+
+            ds, _ = parsing[key]
+            try:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                if chunk is None:
+                    del parsing[key]
+                    ds.last_synced = datetime.now()
+                    ds.last_sync_error = None
+                    stats.files += 1
+                else:
+                    stats.rows += insert_transactions(session, chunk)
+                session.commit()
+            except Exception as e:
+                _, fut = parsing.pop(key)
+                abandoned.append(fut)
+                _import_failed(session, ds, stats, e)
+
+        # the processes of files that failed to write may still be putting rows,
+        # which must be read for them to exit
+        done = not abandoned
+        while not done:
+            done = all(fut.done() for fut in abandoned)
+            try:
+                while True:
+                    chunks.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+    balances.refresh(session)
+    session.commit()
+    stats.elapsed = time.perf_counter() - start
+    return stats
+
+
+def _import_failed(
+    session: orm.Session,
+    ds: models.DataSource,
+    stats: ImportStats,
+    error: BaseException,
+):
+    log.error("failed to import data source %s", ds.name, exc_info=error)
+    session.rollback()
+    ds.last_sync_error = str(error)
+    stats.skipped += 1
+    session.commit()
+
+
+def _capture_errors(fn):
+    def wrapped(*args, **kwargs) -> Exception | None:
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            return e
+        return None
+
+    return wrapped
+
+
 def apply_rules(txs: Sequence[models.Transaction], scope: rules.Scope):
     pass
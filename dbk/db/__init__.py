@@ -1,20 +1,85 @@
 import os
+from typing import Literal
 
 import sqlalchemy as sa
 import sqlalchemy.orm as orm
+import sqlalchemy.pool as pool
 
 from dbk.core import models
+from dbk.settings import SqliteSettings
 
+from ._migrations import (
+    Migration,
+    MigrationError,
+    Progress,
+    backfill,
+    current_version,
+    migrate,
+    pending,
+    rebuild_table,
+    reset,
+)
+from ._versions import MIGRATIONS
 
-def make_connection(db_url: str) -> sa.Engine:
-    return sa.create_engine(db_url)
+type Role = Literal["tui", "cli", "worker"]
+"""The kind of process an engine is created for."""
 
 
-def make_session_factory(conn: sa.Engine) -> orm.sessionmaker[orm.Session]:
-    return orm.sessionmaker(bind=conn)
+def make_connection(
+    db_url: str,
+    settings: SqliteSettings | None = None,
+    role: Role = "cli",
+) -> sa.Engine:
+    """
+    Creates an engine for the database. SQLite connections are tuned with the
+    PRAGMAs in `settings`, and pooled according to the role of the process:
+
+    - `tui` keeps a few connections open, so queries running in threads don't wait
+      for each other or pay for reopening the file.
+    - `cli` uses the default pool, it runs one command and exits.
+    - `worker` opens a connection per checkout, workers are short-lived processes
+      and must not hold connections, and with them locks, between jobs.
+    """
+    url = sa.make_url(db_url)
+    if url.get_backend_name() != "sqlite":
+        return sa.create_engine(url)
+
+    kwargs = {}
+    in_memory = url.database in (None, "", ":memory:")
+    if not in_memory:
+        match role:
+            case "tui":
+                kwargs.update(poolclass=pool.QueuePool, pool_size=4, max_overflow=4)
+            case "worker":
+                kwargs.update(poolclass=pool.NullPool)
+
+    engine = sa.create_engine(url, **kwargs)
+    pragmas = _pragmas(settings or SqliteSettings(), in_memory)
+
+    @sa.event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_conn, _):
+        cursor = dbapi_conn.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
 
+    return engine
 
-def migrate(conn: sa.Engine, *metadatas: sa.MetaData):
-    for metadata in metadatas:
-        metadata.drop_all(conn)
-        metadata.create_all(conn)
+
+def _pragmas(settings: SqliteSettings, in_memory: bool) -> dict[str, str | int]:
+    pragmas: dict[str, str | int] = {
+        "synchronous": settings.synchronous,
+        "cache_size": settings.cache_size,
+        "temp_store": settings.temp_store,
+        "busy_timeout": settings.busy_timeout,
+        "foreign_keys": "on" if settings.foreign_keys else "off",
+    }
+    # an in-memory database has no file to journal or map
+    if not in_memory:
+        pragmas["journal_mode"] = settings.journal_mode
+        pragmas["mmap_size"] = settings.mmap_size
+    return pragmas
+
+
+def make_session_factory(conn: sa.Engine) -> orm.sessionmaker[orm.Session]:
+    return orm.sessionmaker(bind=conn)
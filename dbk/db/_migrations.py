@@ -0,0 +1,288 @@
+"""
+Versioned schema migrations. The version of a database is the highest version in its
+`schema_migrations` table, and each `Migration` above it is applied in order, each in
+its own transaction, so a failed step leaves the database at the previous version.
+
+Migration steps are plain SQL. They describe the schema as it was when the step was
+written, and must not depend on the models, which keep changing after it. Triggers
+are the exception: they hold no data, so steps recreate them from their current
+definition with `models.create_triggers`. Tables derived by triggers are refilled
+with their current definition too, by the last step that changes what they are
+derived from.
+"""
+
+import contextlib
+import functools
+import logging
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Iterator, Mapping, Sequence
+
+import sqlalchemy as sa
+
+from dbk.errors import DbkError
+
+log = logging.getLogger(__name__)
+
+BATCH_SIZE = 10_000
+"""Rows copied or updated per statement by `rebuild_table` and `backfill`."""
+
+type Progress = Callable[[int, int], None]
+"""Called with the amount of work done and the total, e.g. rows visited of all rows."""
+
+_create_table = re.compile(r"^\s*CREATE\s+TABLE\s+\"?\w+\"?\s*\(", re.IGNORECASE)
+
+_metadata = sa.MetaData()
+
+schema_migrations = sa.Table(
+    "schema_migrations",
+    _metadata,
+    sa.Column("version", sa.Integer, primary_key=True),
+    sa.Column("name", sa.String, nullable=False),
+    sa.Column("applied_at", sa.DateTime, nullable=False),
+)
+
+
+class MigrationError(DbkError):
+    pass
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    upgrade: Callable[[sa.Connection, Progress], None]
+    foreign_keys_off: bool = False
+    """
+    Whether foreign keys are disabled while the step runs, which is required to drop
+    a table that other tables refer to, as `rebuild_table` does.
+    """
+
+
+def current_version(conn: sa.Connection) -> int | None:
+    """Version of the database, or None if it does not record one."""
+    if not sa.inspect(conn).has_table(schema_migrations.name):
+        return None
+    return conn.scalar(sa.select(sa.func.max(schema_migrations.c.version))) or 0
+
+
+def pending(
+    engine: sa.Engine, migrations: Sequence[Migration] | None = None
+) -> list[Migration]:
+    """Migrations that have not been applied to the database yet."""
+    migrations = _default_migrations() if migrations is None else migrations
+    with engine.connect() as conn:
+        version = current_version(conn)
+        if version is None and not sa.inspect(conn).get_table_names():
+            return []
+    return [m for m in migrations if m.version > (version or 0)]
+
+
+def migrate(
+    engine: sa.Engine,
+    *metadatas: sa.MetaData,
+    migrations: Sequence[Migration] | None = None,
+    progress: Callable[[Migration, int, int], None] | None = None,
+) -> list[Migration]:
+    """
+    Brings the database up to date. An empty database is created from `metadatas` and
+    stamped with the latest version. A database created before versions were
+    recorded is assumed to have the schema of version 0.
+
+    :return: the migrations that were applied
+    """
+    migrations = _default_migrations() if migrations is None else migrations
+    _check_order(migrations)
+
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+
+        version = current_version(conn)
+        if version is None and not sa.inspect(conn).get_table_names():
+            with _transaction(conn):
+                for metadata in metadatas:
+                    metadata.create_all(conn)
+                _metadata.create_all(conn)
+                _stamp(conn, migrations)
+            return []
+
+        if version is None:
+            log.info("database has no schema version, assuming version 0")
+            with _transaction(conn):
+                _metadata.create_all(conn)
+            version = 0
+
+        applied = []
+        for m in migrations:
+            if m.version <= version:
+                continue
+            log.info("applying migration %s: %s", m.version, m.name)
+            _apply(conn, m, progress)
+            applied.append(m)
+        return applied
+
+
+def reset(
+    engine: sa.Engine,
+    *metadatas: sa.MetaData,
+    migrations: Sequence[Migration] | None = None,
+):
+    """Drops all data and creates the latest schema."""
+    migrations = _default_migrations() if migrations is None else migrations
+    with engine.begin() as conn:
+        for metadata in metadatas:
+            metadata.drop_all(conn)
+        _metadata.drop_all(conn)
+
+        for metadata in metadatas:
+            metadata.create_all(conn)
+        _metadata.create_all(conn)
+        _stamp(conn, migrations)
+
+
+def rebuild_table(
+    conn: sa.Connection,
+    table: str,
+    create: str,
+    columns: Mapping[str, str] | None = None,
+    progress: Progress | None = None,
+    batch_size: int = BATCH_SIZE,
+):
+    """
+    Recreates `table` from the `CREATE TABLE` statement `create` and copies its rows
+    over, for the changes SQLite's `ALTER TABLE` cannot make, like dropping a
+    constraint or changing the type of a column. The indexes and triggers of the table
+    are dropped with it and have to be created again by the caller.
+
+    Must run in a migration with `foreign_keys_off`.
+
+    :param columns: SQL expressions over the old table that give the columns of the new
+        one, by default the columns both tables have
+    """
+    new = f"_{table}_new"
+    ddl, n = _create_table.subn(f"CREATE TABLE {new} (", create, count=1)
+    if not n:
+        raise MigrationError(f"Expected a CREATE TABLE statement for {table}")
+    conn.exec_driver_sql(ddl)
+
+    if columns is None:
+        old_columns = _columns(conn, table)
+        columns = {c: c for c in _columns(conn, new) if c in old_columns}
+
+    names = ", ".join(columns)
+    exprs = ", ".join(columns.values())
+    copy = (
+        f"INSERT INTO {new} ({names}) SELECT {exprs} FROM {table} "
+        "WHERE rowid BETWEEN ? AND ?"
+    )
+    for lo, hi in _batches(conn, table, batch_size, progress):
+        conn.exec_driver_sql(copy, (lo, hi))
+
+    conn.exec_driver_sql(f"DROP TABLE {table}")
+    conn.exec_driver_sql(f"ALTER TABLE {new} RENAME TO {table}")
+
+
+def backfill(
+    conn: sa.Connection,
+    table: str,
+    assignments: str,
+    where: str | None = None,
+    progress: Progress | None = None,
+    batch_size: int = BATCH_SIZE,
+):
+    """
+    Runs `UPDATE table SET assignments WHERE where` in batches of rows, so a large
+    table is updated with bounded statements and progress can be reported.
+    """
+    update = f"UPDATE {table} SET {assignments} WHERE rowid BETWEEN ? AND ?"
+    if where:
+        update += f" AND ({where})"
+    for lo, hi in _batches(conn, table, batch_size, progress):
+        conn.exec_driver_sql(update, (lo, hi))
+
+
+def _batches(
+    conn: sa.Connection,
+    table: str,
+    batch_size: int,
+    progress: Progress | None,
+) -> Iterator[tuple[int, int]]:
+    """Ranges of rowids covering the table, `batch_size` rowids at a time."""
+    lo, hi = conn.exec_driver_sql(f"SELECT min(rowid), max(rowid) FROM {table}").one()
+    if lo is None:
+        return
+
+    for start in range(lo, hi + 1, batch_size):
+        end = min(start + batch_size - 1, hi)
+        yield start, end
+        if progress:
+            progress(end - lo + 1, hi - lo + 1)
+
+
+def _columns(conn: sa.Connection, table: str) -> list[str]:
+    return [r[1] for r in conn.exec_driver_sql(f"PRAGMA table_info({table})")]
+
+
+def _apply(
+    conn: sa.Connection,
+    m: Migration,
+    progress: Callable[[Migration, int, int], None] | None,
+):
+    report: Progress = functools.partial(progress, m) if progress else _no_progress
+
+    if m.foreign_keys_off:
+        # has no effect inside a transaction
+        conn.exec_driver_sql("PRAGMA foreign_keys = OFF")
+    try:
+        with _transaction(conn):
+            m.upgrade(conn, report)
+            if m.foreign_keys_off:
+                violations = conn.exec_driver_sql("PRAGMA foreign_key_check").all()
+                if violations:
+                    raise MigrationError(
+                        f"Migration {m.version} violates foreign keys: {violations}"
+                    )
+            _stamp(conn, [m])
+    finally:
+        if m.foreign_keys_off:
+            conn.exec_driver_sql("PRAGMA foreign_keys = ON")
+
+
+@contextlib.contextmanager
+def _transaction(conn: sa.Connection) -> Iterator[None]:
+    # the connection is in autocommit mode, as the sqlite3 module only begins
+    # transactions before DML statements and would commit DDL as it runs
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        conn.exec_driver_sql("ROLLBACK")
+        raise
+    conn.exec_driver_sql("COMMIT")
+
+
+def _stamp(conn: sa.Connection, migrations: Sequence[Migration]):
+    if not migrations:
+        return
+    now = datetime.now()
+    conn.execute(
+        sa.insert(schema_migrations),
+        [dict(version=m.version, name=m.name, applied_at=now) for m in migrations],
+    )
+
+
+def _check_order(migrations: Sequence[Migration]):
+    versions = [m.version for m in migrations]
+    if versions != sorted(set(versions)) or (versions and versions[0] < 1):
+        raise MigrationError(f"Migration versions must be increasing: {versions}")
+
+
+def _no_progress(done: int, total: int):
+    pass
+
+
+def _default_migrations() -> Sequence[Migration]:
+    from ._versions import MIGRATIONS
+
+    return MIGRATIONS
@@ -0,0 +1,385 @@
+"""
+The migration steps of the dbk schema, oldest first. Version 0 is the schema of
+databases created before versions were recorded.
+"""
+
+import sqlalchemy as sa
+
+from dbk.core import models
+
+from ._migrations import Migration, Progress, rebuild_table
+
+
+def _transactions_partial_unique(conn: sa.Connection, progress: Progress):
+    # the unique constraint of the table becomes two partial unique indexes, so
+    # transactions with an external reference are deduplicated by it alone
+    rebuild_table(
+        conn,
+        "transactions",
+        """
+        CREATE TABLE transactions (
+            id INTEGER NOT NULL,
+            book_id INTEGER NOT NULL,
+            conn_id INTEGER,
+            source_id INTEGER,
+            credit_account_id INTEGER,
+            debit_account_id INTEGER,
+            duplicate_id INTEGER,
+            type VARCHAR(8) NOT NULL,
+            time DATETIME NOT NULL,
+            description VARCHAR NOT NULL,
+            user_description VARCHAR,
+            credit_amount DOUBLE,
+            debit_amount DOUBLE,
+            external_ref VARCHAR,
+            PRIMARY KEY (id),
+            FOREIGN KEY(book_id) REFERENCES books (id) ON DELETE cascade,
+            FOREIGN KEY(conn_id) REFERENCES connections (id) ON DELETE cascade,
+            FOREIGN KEY(source_id) REFERENCES data_sources (id) ON DELETE cascade,
+            FOREIGN KEY(credit_account_id) REFERENCES accounts (id) ON DELETE cascade,
+            FOREIGN KEY(debit_account_id) REFERENCES accounts (id) ON DELETE cascade,
+            FOREIGN KEY(duplicate_id) REFERENCES transactions (id)
+        )
+        """,
+        progress=progress,
+    )
+    conn.exec_driver_sql("""
+        CREATE UNIQUE INDEX unique_transaction_per_connection
+        ON transactions (conn_id, time, description, credit_amount, debit_amount)
+        WHERE external_ref IS NULL
+        """)
+    conn.exec_driver_sql("""
+        CREATE UNIQUE INDEX unique_external_ref_per_connection
+        ON transactions (conn_id, external_ref)
+        WHERE external_ref IS NOT NULL
+        """)
+
+
+def _data_source_sync_checkpoints(conn: sa.Connection, progress: Progress):
+    conn.exec_driver_sql("ALTER TABLE data_sources ADD COLUMN sync_row INTEGER")
+    conn.exec_driver_sql("ALTER TABLE data_sources ADD COLUMN sync_offset INTEGER")
+
+
+def _data_source_blobs(conn: sa.Connection, progress: Progress):
+    conn.exec_driver_sql("""
+        CREATE TABLE data_source_blobs (
+            source_id INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (source_id),
+            FOREIGN KEY(source_id) REFERENCES data_sources (id) ON DELETE cascade
+        )
+        """)
+
+
+def _hot_query_indexes(conn: sa.Connection, progress: Progress):
+    uncategorized = "credit_account_id IS NULL OR debit_account_id IS NULL"
+    for ddl in [
+        "CREATE INDEX ix_accounts_parent_id ON accounts (parent_id)",
+        "CREATE INDEX ix_accounts_conn_id ON accounts (conn_id)",
+        "CREATE INDEX ix_transactions_book_time ON transactions (book_id, time, id)",
+        "CREATE INDEX ix_transactions_time ON transactions (time, id)",
+        "CREATE INDEX ix_transactions_uncategorized_book_time "
+        f"ON transactions (book_id, time, id) WHERE {uncategorized}",
+        "CREATE INDEX ix_transactions_uncategorized_time "
+        f"ON transactions (time, id) WHERE {uncategorized}",
+        "CREATE INDEX ix_transactions_conn_id ON transactions (conn_id)",
+        "CREATE INDEX ix_transactions_source_id ON transactions (source_id)",
+        "CREATE INDEX ix_transactions_credit_account_id "
+        "ON transactions (credit_account_id)",
+        "CREATE INDEX ix_transactions_debit_account_id "
+        "ON transactions (debit_account_id)",
+        "CREATE INDEX ix_transactions_duplicate_id ON transactions (duplicate_id)",
+    ]:
+        conn.exec_driver_sql(ddl)
+
+
+def _transaction_counts(conn: sa.Connection, progress: Progress):
+    conn.exec_driver_sql("""
+        CREATE TABLE transaction_counts (
+            scope VARCHAR(10) NOT NULL,
+            key_id INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            uncategorized INTEGER NOT NULL,
+            PRIMARY KEY (scope, key_id)
+        )
+        """)
+    models.create_triggers(conn)
+    models.rebuild_transaction_counts(conn)
+
+
+def _account_daily_balances(conn: sa.Connection, progress: Progress):
+    conn.exec_driver_sql("""
+        CREATE TABLE account_daily_balances (
+            account_id INTEGER NOT NULL,
+            day DATE NOT NULL,
+            net_change DOUBLE NOT NULL,
+            balance DOUBLE NOT NULL,
+            PRIMARY KEY (account_id, day),
+            FOREIGN KEY(account_id) REFERENCES accounts (id) ON DELETE cascade
+        )
+        """)
+    conn.exec_driver_sql("""
+        CREATE TABLE account_balance_dirty (
+            account_id INTEGER NOT NULL,
+            from_day DATE NOT NULL,
+            PRIMARY KEY (account_id),
+            FOREIGN KEY(account_id) REFERENCES accounts (id) ON DELETE cascade
+        )
+        """)
+    # the balances of the amounts and times of this version, migration 8 recomputes
+    # them from the columns that replace those
+    conn.exec_driver_sql("""
+        INSERT INTO account_daily_balances (account_id, day, net_change, balance)
+        SELECT account_id, day, net_change,
+            sum(net_change) OVER (PARTITION BY account_id ORDER BY day)
+        FROM (
+            SELECT account_id, day, sum(amount) AS net_change FROM (
+                SELECT debit_account_id AS account_id, date(time) AS day,
+                    coalesce(debit_amount, 0) AS amount
+                FROM transactions
+                WHERE debit_account_id IS NOT NULL
+                UNION ALL
+                SELECT credit_account_id, date(time), -coalesce(credit_amount, 0)
+                FROM transactions
+                WHERE credit_account_id IS NOT NULL
+            )
+            GROUP BY account_id, day
+        )
+        """)
+    models.create_triggers(conn)
+
+
+def _account_closure(conn: sa.Connection, progress: Progress):
+    conn.exec_driver_sql("""
+        CREATE TABLE account_closure (
+            ancestor_id INTEGER NOT NULL,
+            descendant_id INTEGER NOT NULL,
+            depth INTEGER NOT NULL,
+            PRIMARY KEY (ancestor_id, descendant_id),
+            FOREIGN KEY(ancestor_id) REFERENCES accounts (id) ON DELETE cascade,
+            FOREIGN KEY(descendant_id) REFERENCES accounts (id) ON DELETE cascade
+        )
+        """)
+    conn.exec_driver_sql(
+        "CREATE INDEX ix_account_closure_descendant_id "
+        "ON account_closure (descendant_id)"
+    )
+    models.create_triggers(conn)
+    models.rebuild_account_closure(conn)
+
+
+def _integer_amounts_and_times(conn: sa.Connection, progress: Progress):
+    # rows are encoded by the same functions as new transactions, so an amount
+    # converts exactly as if it had been imported now
+    driver = conn.connection.driver_connection
+    driver.create_function(  # type: ignore
+        "currency_exponent", 1, models.currency_exponent, deterministic=True
+    )
+    driver.create_function(  # type: ignore
+        "to_units", 2, models.to_units, deterministic=True
+    )
+
+    currency = (
+        "coalesce("
+        "(SELECT currency FROM accounts WHERE id = credit_account_id), "
+        "(SELECT currency FROM accounts WHERE id = debit_account_id), "
+        "(SELECT currency FROM books WHERE id = book_id))"
+    )
+    exponent = f"currency_exponent({currency})"
+    columns = {
+        c: c
+        for c in [
+            "id",
+            "book_id",
+            "conn_id",
+            "source_id",
+            "credit_account_id",
+            "debit_account_id",
+            "duplicate_id",
+            "type",
+            "description",
+            "user_description",
+            "external_ref",
+        ]
+    }
+    columns |= {
+        "time": "CAST(strftime('%s', time) AS INTEGER)",
+        "credit_units": f"to_units(credit_amount, {exponent})",
+        "debit_units": f"to_units(debit_amount, {exponent})",
+        "amount_exponent": exponent,
+    }
+    rebuild_table(
+        conn,
+        "transactions",
+        """
+        CREATE TABLE transactions (
+            id INTEGER NOT NULL,
+            book_id INTEGER NOT NULL,
+            conn_id INTEGER,
+            source_id INTEGER,
+            credit_account_id INTEGER,
+            debit_account_id INTEGER,
+            duplicate_id INTEGER,
+            type VARCHAR(8) NOT NULL,
+            time INTEGER NOT NULL,
+            description VARCHAR NOT NULL,
+            user_description VARCHAR,
+            credit_units INTEGER,
+            debit_units INTEGER,
+            amount_exponent INTEGER NOT NULL,
+            external_ref VARCHAR,
+            PRIMARY KEY (id),
+            FOREIGN KEY(book_id) REFERENCES books (id) ON DELETE cascade,
+            FOREIGN KEY(conn_id) REFERENCES connections (id) ON DELETE cascade,
+            FOREIGN KEY(source_id) REFERENCES data_sources (id) ON DELETE cascade,
+            FOREIGN KEY(credit_account_id) REFERENCES accounts (id) ON DELETE cascade,
+            FOREIGN KEY(debit_account_id) REFERENCES accounts (id) ON DELETE cascade,
+            FOREIGN KEY(duplicate_id) REFERENCES transactions (id)
+        )
+        """,
+        columns=columns,
+        progress=progress,
+    )
+    uncategorized = "credit_account_id IS NULL OR debit_account_id IS NULL"
+    for ddl in [
+        "CREATE UNIQUE INDEX unique_transaction_per_connection "
+        "ON transactions (conn_id, time, description, credit_units, debit_units) "
+        "WHERE external_ref IS NULL",
+        "CREATE UNIQUE INDEX unique_external_ref_per_connection "
+        "ON transactions (conn_id, external_ref) WHERE external_ref IS NOT NULL",
+        "CREATE INDEX ix_transactions_book_time ON transactions (book_id, time, id)",
+        "CREATE INDEX ix_transactions_time ON transactions (time, id)",
+        "CREATE INDEX ix_transactions_uncategorized_book_time "
+        f"ON transactions (book_id, time, id) WHERE {uncategorized}",
+        "CREATE INDEX ix_transactions_uncategorized_time "
+        f"ON transactions (time, id) WHERE {uncategorized}",
+        "CREATE INDEX ix_transactions_conn_id ON transactions (conn_id)",
+        "CREATE INDEX ix_transactions_source_id ON transactions (source_id)",
+        "CREATE INDEX ix_transactions_credit_account_id "
+        "ON transactions (credit_account_id)",
+        "CREATE INDEX ix_transactions_debit_account_id "
+        "ON transactions (debit_account_id)",
+        "CREATE INDEX ix_transactions_duplicate_id ON transactions (duplicate_id)",
+    ]:
+        conn.exec_driver_sql(ddl)
+
+    # balances are derived, and recomputed in units rather than converted
+    conn.exec_driver_sql("DROP TABLE account_daily_balances")
+    conn.exec_driver_sql("""
+        CREATE TABLE account_daily_balances (
+            account_id INTEGER NOT NULL,
+            day DATE NOT NULL,
+            net_change INTEGER NOT NULL,
+            balance INTEGER NOT NULL,
+            PRIMARY KEY (account_id, day),
+            FOREIGN KEY(account_id) REFERENCES accounts (id) ON DELETE cascade
+        )
+        """)
+    models.create_triggers(conn)
+    models.rebuild_daily_balances(conn)
+
+
+def _transaction_search(conn: sa.Connection, progress: Progress):
+    conn.exec_driver_sql("""
+        CREATE VIRTUAL TABLE transactions_fts USING fts5(
+            description,
+            user_description,
+            content='transactions',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """)
+    models.create_triggers(conn)
+    models.rebuild_search_index(conn)
+
+
+def _transaction_day_changes(conn: sa.Connection, progress: Progress):
+    # starts empty, as caches only look at the changes made after they were filled
+    conn.exec_driver_sql("""
+        CREATE TABLE transaction_day_changes (
+            book_id INTEGER NOT NULL,
+            day DATE NOT NULL,
+            version INTEGER NOT NULL,
+            PRIMARY KEY (book_id, day)
+        )
+        """)
+    conn.exec_driver_sql(
+        "CREATE INDEX ix_transaction_day_changes_version "
+        "ON transaction_day_changes (version)"
+    )
+    models.create_triggers(conn)
+
+
+def _prices(conn: sa.Connection, progress: Progress):
+    conn.exec_driver_sql("""
+        CREATE TABLE prices (
+            instrument VARCHAR NOT NULL,
+            day DATE NOT NULL,
+            price DOUBLE NOT NULL,
+            PRIMARY KEY (instrument, day)
+        ) WITHOUT ROWID
+        """)
+
+
+def _fx_rates(conn: sa.Connection, progress: Progress):
+    conn.exec_driver_sql("""
+        CREATE TABLE fx_rates (
+            base VARCHAR NOT NULL,
+            quote VARCHAR NOT NULL,
+            day DATE NOT NULL,
+            rate DOUBLE NOT NULL,
+            PRIMARY KEY (base, quote, day)
+        ) WITHOUT ROWID
+        """)
+
+
+def _data_versions(conn: sa.Connection, progress: Progress):
+    # starts empty, caches only compare versions they have seen in this database
+    conn.exec_driver_sql("""
+        CREATE TABLE data_versions (
+            book_id INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            PRIMARY KEY (book_id)
+        )
+        """)
+    models.create_triggers(conn)
+
+
+def _description_day_changes(conn: sa.Connection, progress: Progress):
+    # snapshots of the transactions read changed days again, descriptions included
+    models.create_triggers(conn)
+
+
+def _price_currencies(conn: sa.Connection, progress: Progress):
+    # prices imported before were in the currency of the book, which None stands for
+    conn.exec_driver_sql("ALTER TABLE prices ADD COLUMN currency VARCHAR")
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(
+        1,
+        "transactions partial unique indexes",
+        _transactions_partial_unique,
+        foreign_keys_off=True,
+    ),
+    Migration(2, "data source sync checkpoints", _data_source_sync_checkpoints),
+    Migration(3, "data source blobs", _data_source_blobs),
+    Migration(4, "hot query indexes", _hot_query_indexes),
+    Migration(5, "transaction counts", _transaction_counts),
+    Migration(6, "account daily balances", _account_daily_balances),
+    Migration(7, "account closure", _account_closure),
+    Migration(
+        8,
+        "integer amounts and times",
+        _integer_amounts_and_times,
+        foreign_keys_off=True,
+    ),
+    Migration(9, "transaction search", _transaction_search),
+    Migration(10, "transaction day changes", _transaction_day_changes),
+    Migration(11, "prices", _prices),
+    Migration(12, "fx rates", _fx_rates),
+    Migration(13, "data versions", _data_versions),
+    Migration(14, "description day changes", _description_day_changes),
+    Migration(15, "price currencies", _price_currencies),
+]
@@ -1,12 +1,41 @@
 from pathlib import Path
+from typing import Literal
 
-from pydantic import Field
+from pydantic import BaseModel, Field
 from pydantic_settings import BaseSettings
 
 
+class SqliteSettings(BaseModel):
+    """PRAGMAs applied to every new SQLite connection."""
+
+    journal_mode: Literal["wal", "delete", "truncate", "memory"] = "wal"
+    """`wal` lets readers, like the TUI, run while a worker is writing."""
+    synchronous: Literal["off", "normal", "full"] = "normal"
+    """`normal` is durable in WAL mode except on power loss, and fsyncs far less."""
+    cache_size: int = -64 * 1024
+    """Page cache per connection, in pages, or in KiB when negative."""
+    mmap_size: int = Field(default=256 * 1024 * 1024, ge=0)
+    """Bytes of the database file read through a memory map instead of read(2)."""
+    temp_store: Literal["default", "file", "memory"] = "memory"
+    busy_timeout: int = Field(default=5000, ge=0)
+    """Milliseconds to wait for a lock held by another connection."""
+    foreign_keys: bool = True
+
+
 class RootConfig(BaseSettings):
     db_url: str
+    sqlite: SqliteSettings = SqliteSettings()
 
 
 class UserConfig(BaseSettings):
     working_dir: Path = Path.home() / ".dbk"
+    storage_backend: Literal["local", "cas", "compressed", "sqlite"] = "local"
+    """
+    Where the contents of data sources are kept. `local` stores a copy per data
+    source, `cas` stores each distinct file once, keyed by its hash, `compressed`
+    stores a compressed copy per data source and `sqlite` stores them in the
+    book's database.
+    """
+    storage_codec: Literal["gzip", "lzma"] = "gzip"
+    """Compression used by the `compressed` storage backend."""
+    storage_compression_level: int = Field(default=6, ge=0, le=9)
@@ -6,11 +6,18 @@ from textual.app import App
 from textual.widgets import Footer, Header
 
 from dbk.background import WorkerPool
-from dbk.core import persist, rules
+from dbk.core import cache, persist, reports, rules, snapshot
+from dbk.tui.models.balance_sheet import BalanceSheetModel
+from dbk.tui.models.portfolio import PortfolioModel
+from dbk.tui.models.runner import QueryRunner
+from dbk.tui.models.spending import SpendingModel
+from dbk.tui.widgets.balance_sheet import BalanceSheet
 from dbk.tui.widgets.book import Book, BookModel
 from dbk.tui.widgets.nav import Navigator, RouteInfo
+from dbk.tui.widgets.portfolio import Portfolio
 from dbk.tui.widgets.routing import Routable, Router
 from dbk.tui.widgets.sidebar import NavTree
+from dbk.tui.widgets.spending import Spending
 from dbk.tui.widgets.transactions import Transactions, TransactionsModel
 
 log = logging.getLogger(__name__)
@@ -22,10 +29,16 @@ class MyAppModel:
         session_factory: orm.sessionmaker,
         background_workers: WorkerPool,
         storage: persist.Storage,
+        query_runner: QueryRunner,
+        snapshots: snapshot.SnapshotCache | None = None,
     ):
         self.session_factory = session_factory
         self.background_workers = background_workers
         self.storage = storage
+        self.query_runner = query_runner
+        self.spending_cache = reports.SpendingCache()
+        self.result_cache = cache.ResultCache()
+        self.snapshots = snapshots
         self._rules: rules.Scope | None = None
 
     def book_model(self, book_id: int):
@@ -33,6 +46,17 @@ class MyAppModel:
             book_id, self.session_factory, self.background_workers, self.storage
         )
 
+    def balance_sheet_model(self, book_id: int):
+        return BalanceSheetModel(self.session_factory, self.result_cache, book_id)
+
+    def portfolio_model(self, book_id: int):
+        return PortfolioModel(
+            self.session_factory, self.result_cache, book_id, self.snapshots
+        )
+
+    def spending_model(self, book_id: int):
+        return SpendingModel(self.session_factory, self.spending_cache, book_id)
+
     def transactions_model(self):
         return TransactionsModel(self.session_factory, self.rules)
 
@@ -80,5 +104,11 @@ class MyApp(App, Routable):
                 content = Book(self._model.book_model(book_id))
                 # content.update_route(route[2:])
                 return content
+            case [BalanceSheet.route_name, int(book_id)]:
+                return BalanceSheet(self._model.balance_sheet_model(book_id))
+            case [Portfolio.route_name, int(book_id)]:
+                return Portfolio(self._model.portfolio_model(book_id))
+            case [Spending.route_name, int(book_id)]:
+                return Spending(self._model.spending_model(book_id))
             case [Transactions.route_name]:
                 return Transactions(self._model.transactions_model())
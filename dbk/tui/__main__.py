@@ -3,10 +3,11 @@ import os
 import sqlalchemy.orm as orm
 
 from dbk import background, core, db
-from dbk.core import persist
+from dbk.core import persist, snapshot
 from dbk.logging import setup_logging
 from dbk.settings import RootConfig, UserConfig
 from dbk.tui import MyApp, MyAppModel
+from dbk.tui.models.runner import QueryRunner
 
 root_config = RootConfig()  # type: ignore
 user_config = UserConfig()
@@ -16,13 +17,14 @@ os.chdir(user_config.working_dir)
 
 setup_logging("dbk.tui.log")
 
-engine = db.make_connection(root_config.db_url)
+engine = db.make_connection(root_config.db_url, root_config.sqlite, role="tui")
 session = orm.sessionmaker(bind=engine)
-storage = persist.LocalStorage(user_config)
+storage = persist.make_storage(user_config, engine)
 
 core.initialize(session)
 
-with background.WorkerPool(3) as pool:
-    model = MyAppModel(session, pool, storage)
+with background.WorkerPool(3) as pool, QueryRunner() as query_runner:
+    snapshots = snapshot.make_snapshot_cache(user_config)
+    model = MyAppModel(session, pool, storage, query_runner, snapshots)
     app = MyApp(model)
     app.run()
@@ -40,6 +40,15 @@ def _extract_info(e: Exception) -> ErrorInfo:
             return ErrorInfo(str(e), None, "error")
 
 
+def notify_error(
+    app: TextualApp,
+    e: Exception,
+    error_interpreter: ErrorInterpreter = _extract_info,
+):
+    err = error_interpreter(e)
+    app.notify(err.message, title=err.title or "", severity=err.severity)
+
+
 def use_error_handler(
     f=None,
     /,
@@ -61,8 +70,7 @@ def use_error_handler(
                         app = widget.app
                     case _:
                         raise RuntimeError("Could not find app to handle error.") from e
-            err = error_interpreter(e)
-            app.notify(err.message, title=err.title or "", severity=err.severity)
+            notify_error(app, e, error_interpreter)
 
     def wrapper(f):
         @wraps(f)
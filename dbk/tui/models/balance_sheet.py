@@ -0,0 +1,26 @@
+from datetime import date
+
+import sqlalchemy.orm as orm
+
+from dbk.core import cache, reports
+
+
+class BalanceSheetModel:
+    def __init__(
+        self,
+        session_factory: orm.sessionmaker[orm.Session],
+        results: cache.ResultCache,
+        book_id: int,
+    ):
+        self._session_factory = session_factory
+        self._results = results
+        self.book_id = book_id
+        self.day = date.today()
+
+    def balance_sheet(self) -> reports.BalanceSheet:
+        with self._session_factory() as s:
+            return self._results.get(
+                ("balance-sheet", self.book_id, self.day),
+                cache.data_version(s, self.book_id),
+                lambda: reports.balance_sheet(s, self.book_id, self.day),
+            )
@@ -1,6 +1,5 @@
 import logging
 
-import sqlalchemy as sa
 import sqlalchemy.orm as orm
 from pydantic import BaseModel
 
@@ -10,6 +9,7 @@ from dbk.core import models, persist, providers, rules
 from .account import AccountModel
 from .connection import ConnectionModel
 from .modals import CreateAccountArgs, CreateConnectionArgs
+from .rows import AccountMap, AccountRow, ConnectionRow, load
 
 log = logging.getLogger(__name__)
 
@@ -28,6 +28,7 @@ class BookModel:
         self._storage = storage
         self._rules_engine = rules_engine
         self.book_id = book_id
+        self.accounts = AccountMap(session_factory, book_id)
 
     def account_model(self, account_id: int):
         return AccountModel(self._session_factory, account_id)
@@ -39,33 +40,19 @@ class BookModel:
         with self._session_factory() as sess:
             return sess.get_one(models.Book, self.book_id)
 
-    def connections(self):
+    def connections(self) -> list[ConnectionRow]:
         with self._session_factory() as s:
-            s.expire_on_commit = False
-            stmt = sa.select(models.Connection).where(
+            stmt = ConnectionRow.select().where(
                 models.Connection.book_id == self.book_id
             )
-            return s.scalars(stmt).all()
+            return load(s, ConnectionRow, stmt)
 
-    def root_nodes(self):
-        with self._session_factory() as s:
-            s.expire_on_commit = False
-            stmt = sa.select(models.Account).where(
-                models.Account.book_id == self.book_id,
-                models.Account.is_root == True,
-            )
-            return list(s.scalars(stmt).all())
+    def root_nodes(self) -> list[AccountRow]:
+        self.accounts.reload()
+        return self.accounts.roots()
 
-    def child_nodes(self, parent: models.Account) -> list[models.Account]:
-        with self._session_factory() as s:
-            s.expire_on_commit = False
-            return list(
-                s.scalars(
-                    sa.select(models.Account).where(
-                        models.Account.parent_id == parent.id
-                    )
-                ).all()
-            )
+    def child_nodes(self, parent: AccountRow) -> list[AccountRow]:
+        return self.accounts.children(parent.id)
 
     def create_connection(self, args: CreateConnectionArgs):
         with self._session_factory() as s, s.begin():
@@ -83,7 +70,7 @@ class BookModel:
 
         log.info("created connection %s", conn.conn_name)
 
-    def sync_connection(self, conn: models.Connection):
+    def sync_connection(self, conn: ConnectionRow):
         return self._workers.submit(jobs.sync_data_sources(conn.id))
 
     def apply_rules(self):
@@ -103,27 +90,29 @@ class BookModel:
                 currency=parent.book.currency if not args.create_group else None,
             )
             s.add(account)
+        self.accounts.reload()
 
         log.info(f"created account {account.name} under {parent.name}")
 
-    def move_account(self, source: models.Account, target: models.Account):
+    def move_account(self, source: AccountRow, target: AccountRow):
         with self._session_factory() as s, s.begin():
-            s.expire_on_commit = False
-            s.add(source)
-            s.add(target)
-            assert source.id != target.id, "Cannot move an account under itself."
+            below_source = s.scalars(models.AccountClosure.subtree(source.id)).all()
+            assert (
+                target.id not in below_source
+            ), "Cannot move an account under itself or its sub-accounts."
             assert (
                 source.account_type == target.account_type
             ), f"{source.name} can only be moved under another '{source.account_type}' account."
             assert target.is_virtual, f"{target.name} is not a group."
             assert source.is_root == False, "Cannot move root accounts."
-            source.parent_id = target.id
+            s.get_one(models.Account, source.id).parent_id = target.id
+        self.accounts.reload()
 
         log.info(f"moved account '{source.name}' under '{target.name}'")
 
-    def delete_account(self, account: models.Account):
+    def delete_account(self, account: AccountRow):
         with self._session_factory() as s, s.begin():
-            s.delete(account)
-            name = account.name
+            s.delete(s.get_one(models.Account, account.id))
+        self.accounts.reload()
 
-        log.info(f"deleted account {name}")
+        log.info(f"deleted account {account.name}")
@@ -2,11 +2,12 @@ import logging
 from pathlib import Path
 from typing import Sequence
 
-import sqlalchemy as sa
 import sqlalchemy.orm as orm
 
 from dbk.core import models, persist, sync
 
+from .rows import AccountRow, DataSourceRow, load
+
 log = logging.getLogger(__name__)
 
 
@@ -21,31 +22,17 @@ class ConnectionModel:
         self._storage = storage
         self.conn_id = conn_id
 
-    def accounts(self):
+    def accounts(self) -> list[AccountRow]:
         with self._session_factory() as s:
-            s.expire_on_commit = False
-            stmt = sa.select(models.Account).where(
-                models.Account.conn_id == self.conn_id
-            )
-            return list(s.scalars(stmt).all())
+            stmt = AccountRow.select().where(models.Account.conn_id == self.conn_id)
+            return load(s, AccountRow, stmt)
 
-    def data_sources(self):
+    def data_sources(self) -> list[DataSourceRow]:
         with self._session_factory() as s:
-            s.expire_on_commit = False
-            return list(
-                s.scalars(
-                    sa.select(models.DataSource)
-                    .options(
-                        orm.with_expression(
-                            models.DataSource.num_transactions,
-                            models.DataSource.num_transactions_expr(
-                                models.Transaction.source_id
-                            ),
-                        )
-                    )
-                    .where(models.DataSource.conn_id == self.conn_id)
-                ).all()
+            stmt = DataSourceRow.select().where(
+                models.DataSource.conn_id == self.conn_id
             )
+            return load(s, DataSourceRow, stmt)
 
     def add_file_data_sources(self, fnames: Sequence[str]):
         with self._session_factory() as session:
@@ -14,3 +14,11 @@ class CreateAccountArgs:
     parent_id: int
     name: str
     create_group: bool
+
+
+@dataclass
+class SearchArgs:
+    text: str
+    by_rank: bool = False
+    """Whether to sort the matches by relevance instead of time."""
+    uncategorized: bool = False
@@ -0,0 +1,38 @@
+from datetime import date, timedelta
+
+import sqlalchemy.orm as orm
+
+from dbk.core import cache, portfolio, snapshot
+
+HISTORY_DAYS = 365
+"""Number of days of total value shown up to `PortfolioModel.day`."""
+
+
+class PortfolioModel:
+    def __init__(
+        self,
+        session_factory: orm.sessionmaker[orm.Session],
+        results: cache.ResultCache,
+        book_id: int,
+        snapshots: snapshot.SnapshotCache | None = None,
+    ):
+        self._session_factory = session_factory
+        self._results = results
+        self._snapshots = snapshots
+        self.book_id = book_id
+        self.day = date.today()
+
+    def portfolio(self) -> tuple[list[portfolio.Position], portfolio.Valuation]:
+        """The positions on `day`, and the value of the book's holdings up to it."""
+        start = self.day - timedelta(days=HISTORY_DAYS - 1)
+        with self._session_factory() as s:
+            return self._results.get(
+                ("portfolio", self.book_id, self.day),
+                cache.data_version(s, self.book_id),
+                lambda: (
+                    portfolio.positions(s, self.book_id, self.day, self._snapshots),
+                    portfolio.valuation(
+                        s, self.book_id, start, self.day, self._snapshots
+                    ),
+                ),
+            )
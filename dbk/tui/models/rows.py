@@ -0,0 +1,161 @@
+"""
+Read-only rows for the list views of the TUI. They are loaded with Core selects into
+slotted dataclasses, skipping the identity map, change tracking and relationship
+loading of ORM entities, none of which a list view needs.
+"""
+
+import dataclasses
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+from dbk.core import models
+
+
+def columns(row: type, entity: Any, **exprs: Any) -> list[Any]:
+    """
+    Columns to select for the fields of `row`, the attributes of `entity` with the
+    same names, or the expressions given for them.
+    """
+    return [
+        exprs[f.name] if f.name in exprs else getattr(entity, f.name)
+        for f in dataclasses.fields(row)
+    ]
+
+
+@dataclass(frozen=True, slots=True)
+class AccountRow:
+    id: int
+    book_id: int
+    parent_id: int | None
+    name: str
+    account_type: models.AccountType
+    currency: str | None
+    is_root: bool
+    is_virtual: bool
+
+    @classmethod
+    def select(cls):
+        return sa.select(*columns(cls, models.Account))
+
+
+@dataclass(frozen=True, slots=True)
+class ConnectionRow:
+    id: int
+    book_id: int
+    conn_name: str
+    provider_id: str
+
+    @classmethod
+    def select(cls):
+        return sa.select(*columns(cls, models.Connection))
+
+
+@dataclass(frozen=True, slots=True)
+class DataSourceRow:
+    id: int
+    name: str
+    type: models.DataSourceType
+    last_synced: datetime | None
+    num_transactions: int
+
+    @classmethod
+    def select(cls):
+        return sa.select(
+            *columns(
+                cls,
+                models.DataSource,
+                num_transactions=models.DataSource.num_transactions_expr(),
+            )
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class TransactionRow:
+    id: int
+    time: datetime
+    type: models.TransactionType
+    description: str
+    credit_account_id: int | None
+    debit_account_id: int | None
+    credit_units: int | None
+    debit_units: int | None
+    amount_exponent: int
+    rank: float | None = None
+    """Relevance of the transaction to a search, lower is better."""
+
+    @classmethod
+    def select(cls, rank: Any = None):
+        return sa.select(
+            *columns(
+                cls,
+                models.Transaction,
+                rank=sa.null() if rank is None else rank,
+            )
+        )
+
+    @property
+    def credit_amount(self) -> float | None:
+        return models.from_units(self.credit_units, self.amount_exponent)
+
+    @property
+    def debit_amount(self) -> float | None:
+        return models.from_units(self.debit_units, self.amount_exponent)
+
+
+def load[R](session: orm.Session, row: type[R], stmt: sa.Select) -> list[R]:
+    """Runs a select of the columns of `row`, see `columns`."""
+    return [row(*r) for r in session.execute(stmt)]
+
+
+class AccountMap:
+    """
+    The accounts of a book, or of all books, loaded in one query and kept in memory,
+    so list views look up account names and currencies instead of joining accounts
+    on every row, and the account tree expands without a query per level.
+    """
+
+    def __init__(
+        self,
+        session_factory: orm.sessionmaker[orm.Session],
+        book_id: int | None = None,
+    ):
+        self._session_factory = session_factory
+        self.book_id = book_id
+        self._accounts: dict[int, AccountRow] = {}
+        self._children: dict[int | None, list[AccountRow]] = {}
+        self._loaded = False
+
+    def reload(self):
+        stmt = AccountRow.select().order_by(models.Account.id)
+        if self.book_id is not None:
+            stmt = stmt.where(models.Account.book_id == self.book_id)
+        with self._session_factory() as s:
+            accounts = load(s, AccountRow, stmt)
+
+        self._accounts = {a.id: a for a in accounts}
+        self._children = {}
+        for a in accounts:
+            self._children.setdefault(a.parent_id, []).append(a)
+        self._loaded = True
+
+    def get(self, account_id: int | None) -> AccountRow | None:
+        """The account, reloading the map once if it was created since."""
+        if account_id is None:
+            return None
+        if not self._loaded or account_id not in self._accounts:
+            self.reload()
+        return self._accounts.get(account_id)
+
+    def roots(self) -> list[AccountRow]:
+        if not self._loaded:
+            self.reload()
+        return [a for a in self._children.get(None, []) if a.is_root]
+
+    def children(self, parent_id: int) -> list[AccountRow]:
+        if not self._loaded:
+            self.reload()
+        return list(self._children.get(parent_id, []))
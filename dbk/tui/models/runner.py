@@ -0,0 +1,43 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from types import TracebackType
+from typing import Callable, Self
+
+
+class QueryRunner:
+    """
+    Runs the blocking queries of the TUI models on a bounded pool of threads, so the
+    event loop keeps handling input while a query waits, e.g. for a sync job to
+    release the write lock. The pool is as large as the connection pool of the TUI
+    engine, so a query never waits for a connection as well.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="dbk-query"
+        )
+
+    async def run[T](self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Calls `fn` on a thread of the pool. If the calling task is cancelled before
+        the call starts, it never runs; once started, it runs to completion and its
+        result is dropped.
+        """
+        loop = asyncio.get_running_loop()
+        call = functools.partial(fn, *args, **kwargs)
+        return await loop.run_in_executor(self._executor, call)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ):
+        self.shutdown()
@@ -0,0 +1,77 @@
+from dataclasses import dataclass
+from datetime import date
+
+import sqlalchemy.orm as orm
+
+from dbk.core import reports
+from dbk.core.reports import Granularity
+
+from .rows import AccountMap
+
+BUCKETS = {
+    Granularity.day: 31,
+    Granularity.week: 13,
+    Granularity.month: 12,
+}
+"""Number of buckets shown at each granularity."""
+
+
+@dataclass(frozen=True)
+class CategorySpending:
+    name: str
+    amounts: list[float]
+
+    @property
+    def total(self) -> float:
+        return sum(self.amounts)
+
+
+class SpendingModel:
+    """
+    Spending of a book over the last `BUCKETS` buckets up to `end`. Reports come
+    from a cache shared by all views, so moving back to a period or granularity
+    seen before only queries the buckets that changed since.
+    """
+
+    def __init__(
+        self,
+        session_factory: orm.sessionmaker[orm.Session],
+        cache: reports.SpendingCache,
+        book_id: int,
+    ):
+        self._session_factory = session_factory
+        self._cache = cache
+        self.book_id = book_id
+        self.accounts = AccountMap(session_factory, book_id)
+        self.granularity = Granularity.month
+        self.end = date.today()
+
+    @property
+    def start(self) -> date:
+        g = self.granularity
+        bucket = g.bucket(self.end)
+        for _ in range(BUCKETS[g] - 1):
+            bucket = g.previous(bucket)
+        return bucket
+
+    def shift(self, buckets: int):
+        """Moves the period by a number of buckets, back when negative."""
+        g = self.granularity
+        bucket = g.bucket(self.end)
+        for _ in range(abs(buckets)):
+            bucket = g.next(bucket) if buckets > 0 else g.previous(bucket)
+        self.end = bucket
+
+    def spending(self) -> tuple[reports.Spending, list[CategorySpending]]:
+        """The report, and its categories by their total spending, largest first."""
+        with self._session_factory() as s:
+            report = self._cache.get(
+                s, self.book_id, self.start, self.end, self.granularity
+            )
+        categories = []
+        for category, amounts in report.amounts.items():
+            account = self.accounts.get(category)
+            name = account.name if account else "Uncategorized"
+            categories.append(CategorySpending(name, amounts))
+        categories.sort(key=lambda c: c.total, reverse=True)
+        return report, categories
@@ -1,20 +1,32 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 import logging
-from typing import Callable
+import threading
+from typing import Any, Callable
 
 import sqlalchemy as sa
 import sqlalchemy.orm as orm
 
 from dbk.core import models, rules
 
+from .modals import SearchArgs
+from .rows import AccountMap, AccountRow, TransactionRow, load
+
 log = logging.getLogger(__name__)
 
 
-@dataclass
+type Key = tuple[Any, ...]
+"""Values of the sort keys of a row."""
+
+
+@dataclass(frozen=True)
 class Pagination:
     limit: int
     offset: int
     total: int
+    first: Key | None = None
+    """Sort keys of the first row on the current page."""
+    last: Key | None = None
+    """Sort keys of the last row on the current page."""
 
     @property
     def num_pages(self) -> int:
@@ -28,60 +40,219 @@ class Pagination:
     def offset_end(self) -> int:
         return min(self.offset + self.limit, self.total)
 
-    def goto_page(self, page: int):
-        page = min(page, self.num_pages)
-        page = max(page, 0)
-        self.offset = page * self.limit
+
+@dataclass(frozen=True)
+class Page:
+    """A page of transactions, and the state of the model once it is shown."""
+
+    txs: list[TransactionRow]
+    pagination: Pagination
+    accounts: dict[int, AccountRow]
+    """The accounts the transactions refer to, by id."""
 
 
 class TransactionsModel:
+    """
+    Transactions in pages, using keyset pagination: a page is the `limit` rows that
+    follow the last row of the previous page in the sort order, which SQLite finds by
+    seeking into the index on the sort keys. Moving to another page costs the same
+    no matter how deep it is, and the total is read from `transaction_counts` on
+    reload.
+
+    Pages are `TransactionRow`s, and the accounts they refer to are looked up in
+    `accounts`, which is reloaded with the page.
+
+    Methods that move between pages may run on several threads of the TUI's
+    `QueryRunner` at once, and take turns on the model. They leave `pagination` as
+    it is and return a `Page`, which moves the model only once it is passed to
+    `show`, so a query that is cancelled as stale changes nothing.
+    """
+
     def __init__(
         self,
         session_factory: orm.sessionmaker[orm.Session],
         rules_loader: Callable[[], rules.Scope],
     ):
         self.session_factory = session_factory
+        self.accounts = AccountMap(session_factory)
+        self._lock = threading.RLock()
         self.pagination = Pagination(limit=100, offset=0, total=0)
 
-        self.sort_order = sa.desc(models.Transaction.time)
+        self.sort_keys: list[Any] = [
+            models.Transaction.time,
+            models.Transaction.id,
+        ]
+        """Columns the transactions are sorted by, ending with a unique one."""
+        self.descending = True
         self.filter_uncategorized = False
+        self.search: str | None = None
+        """FTS5 query the transactions match, see `models.search_expression`."""
+        self.by_rank = False
+        """Whether the matches of `search` are sorted by relevance."""
 
-    def transactions(self):
-        with self.session_factory() as s:
-            s.expire_on_commit = False
-            stmt = sa.select(
-                models.Transaction,
-                sa.func.count().over(),
+    def _filter(self, stmt, match: bool = True):
+        if self.filter_uncategorized:
+            stmt = stmt.where(
+                sa.or_(
+                    models.Transaction.credit_account_id == None,
+                    models.Transaction.debit_account_id == None,
+                )
             )
-
-            # ensure the credit_account and debit_account relationships are loaded
-            stmt = stmt.options(
-                orm.joinedload(models.Transaction.credit_account),
-                orm.joinedload(models.Transaction.debit_account),
+        if self.search and match:
+            fts = models.transactions_fts
+            stmt = stmt.where(
+                models.Transaction.id.in_(
+                    sa.select(fts.c.rowid).where(models.matches(self.search))
+                )
             )
+        return stmt
 
-            if self.filter_uncategorized:
-                stmt = stmt.where(
-                    sa.or_(
-                        models.Transaction.credit_account_id == None,
-                        models.Transaction.debit_account_id == None,
-                    )
-                )
+    def statement(
+        self,
+        cursor: Key | None = None,
+        forward: bool = True,
+        inclusive: bool = False,
+    ):
+        """
+        Query for a page of transactions.
 
+        :param cursor: sort keys of the row the page starts after, or the first page
+        :param forward: whether the page follows the cursor in the sort order, or
+            precedes it, in which case the rows are returned in reverse
+        :param inclusive: whether the page starts with the cursor row itself
+        """
+        if self.search and self.by_rank:
+            # the rank is only known to a query that joins the matches
+            fts = models.transactions_fts
             stmt = (
-                stmt.order_by(self.sort_order)
-                .offset(self.pagination.offset)
-                .limit(self.pagination.limit)
+                TransactionRow.select(rank=fts.c.rank)
+                .join(fts, fts.c.rowid == models.Transaction.id)
+                .where(models.matches(self.search))
             )
+            stmt = self._filter(stmt, match=False)
+        else:
+            stmt = self._filter(TransactionRow.select())
 
-            results = s.execute(stmt).all()
+        ascending = forward != self.descending
+        if cursor is not None:
+            keys = sa.tuple_(*self.sort_keys)
+            values = sa.tuple_(
+                *(sa.literal(v, k.type) for k, v in zip(self.sort_keys, cursor))
+            )
+            match ascending, inclusive:
+                case True, False:
+                    stmt = stmt.where(keys > values)
+                case True, True:
+                    stmt = stmt.where(keys >= values)
+                case False, False:
+                    stmt = stmt.where(keys < values)
+                case False, True:
+                    stmt = stmt.where(keys <= values)
+
+        order = [k.asc() if ascending else k.desc() for k in self.sort_keys]
+        return stmt.order_by(*order).limit(self.pagination.limit)
+
+    def count_statement(self):
+        """Query for the number of transactions on all pages."""
+        if self.search:
+            # matches are counted from the index, the counters know nothing of them
+            return self._filter(
+                sa.select(sa.func.count()).select_from(models.Transaction)
+            )
+        count = models.TransactionCount
+        return sa.select(
+            count.uncategorized if self.filter_uncategorized else count.total
+        ).where(count.scope == models.CountScope.all, count.key_id == 0)
+
+    def _page(self, s: orm.Session, cursor: Key | None, forward: bool, **kwargs):
+        txs = load(s, TransactionRow, self.statement(cursor, forward, **kwargs))
+        return txs if forward else txs[::-1]
+
+    def _result(self, txs: list[TransactionRow], p: Pagination) -> Page:
+        p = replace(
+            p,
+            first=self.key(txs[0]) if txs else None,
+            last=self.key(txs[-1]) if txs else None,
+        )
+        # resolve accounts now, rather than when the page is rendered
+        accounts = {}
+        for tx in txs:
+            for account_id in (tx.credit_account_id, tx.debit_account_id):
+                if account_id is not None and (a := self.accounts.get(account_id)):
+                    accounts[account_id] = a
+        return Page(txs, p, accounts)
+
+    def key(self, tx: TransactionRow) -> Key:
+        return tuple(getattr(tx, k.key) for k in self.sort_keys)
 
-            if not results:
-                self.pagination.total = 0
-                return []
+    def show(self, page: Page) -> list[TransactionRow]:
+        """Moves to `page`, which is the current one from now on."""
+        self.pagination = page.pagination
+        return page.txs
+
+    def _reload(self, p: Pagination) -> Page:
+        with self._lock:
+            self.accounts.reload()
+            with self.session_factory() as s:
+                p = replace(p, total=s.scalar(self.count_statement()) or 0)
+
+                txs = self._page(s, p.first, True, inclusive=True)
+                if not txs and p.first is not None:
+                    # everything from the current page on is gone
+                    p = replace(p, offset=0)
+                    txs = self._page(s, None, True)
+                return self._result(txs, p)
+
+    def transactions(self) -> Page:
+        """Counts the transactions and reloads the current page and the accounts."""
+        return self._reload(self.pagination)
+
+    def first_page(self) -> Page:
+        return self._reload(replace(self.pagination, first=None, offset=0))
+
+    def search_for(self, args: SearchArgs) -> Page:
+        """Filters the transactions by a search, or clears it, and loads the first page."""
+        with self._lock:
+            self.search = models.search_expression(args.text)
+            self.filter_uncategorized = args.uncategorized
+            self.by_rank = args.by_rank and self.search is not None
+            if self.by_rank:
+                self.sort_keys = [models.transactions_fts.c.rank, models.Transaction.id]
+                self.descending = False
             else:
-                self.pagination.total = results[0][1]
-                return [r[0] for r in results]
+                self.sort_keys = [models.Transaction.time, models.Transaction.id]
+                self.descending = True
+            return self.first_page()
+
+    def next_page(self) -> Page | None:
+        """Loads the next page, or returns None if this is the last one."""
+        with self._lock:
+            p = self.pagination
+            if p.last is None:
+                return None
+            with self.session_factory() as s:
+                txs = self._page(s, p.last, True)
+            if not txs:
+                return None
+            return self._result(txs, replace(p, offset=p.offset + p.limit))
+
+    def prev_page(self) -> Page | None:
+        """Loads the previous page, or returns None if this is the first one."""
+        with self._lock:
+            p = self.pagination
+            if p.first is None:
+                return None
+            with self.session_factory() as s:
+                txs = self._page(s, p.first, False)
+                if not txs:
+                    return None
+                if len(txs) < p.limit:
+                    # rows were added or removed above, start over at the top
+                    txs = self._page(s, None, True)
+                    p = replace(p, offset=0)
+                else:
+                    p = replace(p, offset=max(p.offset - p.limit, 0))
+            return self._result(txs, p)
 
     def run_rules(self):
         raise NotImplementedError()
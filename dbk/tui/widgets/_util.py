@@ -1,6 +1,17 @@
+import asyncio
+import logging
+from typing import Callable
+
 import sqlalchemy.orm as orm
 
 from textual.app import App
+from textual.widget import Widget
+from textual.worker import Worker
+
+from dbk.tui.error_handling import notify_error
+from dbk.tui.models.runner import QueryRunner
+
+log = logging.getLogger(__name__)
 
 
 def get_session_factory(app: App) -> orm.sessionmaker:
@@ -12,3 +23,42 @@ def get_session_factory(app: App) -> orm.sessionmaker:
 
 def get_session(app: App) -> orm.Session:
     return get_session_factory(app)()
+
+
+def get_query_runner(app: App) -> QueryRunner:
+    from dbk.tui import MyApp
+
+    assert isinstance(app, MyApp)
+    return app._model.query_runner
+
+
+def run_query[T](
+    widget: Widget,
+    query: Callable[[], T],
+    done: Callable[[T], None],
+    group: str = "load",
+    exclusive: bool = True,
+) -> Worker:
+    """
+    Runs `query` off the event loop and passes its result to `done` on it, showing
+    the widget as loading meanwhile. A newer query of the same widget and group
+    cancels this one, so a stale result never replaces a fresh one, unless it is
+    not `exclusive`, as for changes that must all be made.
+    """
+
+    async def run():
+        widget.loading = True
+        try:
+            result = await get_query_runner(widget.app).run(query)
+        except asyncio.CancelledError:
+            # the newer query owns the loading state now
+            raise
+        except Exception as e:
+            log.exception("query failed")
+            widget.loading = False
+            notify_error(widget.app, e)
+            return
+        widget.loading = False
+        done(result)
+
+    return widget.run_worker(run, group=group, exclusive=exclusive, exit_on_error=False)
@@ -0,0 +1,104 @@
+import math
+from datetime import date
+
+from rich.text import Text
+from textual.containers import Horizontal, Vertical
+from textual.reactive import reactive
+from textual.widgets import DataTable, Input, Label
+
+from dbk.core import reports
+
+from ..models.balance_sheet import BalanceSheetModel
+from ._util import run_query
+from .nav import Navigatable, Navigator
+
+
+class BalanceSheet(Navigator, Navigatable):
+    DEFAULT_CSS = """
+    #balance-sheet-topbar {
+        padding: 1;
+        height: auto;
+    }
+
+    #balance-sheet-topbar Label {
+        padding: 1 2 0 0;
+    }
+
+    #balance-sheet-topbar Input {
+        width: 20;
+    }
+
+    DataTable {
+        height: 1fr;
+    }
+    """
+
+    BINDINGS = [
+        ("r", "reload", "Reload"),
+    ]
+
+    route_name = "balance-sheet"
+
+    sheet: reactive[reports.BalanceSheet | None] = reactive(None)
+
+    def __init__(self, model: BalanceSheetModel, **kwargs):
+        self._model = model
+        self._table = DataTable(zebra_stripes=True, cursor_type="row")
+        self._table.add_column("Account", width=50)
+        self._table.add_column("Balance")
+        self._table.add_column("Total")
+        super().__init__(**kwargs)
+
+    def compose(self):
+        with Vertical():
+            with Horizontal(id="balance-sheet-topbar"):
+                yield Label("As of")
+                yield Input(
+                    self._model.day.isoformat(), placeholder="YYYY-MM-DD", id="day"
+                )
+            yield self._table
+
+    def on_mount(self):
+        self.action_reload()
+
+    def on_input_submitted(self, e: Input.Submitted):
+        e.stop()
+        try:
+            self._model.day = date.fromisoformat(e.value)
+        except ValueError:
+            self.app.notify(f"{e.value} is not a date", severity="warning")
+            return
+        self.action_reload()
+
+    def watch_sheet(self, sheet: reports.BalanceSheet | None):
+        self._table.clear()
+        if sheet is None:
+            return
+        for line in sheet.lines:
+            sign = -1 if reports.credit_normal(line.account_type) else 1
+            self._table.add_row(
+                Text(
+                    "  " * line.depth + line.name,
+                    style="bold" if not line.depth else "",
+                ),
+                _amount(sign * line.balance, line.currency),
+                _amount(sign * line.total, sheet.currency),
+                key=str(line.account_id),
+            )
+
+    def action_reload(self):
+        run_query(
+            self,
+            self._model.balance_sheet,
+            lambda sheet: setattr(self, "sheet", sheet),
+        )
+
+
+def _amount(value: float, currency: str) -> Text:
+    text = Text.from_markup(f"[bright_black]{currency}[/] ", justify="right")
+    if math.isnan(value):
+        # a balance under it has no exchange rate
+        text.append("-", style="dim")
+        return text
+    text.append(f"{value:,.2f}", style="red" if value < 0 else "")
+    return text
@@ -20,6 +20,8 @@ from dbk.core import models
 from dbk.tui.error_handling import Message, use_error_handler
 
 from ..models.book import BookModel
+from ..models.rows import AccountRow, ConnectionRow
+from ._util import run_query
 from .account import Account
 from .connection import Connection
 from .modals import (
@@ -36,7 +38,7 @@ log = logging.getLogger(__name__)
 
 @dataclass
 class ConnectionItem:
-    connection: models.Connection
+    connection: ConnectionRow
     syncing = False
 
 
@@ -78,7 +80,7 @@ class ConnectionsList(Navigator):
             self.selected = self._rows[row]
 
     @use_error_handler
-    async def watch_connections(self, conns: list[models.Connection]):
+    async def watch_connections(self, conns: list[ConnectionRow]):
         try:
             self.loading = True
 
@@ -100,9 +102,13 @@ class ConnectionsList(Navigator):
             self.loading = False
 
     def action_load_connections(self):
-        self.connections = self._model.connections()
+        run_query(
+            self,
+            self._model.connections,
+            lambda conns: setattr(self, "connections", conns),
+        )
 
-    async def sync_connection(self, conn: models.Connection):
+    async def sync_connection(self, conn: ConnectionRow):
         # conn_item = self.query_one(f"#conn-{conn.id}", ConnectionItem)
         # conn_item.syncing = True
         try:
@@ -125,7 +131,7 @@ class ConnectionsList(Navigator):
             return
         self.navigate_to_route(Connection.route_for(self.selected.connection.id))
 
-    def _conn_id(self, conn: models.Connection) -> str:
+    def _conn_id(self, conn: ConnectionRow) -> str:
         return f"conn-{conn.id}"
 
 
@@ -145,9 +151,9 @@ class AccountTree(Navigator):
     }
     """
 
-    buffer: reactive[TreeNode[models.Account] | None] = reactive(None)
-    selected: reactive[TreeNode[models.Account] | None] = reactive(None)
-    root_nodes: reactive[list[models.Account]] = reactive([])
+    buffer: reactive[TreeNode[AccountRow] | None] = reactive(None)
+    selected: reactive[TreeNode[AccountRow] | None] = reactive(None)
+    root_nodes: reactive[list[AccountRow]] = reactive([])
 
     def __init__(self, model: BookModel, *args, **kwargs):
         self._model = model
@@ -170,7 +176,7 @@ class AccountTree(Navigator):
     def on_tree_node_expanded(self, e: Tree.NodeExpanded):
         self._reload_children(e.node)
 
-    def watch_root_nodes(self, nodes: list[models.Account]):
+    def watch_root_nodes(self, nodes: list[AccountRow]):
         tree = self._accounts_tree
         tree.clear()
 
@@ -178,9 +184,12 @@ class AccountTree(Navigator):
             nn = tree.root.add(n.name, n)
             nn.expand()
 
-    @use_error_handler
     def action_load(self):
-        self.root_nodes = self._model.root_nodes()
+        run_query(
+            self,
+            self._model.root_nodes,
+            lambda nodes: setattr(self, "root_nodes", nodes),
+        )
 
     @use_error_handler
     def action_create_account(self, create_group: bool):
@@ -192,12 +201,16 @@ class AccountTree(Navigator):
         if account is None or not account.is_virtual:
             raise Message.inform("Select a group to create an account under.")
 
-        @use_error_handler(app=self.app)
         def callback(args: CreateAccountArgs | None):
             if not args:
                 return
-            self._model.create_account(args)
-            self._reload_children(n)
+            run_query(
+                self,
+                lambda: self._model.create_account(args),
+                lambda _: self._reload_children(n),
+                group="write",
+                exclusive=False,
+            )
 
         self.app.push_screen(NewAccountModal(account.id, create_group), callback)
 
@@ -213,17 +226,22 @@ class AccountTree(Navigator):
         if self.buffer.data is None or self.selected.data is None:
             return
 
-        try:
-            self._model.move_account(self.buffer.data, self.selected.data)
+        source, target = self.buffer, self.selected
+        self.buffer = None
 
+        def moved(_):
             # reload affected parts of tree
-            if self.buffer.parent:
-                self._reload_children(self.buffer.parent)
-            self._reload_children(self.selected)
-        except:
-            raise
-        finally:
-            self.buffer = None
+            if source.parent:
+                self._reload_children(source.parent)
+            self._reload_children(target)
+
+        run_query(
+            self,
+            lambda: self._model.move_account(source.data, target.data),  # type: ignore
+            moved,
+            group="write",
+            exclusive=False,
+        )
 
     def action_cut_account(self):
         self.buffer = self.selected
@@ -237,19 +255,30 @@ class AccountTree(Navigator):
             raise Message.warn("Cannot delete root accounts.")
 
         # TODO: confirm with user
-        self._model.delete_account(self.selected.data)
-        self._accounts_tree.select_node(self.selected.parent)
-        self.selected.remove()
-        self.selected = None
+        node = self.selected
+
+        def deleted(_):
+            self._accounts_tree.select_node(node.parent)
+            node.remove()
+            if self.selected is node:
+                self.selected = None
+
+        run_query(
+            self,
+            lambda: self._model.delete_account(node.data),  # type: ignore
+            deleted,
+            group="write",
+            exclusive=False,
+        )
 
     def action_goto_account(self):
         if self.selected is None or self.selected.data is None:
             return
         self.navigate_to_route(Account.route_for(self.selected.data.id))
 
-    def _reload_children(self, node: TreeNode[models.Account]):
+    def _reload_children(self, node: TreeNode[AccountRow]):
         account = node.data
-        if not isinstance(account, models.Account):
+        if not isinstance(account, AccountRow):
             return
 
         node.remove_children()
@@ -316,7 +345,7 @@ class Book(Navigator, Navigatable, Routable):
                 return c
 
     def action_load_book(self):
-        self.book = self._model.book()
+        run_query(self, self._model.book, lambda book: setattr(self, "book", book))
 
     def watch_book(self, book: models.Book | None):
         if book:
@@ -326,8 +355,13 @@ class Book(Navigator, Navigatable, Routable):
         def callback(args: CreateConnectionArgs | None):
             if not args:
                 return
-            self._model.create_connection(args)
-            self.app.call_later(self._connections_list.action_load_connections)
+            run_query(
+                self,
+                lambda: self._model.create_connection(args),
+                lambda _: self._connections_list.action_load_connections(),
+                group="write",
+                exclusive=False,
+            )
 
         self.app.push_screen(NewConnectionModal(), callback)
 
@@ -5,9 +5,9 @@ from textual.reactive import reactive
 from textual.widget import Widget
 from textual.widgets import Button, DataTable, Label, TabbedContent, TabPane
 
-from dbk.core import models
-
 from ..models.connection import ConnectionModel
+from ..models.rows import AccountRow, DataSourceRow
+from ._util import run_query
 from .nav import Navigatable, Navigator, RouteInfo
 from .routing import Routable
 
@@ -15,7 +15,7 @@ log = logging.getLogger(__name__)
 
 
 class AccountsList(Navigator):
-    accounts: reactive[list[models.Account]] = reactive([])
+    accounts: reactive[list[AccountRow]] = reactive([])
 
     def __init__(self, model: ConnectionModel, **kwargs):
         self._model = model
@@ -30,9 +30,13 @@ class AccountsList(Navigator):
         self.action_load_accounts()
 
     def action_load_accounts(self):
-        self.accounts = self._model.accounts()
+        run_query(
+            self,
+            self._model.accounts,
+            lambda accounts: setattr(self, "accounts", accounts),
+        )
 
-    def watch_accounts(self, accounts: list[models.Account]):
+    def watch_accounts(self, accounts: list[AccountRow]):
         self._table.clear()
 
         for account in accounts:
@@ -44,7 +48,7 @@ class AccountsList(Navigator):
 
 
 class DataSourcesList(Navigator):
-    sources: reactive[list[models.DataSource]] = reactive([])
+    sources: reactive[list[DataSourceRow]] = reactive([])
 
     def __init__(self, model: ConnectionModel, **kwargs):
         self._model = model
@@ -70,7 +74,11 @@ class DataSourcesList(Navigator):
                 self.action_add_file()
 
     def action_load_sources(self):
-        self.sources = self._model.data_sources()
+        run_query(
+            self,
+            self._model.data_sources,
+            lambda sources: setattr(self, "sources", sources),
+        )
 
     def action_add_file(self):
         try:
@@ -81,7 +89,7 @@ class DataSourcesList(Navigator):
         except Exception as e:
             self.app.notify("Unable to add file(s).", severity="error")
 
-    def watch_sources(self, sources: list[models.DataSource]):
+    def watch_sources(self, sources: list[DataSourceRow]):
         self._table.clear()
 
         for source in sources:
@@ -0,0 +1,107 @@
+from datetime import date
+
+from rich.text import Text
+from textual.containers import Horizontal, Vertical
+from textual.widgets import DataTable, Input, Label, Sparkline
+
+from dbk.core import portfolio
+
+from ..models.portfolio import PortfolioModel
+from ._util import run_query
+from .nav import Navigatable, Navigator
+
+
+def _number(value: float | None, style: str = "") -> Text:
+    if value is None:
+        return Text("-", justify="right", style="dim")
+    return Text(f"{value:,.2f}", justify="right", style=style)
+
+
+class Portfolio(Navigator, Navigatable):
+    DEFAULT_CSS = """
+    #portfolio-topbar {
+        padding: 1;
+        height: auto;
+    }
+
+    #portfolio-topbar Label {
+        padding: 1 2 0 0;
+    }
+
+    #portfolio-topbar Input {
+        width: 20;
+    }
+
+    #portfolio-value {
+        height: 4;
+        margin: 0 1 1 1;
+    }
+
+    DataTable {
+        height: 1fr;
+    }
+    """
+
+    BINDINGS = [
+        ("r", "reload", "Reload"),
+    ]
+
+    route_name = "portfolio"
+
+    def __init__(self, model: PortfolioModel, **kwargs):
+        self._model = model
+        self._table = DataTable(zebra_stripes=True, cursor_type="row")
+        self._table.add_column("Instrument", width=16)
+        self._table.add_column("Quantity")
+        self._table.add_column("Price")
+        self._table.add_column("Value")
+        self._table.add_column("Cost")
+        self._table.add_column("Gain")
+        super().__init__(**kwargs)
+
+    def compose(self):
+        with Vertical():
+            with Horizontal(id="portfolio-topbar"):
+                yield Label("As of")
+                yield Input(
+                    self._model.day.isoformat(), placeholder="YYYY-MM-DD", id="day"
+                )
+                yield Label("", id="portfolio-total")
+            yield Sparkline([], id="portfolio-value")
+            yield self._table
+
+    def on_mount(self):
+        self.action_reload()
+
+    def on_input_submitted(self, e: Input.Submitted):
+        e.stop()
+        try:
+            self._model.day = date.fromisoformat(e.value)
+        except ValueError:
+            self.app.notify(f"{e.value} is not a date", severity="warning")
+            return
+        self.action_reload()
+
+    def _show(self, result: tuple[list[portfolio.Position], portfolio.Valuation]):
+        positions, valuation = result
+        total = valuation.total
+        self.query_one("#portfolio-value", Sparkline).data = list(total)
+        self.query_one("#portfolio-total", Label).update(
+            f"Value {total[-1]:,.2f}" if len(total) else ""
+        )
+
+        self._table.clear()
+        for p in positions:
+            gain = p.gain
+            self._table.add_row(
+                Text(p.instrument),
+                _number(p.quantity),
+                _number(p.price),
+                _number(p.value),
+                _number(p.cost),
+                _number(gain, "" if gain is None else "green" if gain >= 0 else "red"),
+                key=p.instrument,
+            )
+
+    def action_reload(self):
+        run_query(self, self._model.portfolio, self._show)
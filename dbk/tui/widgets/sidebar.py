@@ -5,7 +5,10 @@ from dbk.core import models
 
 from ._util import get_session
 from .nav import Navigator, RouteInfo
+from .balance_sheet import BalanceSheet
 from .book import Book
+from .portfolio import Portfolio
+from .spending import Spending
 from .transactions import Transactions
 
 
@@ -22,18 +25,24 @@ class NavTree(Navigator):
         books = tree.root.add("Books")
         self.books = books
 
-        tree.root.add("Spending")
-        tree.root.add("Portfolio")
-        tree.root.add("Balance Sheet")
+        self.spending = tree.root.add("Spending")
+        self.portfolios = tree.root.add("Portfolio")
+        self.balance_sheets = tree.root.add("Balance Sheet")
         tree.root.add("Transactions", Transactions.route_for())
 
         yield tree
 
     def action_reload(self) -> None:
         self.books.remove_children()
+        self.spending.remove_children()
+        self.portfolios.remove_children()
+        self.balance_sheets.remove_children()
         with get_session(self.app) as sess:
             for book in sess.scalars(sa.select(models.Book)).all():
                 self.books.add(book.name, Book.route_for(book.id))
+                self.spending.add(book.name, Spending.route_for(book.id))
+                self.portfolios.add(book.name, Portfolio.route_for(book.id))
+                self.balance_sheets.add(book.name, BalanceSheet.route_for(book.id))
 
     def on_mount(self) -> None:
         self.action_reload()
@@ -0,0 +1,123 @@
+from rich.text import Text
+from textual.containers import Horizontal, Vertical
+from textual.reactive import reactive
+from textual.widgets import DataTable, Label, Sparkline, Static
+
+from dbk.core import reports
+from dbk.core.reports import Granularity
+
+from ..models.spending import CategorySpending, SpendingModel
+from ._util import run_query
+from .nav import Navigatable, Navigator
+
+_bars = "▁▂▃▄▅▆▇█"
+
+
+def sparkline(values: list[float]) -> str:
+    """The values as a line of bars, scaled to the largest."""
+    top = max(values, default=0)
+    if top <= 0:
+        return _bars[0] * len(values)
+    return "".join(_bars[round(max(v, 0) / top * (len(_bars) - 1))] for v in values)
+
+
+class Spending(Navigator, Navigatable):
+    DEFAULT_CSS = """
+    #spending-topbar {
+        padding: 1;
+        height: auto;
+    }
+
+    #spending-topbar Label {
+        padding: 0 2 0 0;
+    }
+
+    #spending-total {
+        height: 4;
+        margin: 0 1 1 1;
+    }
+
+    DataTable {
+        height: 1fr;
+    }
+    """
+
+    BINDINGS = [
+        ("left_square_bracket", "earlier", "Earlier"),
+        ("right_square_bracket", "later", "Later"),
+        ("d", "granularity('day')", "Days"),
+        ("w", "granularity('week')", "Weeks"),
+        ("m", "granularity('month')", "Months"),
+        ("r", "reload", "Reload"),
+    ]
+
+    route_name = "spending"
+
+    categories: reactive[list[CategorySpending]] = reactive([])
+
+    def __init__(self, model: SpendingModel, **kwargs):
+        self._model = model
+        self._table = DataTable(zebra_stripes=True, cursor_type="row")
+        self._table.add_column("Category", width=30)
+        self._table.add_column("Trend")
+        self._table.add_column("Total")
+        self._table.add_column("Latest")
+        super().__init__(**kwargs)
+
+    def compose(self):
+        with Vertical():
+            with Horizontal(id="spending-topbar"):
+                yield Label("[@click=earlier()]Earlier[/]")
+                yield Label("[@click=later()]Later[/]")
+                yield Static("", id="spending-period")
+            yield Sparkline([], id="spending-total")
+            yield self._table
+
+    def on_mount(self):
+        self.action_reload()
+
+    def on_data_table_row_highlighted(self, e: DataTable.RowHighlighted):
+        e.stop()
+        if e.row_key.value is not None and e.cursor_row < len(self.categories):
+            self._show_trend(self.categories[e.cursor_row].amounts)
+
+    def _show_trend(self, amounts: list[float]):
+        self.query_one("#spending-total", Sparkline).data = amounts
+
+    def _show(self, result: tuple[reports.Spending, list[CategorySpending]]):
+        report, categories = result
+        period = self.query_one("#spending-period", Static)
+        missing = sorted(set().union(*report.missing_rates.values()))
+        period.update(
+            f"Spending by {report.granularity} "
+            f"from {report.buckets[0]:%Y-%m-%d} to {report.end:%Y-%m-%d}"
+            + (f", without {', '.join(missing)}: no rates" if missing else "")
+        )
+        self._show_trend(report.totals())
+        self.categories = categories
+
+    def watch_categories(self, categories: list[CategorySpending]):
+        self._table.clear()
+        for i, c in enumerate(categories):
+            self._table.add_row(
+                Text(c.name),
+                Text(sparkline(c.amounts), style="green"),
+                Text(f"{c.total:,.2f}", justify="right"),
+                Text(f"{c.amounts[-1]:,.2f}", justify="right"),
+                key=str(i),
+            )
+
+    def action_reload(self):
+        run_query(self, self._model.spending, self._show)
+
+    def action_earlier(self):
+        self._model.shift(-1)
+        self.action_reload()
+
+    def action_later(self):
+        self._model.shift(1)
+        self.action_reload()
+
+    def action_granularity(self, granularity: str):
+        self._model.granularity = Granularity(granularity)
+        self.action_reload()
@@ -2,21 +2,67 @@ import logging
 
 from rich.text import Text
 from textual.containers import Grid, Horizontal, Vertical
+from textual.events import Key
 from textual.reactive import reactive
 from textual.screen import ModalScreen
-from textual.widgets import DataTable, Input, Label, Static
+from textual.widgets import Button, Checkbox, DataTable, Input, Label, Static
 
 from dbk.core import models
 
-from ..models.transactions import Pagination, TransactionsModel
+from ..models.modals import SearchArgs
+from ..models.transactions import Page, TransactionsModel
+from ._util import run_query
 from .nav import Navigatable, Navigator
 
 log = logging.getLogger(__name__)
 
 
-class SearchOptionsModal(ModalScreen):
-    def __init__(self):
-        pass
+class SearchOptionsModal(ModalScreen[SearchArgs | None]):
+    def __init__(self, current: SearchArgs, *args, **kwargs):
+        self.current = current
+        super().__init__(*args, **kwargs)
+
+    def compose(self):
+        with Vertical(id="dialog"):
+            yield Static("Search Transactions")
+            yield Input(
+                self.current.text,
+                placeholder="Words in the description",
+                id="text",
+            )
+            yield Checkbox("Most relevant first", self.current.by_rank, id="by-rank")
+            yield Checkbox(
+                "Uncategorized only", self.current.uncategorized, id="uncategorized"
+            )
+            with Grid(id="modal-buttons"):
+                yield Button("Cancel", id="cancel")
+                yield Button("Search", id="search")
+
+    def on_key(self, e: Key):
+        if e.key == "escape":
+            e.stop()
+            return self.dismiss(None)
+        if e.key == "enter":
+            e.stop()
+            return self._search()
+
+    def on_button_pressed(self, e: Button.Pressed):
+        match e.button.id:
+            case "cancel":
+                e.stop()
+                return self.dismiss(None)
+            case "search":
+                e.stop()
+                return self._search()
+
+    def _search(self):
+        self.dismiss(
+            SearchArgs(
+                text=self.query_one("#text", Input).value,
+                by_rank=self.query_one("#by-rank", Checkbox).value,
+                uncategorized=self.query_one("#uncategorized", Checkbox).value,
+            )
+        )
 
 
 class Transactions(Navigator, Navigatable):
@@ -43,6 +89,7 @@ class Transactions(Navigator, Navigatable):
         ("p", "prev_page", "Prev Page"),
         ("n", "next_page", "Next Page"),
         ("r", "reload", "Reload"),
+        ("/", "search", "Search"),
     ]
 
     route_name = "txs"
@@ -56,14 +103,11 @@ class Transactions(Navigator, Navigatable):
         {"label": "Credits"},
         {"label": "Debits"},
     )
-    txs: reactive[list[models.Transaction]] = reactive([])
-    pagination: reactive[Pagination] = reactive(
-        Pagination(limit=100, offset=0, total=0),
-        always_update=True,
-    )
+    page: reactive[Page | None] = reactive(None, always_update=True)
 
     def __init__(self, model: TransactionsModel, **kwargs):
         self._model = model
+        self._search_args = SearchArgs(text="")
         self._table = DataTable(zebra_stripes=True)
         for col in self.columns:
             self._table.add_column(**col)  # type: ignore
@@ -84,51 +128,74 @@ class Transactions(Navigator, Navigatable):
     def on_mount(self):
         self.action_reload()
 
-    def watch_txs(self, txs: list[models.Transaction]):
+    def watch_page(self, page: Page | None):
+        if page is None:
+            return
         self._table.clear()
-        for tx in txs:
+        accounts = page.accounts
+        for tx in page.txs:
+            credit_account = accounts.get(tx.credit_account_id)
+            debit_account = accounts.get(tx.debit_account_id)
             self._table.add_row(
                 tx.time.strftime("%Y-%m-%d"),
                 Text(tx.description),
                 Text.from_markup(f"[{_tx_type_color(tx.type)}]{tx.type}[/]"),
-                tx.credit_account.name if tx.credit_account else "-",
-                tx.debit_account.name if tx.debit_account else "-",
+                credit_account.name if credit_account else "-",
+                debit_account.name if debit_account else "-",
                 Text.from_markup(
-                    f"[bright_black]{tx.credit_account.currency}[/] {tx.credit_amount}"
-                    if tx.credit_account
-                    else "-",
+                    (
+                        f"[bright_black]{credit_account.currency}[/] {tx.credit_amount}"
+                        if credit_account
+                        else "-"
+                    ),
                     justify="right",
                 ),
                 Text.from_markup(
-                    f"[bright_black]{tx.debit_account.currency}[/] {tx.debit_amount}"
-                    if tx.debit_account
-                    else "-",
+                    (
+                        f"[bright_black]{debit_account.currency}[/] {tx.debit_amount}"
+                        if debit_account
+                        else "-"
+                    ),
                     justify="right",
                 ),
                 key=str(tx.id),
                 height=3,
             )
 
-    def watch_pagination(self, p: Pagination):
+        p = page.pagination
         page_count = self.query_one("#page-count", Static)
         txs_count = self.query_one("#txs-count", Static)
         page_count.update(f"Page {p.current_page + 1} of {p.num_pages + 1}")
         txs_count.update(
-            f"Showing {len(self.txs)} txs, ({p.offset}-{p.offset_end}) of {p.total}"
+            f"Showing {len(page.txs)} txs, ({p.offset}-{p.offset_end}) of {p.total}"
         )
 
+    def _show(self, page: Page | None):
+        if page is None:
+            return
+        # only a result that was not cancelled as stale gets here
+        self._model.show(page)
+        self.page = page
+
     def action_reload(self):
-        self.txs = self._model.transactions()
-        self.pagination = self._model.pagination
-        log.info(f"reloaded {len(self.txs)} transactions")
+        run_query(self, self._model.transactions, self._show, group="page")
 
     def action_prev_page(self):
-        self._model.pagination.goto_page(self._model.pagination.current_page - 1)
-        self.action_reload()
+        run_query(self, self._model.prev_page, self._show, group="page")
 
     def action_next_page(self):
-        self._model.pagination.goto_page(self._model.pagination.current_page + 1)
-        self.action_reload()
+        run_query(self, self._model.next_page, self._show, group="page")
+
+    def action_search(self):
+        def search(args: SearchArgs | None):
+            if args is None:
+                return
+            self._search_args = args
+            run_query(
+                self, lambda: self._model.search_for(args), self._show, group="page"
+            )
+
+        self.app.push_screen(SearchOptionsModal(self._search_args), search)
 
 
 def _tx_type_color(tx_type: models.TransactionType):
@@ -0,0 +1,127 @@
+from datetime import date, datetime
+
+import pytest
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+from dbk.core import balances, models
+from dbk.db import make_connection, make_session_factory, migrate
+
+
+@pytest.fixture
+def session():
+    e = make_connection("sqlite:///:memory:")
+    migrate(e, models.Base.metadata)
+    with make_session_factory(e)() as s:
+        s.expire_on_commit = False
+        yield s
+
+
+@pytest.fixture
+def accounts(session) -> tuple[models.Book, models.Account, models.Account]:
+    book = models.Book(name="b", currency="USD")
+    checking, food = [
+        models.Account(
+            name=name,
+            account_type=account_type,
+            is_root=False,
+            is_virtual=False,
+            book=book,
+        )
+        for name, account_type in [
+            ("checking", models.AccountType.asset),
+            ("food", models.AccountType.expense),
+        ]
+    ]
+    session.add_all([checking, food])
+    session.commit()
+    return book, checking, food
+
+
+def spend(book, account, day: int, amount: float, category=None):
+    return models.Transaction(
+        book_id=book.id,
+        time=datetime(2023, 1, day, 12),
+        type=models.TransactionType.spend,
+        description=f"{day} {amount}",
+        credit_account_id=account.id,
+        credit_amount=amount,
+        debit_account_id=category.id if category else None,
+        debit_amount=amount if category else None,
+    )
+
+
+def stored(session: orm.Session):
+    B = models.AccountDailyBalance
+    stmt = sa.select(B.account_id, B.day, B.net_change, B.balance).order_by(
+        B.account_id, B.day
+    )
+    return session.execute(stmt).all()
+
+
+def test_balances(session, accounts):
+    book, checking, food = accounts
+    session.add_all(
+        [
+            spend(book, checking, 5, 10.0),
+            spend(book, checking, 5, 2.5),
+            spend(book, checking, 10, 20.0),
+        ]
+    )
+    session.commit()
+
+    ids = [checking.id, food.id]
+    assert balances.balance_at(session, ids, date(2023, 1, 4)) == {
+        checking.id: 0.0,
+        food.id: 0.0,
+    }
+    assert balances.balance_at(session, ids, date(2023, 1, 7))[checking.id] == -12.5
+    assert balances.balance_at(session, ids, date(2023, 2, 1))[checking.id] == -32.5
+
+    # a transaction before the others moves all later balances
+    session.add(spend(book, checking, 1, 100.0))
+    session.commit()
+    assert balances.balance_at(session, ids, date(2023, 1, 7))[checking.id] == -112.5
+
+    # categorizing debits the category, the checking account is unchanged
+    session.execute(
+        sa.update(models.Transaction)
+        .where(models.Transaction.time == datetime(2023, 1, 10, 12))
+        .values(debit_account_id=food.id, debit_amount=20.0)
+    )
+    session.commit()
+    end = balances.balance_at(session, ids, date(2023, 12, 31))
+    assert end == {checking.id: -132.5, food.id: 20.0}
+    assert balances.change_over(session, ids, date(2023, 1, 5), date(2023, 1, 31)) == {
+        checking.id: -32.5,
+        food.id: 20.0,
+    }
+
+    # readers only read, the running balances are refreshed by writers
+    assert session.scalar(
+        sa.select(sa.func.count(models.AccountBalanceDirty.account_id))
+    )
+    balances.refresh(session)
+    assert balances.balance_at(session, ids, date(2023, 12, 31)) == end
+    assert balances.balance_at(session, ids, date(2023, 1, 7))[checking.id] == -112.5
+
+    incremental = stored(session)
+    balances.rebuild(session)
+    assert stored(session) == incremental
+
+
+def test_delete_account(session, accounts):
+    book, checking, food = accounts
+    session.add_all(
+        [spend(book, checking, 1, 5.0, food), spend(book, checking, 2, 1.0)]
+    )
+    session.commit()
+
+    session.delete(food)
+    session.commit()
+
+    # the transaction went with the account, and so did its change to checking
+    assert balances.balance_at(session, [checking.id], date(2023, 2, 1)) == {
+        checking.id: -1.0
+    }
+    assert {r.account_id for r in stored(session)} == {checking.id}
@@ -0,0 +1,100 @@
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+
+from dbk.core import cache, models
+from dbk.db import make_connection, make_session_factory, migrate
+
+
+@pytest.fixture
+def session():
+    e = make_connection("sqlite:///:memory:")
+    migrate(e, models.Base.metadata)
+    with make_session_factory(e)() as s:
+        yield s
+
+
+def account(book: models.Book, name: str) -> models.Account:
+    return models.Account(
+        book=book,
+        name=name,
+        account_type=models.AccountType.asset,
+        is_root=True,
+        is_virtual=False,
+    )
+
+
+def test_data_versions(session):
+    a, b = models.Book(name="a", currency="USD"), models.Book(name="b", currency="USD")
+    cash = account(a, "cash")
+    session.add_all([a, b, cash])
+    session.flush()
+
+    def versions():
+        return cache.data_version(session, a.id), cache.data_version(session, b.id)
+
+    start = versions()
+    tx = models.Transaction(
+        book_id=a.id,
+        time=datetime(2023, 1, 1),
+        type=models.TransactionType.unknown,
+        description="tx",
+        credit_account_id=cash.id,
+    )
+    session.add(tx)
+    session.flush()
+    added = versions()
+    assert added[0] > start[0] and added[1] == start[1]
+
+    tx.user_description = "renamed"
+    session.flush()
+    assert versions()[0] > added[0]
+
+    session.add(account(b, "other"))
+    session.flush()
+    assert versions()[1] > start[1]
+
+    # prices are shared by all books
+    before = versions()
+    session.add(models.Price(instrument="VTI", day=date(2023, 1, 1), price=1.0))
+    session.flush()
+    after = versions()
+    assert after[0] > before[0] and after[1] > before[1]
+    assert cache.data_version(session) == max(after)
+
+
+def test_hits_until_version_changes():
+    results = cache.ResultCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert results.get("k", 1, compute) == 1
+    assert results.get("k", 1, compute) == 1
+    assert results.get("k", 2, compute) == 2
+    assert (results.hits, results.misses, len(results)) == (1, 2, 1)
+
+
+def test_evicts_least_recently_used():
+    results = cache.ResultCache(max_entries=2)
+    results.get("a", 1, lambda: "a")
+    results.get("b", 1, lambda: "b")
+    results.get("a", 1, lambda: "a")
+    results.get("c", 1, lambda: "c")
+    assert results.get("a", 1, lambda: "new a") == "a"
+    assert results.get("b", 1, lambda: "new b") == "new b"
+
+
+def test_memory_cap():
+    results = cache.ResultCache(max_bytes=50_000)
+    results.get("a", 1, lambda: np.zeros(4000))
+    results.get("b", 1, lambda: [np.zeros(2000)])
+    assert len(results) == 1 and results.size <= 50_000
+
+    # a result over the cap is returned but not kept
+    big = results.get("c", 1, lambda: np.zeros(10_000))
+    assert len(big) == 10_000
+    assert results.get("c", 1, lambda: None) is None
@@ -0,0 +1,77 @@
+-- Schema of a database created before versioned migrations were introduced.
+
+CREATE TABLE books (
+	id INTEGER NOT NULL,
+	name VARCHAR NOT NULL,
+	currency VARCHAR NOT NULL,
+	PRIMARY KEY (id),
+	UNIQUE (name)
+);
+
+CREATE TABLE connections (
+	id INTEGER NOT NULL,
+	book_id INTEGER NOT NULL,
+	provider_id VARCHAR NOT NULL,
+	provider_data JSON NOT NULL,
+	conn_name VARCHAR NOT NULL,
+	PRIMARY KEY (id),
+	CONSTRAINT unique_conn_per_book UNIQUE (book_id, provider_id, conn_name),
+	FOREIGN KEY(book_id) REFERENCES books (id) ON DELETE cascade
+);
+
+CREATE TABLE accounts (
+	id INTEGER NOT NULL,
+	book_id INTEGER NOT NULL,
+	name VARCHAR NOT NULL,
+	account_type VARCHAR(9) NOT NULL,
+	is_root BOOLEAN NOT NULL,
+	is_virtual BOOLEAN NOT NULL,
+	currency VARCHAR,
+	parent_id INTEGER,
+	conn_id INTEGER,
+	conn_label VARCHAR,
+	category VARCHAR,
+	PRIMARY KEY (id),
+	CONSTRAINT unique_category_per_book UNIQUE (book_id, category),
+	FOREIGN KEY(book_id) REFERENCES books (id) ON DELETE cascade,
+	FOREIGN KEY(parent_id) REFERENCES accounts (id) ON DELETE cascade,
+	FOREIGN KEY(conn_id) REFERENCES connections (id) ON DELETE cascade
+);
+
+CREATE TABLE data_sources (
+	id INTEGER NOT NULL,
+	conn_id INTEGER NOT NULL,
+	name INTEGER NOT NULL,
+	type VARCHAR(4) NOT NULL,
+	hash VARCHAR,
+	last_synced DATETIME,
+	last_sync_error VARCHAR,
+	PRIMARY KEY (id),
+	CONSTRAINT unqiue_data_source_per_connection UNIQUE (conn_id, name, hash),
+	FOREIGN KEY(conn_id) REFERENCES connections (id) ON DELETE cascade
+);
+
+CREATE TABLE transactions (
+	id INTEGER NOT NULL,
+	book_id INTEGER NOT NULL,
+	conn_id INTEGER,
+	source_id INTEGER,
+	credit_account_id INTEGER,
+	debit_account_id INTEGER,
+	duplicate_id INTEGER,
+	type VARCHAR(8) NOT NULL,
+	time DATETIME NOT NULL,
+	description VARCHAR NOT NULL,
+	user_description VARCHAR,
+	credit_amount DOUBLE,
+	debit_amount DOUBLE,
+	external_ref VARCHAR,
+	PRIMARY KEY (id),
+	CONSTRAINT unique_transaction_per_connection UNIQUE (conn_id, time, description, credit_amount, debit_amount) ON CONFLICT IGNORE,
+	FOREIGN KEY(book_id) REFERENCES books (id) ON DELETE cascade,
+	FOREIGN KEY(conn_id) REFERENCES connections (id) ON DELETE cascade,
+	FOREIGN KEY(source_id) REFERENCES data_sources (id) ON DELETE cascade,
+	FOREIGN KEY(credit_account_id) REFERENCES accounts (id) ON DELETE cascade,
+	FOREIGN KEY(debit_account_id) REFERENCES accounts (id) ON DELETE cascade,
+	FOREIGN KEY(duplicate_id) REFERENCES transactions (id)
+);
@@ -0,0 +1,97 @@
+from datetime import date, datetime
+
+import pytest
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+from dbk.core import balances, models
+from dbk.db import make_connection, make_session_factory, migrate
+
+
+@pytest.fixture
+def session():
+    e = make_connection("sqlite:///:memory:")
+    migrate(e, models.Base.metadata)
+    with make_session_factory(e)() as s:
+        yield s
+
+
+def closure(s: orm.Session) -> set[tuple[int, int, int]]:
+    c = models.AccountClosure
+    stmt = sa.select(c.ancestor_id, c.descendant_id, c.depth)
+    return {(a, d, depth) for a, d, depth in s.execute(stmt)}
+
+
+def tree(s: orm.Session) -> dict[str, models.Account]:
+    """expenses > food > (groceries, dining), expenses > rent"""
+    book = models.Book(name="b", currency="USD")
+    accounts: dict[str, models.Account] = {}
+    for name, parent in [
+        ("expenses", None),
+        ("food", "expenses"),
+        ("groceries", "food"),
+        ("dining", "food"),
+        ("rent", "expenses"),
+    ]:
+        accounts[name] = models.Account(
+            book=book,
+            name=name,
+            account_type=models.AccountType.expense,
+            is_root=parent is None,
+            is_virtual=name in ("expenses", "food"),
+            parent=accounts[parent] if parent else None,
+        )
+    s.add_all(accounts.values())
+    s.commit()
+    return accounts
+
+
+def test_closure_follows_tree(session):
+    a = tree(session)
+    subtree = lambda name: set(
+        session.scalars(models.AccountClosure.subtree(a[name].id)).all()
+    )
+
+    assert subtree("expenses") == {x.id for x in a.values()}
+    assert subtree("food") == {a["food"].id, a["groceries"].id, a["dining"].id}
+    assert (a["expenses"].id, a["dining"].id, 2) in closure(session)
+
+    # moving food under rent moves its sub-accounts with it
+    a["food"].parent_id = a["rent"].id
+    session.commit()
+    assert subtree("rent") == {
+        a["rent"].id,
+        a["food"].id,
+        a["groceries"].id,
+        a["dining"].id,
+    }
+    assert (a["expenses"].id, a["dining"].id, 3) in closure(session)
+
+    incremental = closure(session)
+    models.rebuild_account_closure(session.connection())
+    assert closure(session) == incremental
+
+    session.execute(sa.delete(models.Account).where(models.Account.id == a["food"].id))
+    session.commit()
+    assert subtree("expenses") == {a["expenses"].id, a["rent"].id}
+    assert len(closure(session)) == 3
+
+
+def test_total_at(session):
+    a = tree(session)
+    session.add_all(
+        models.Transaction(
+            book_id=a["expenses"].book_id,
+            time=datetime(2023, 1, 1),
+            type=models.TransactionType.spend,
+            description=name,
+            debit_account_id=a[name].id,
+            debit_amount=amount,
+        )
+        for name, amount in [("groceries", 10.0), ("dining", 5.0), ("rent", 100.0)]
+    )
+    session.commit()
+
+    assert balances.total_at(session, a["food"].id, date(2023, 1, 31)) == 15.0
+    assert balances.total_at(session, a["expenses"].id, date(2023, 1, 31)) == 115.0
+    assert balances.total_at(session, a["expenses"].id, date(2022, 12, 31)) == 0.0
@@ -0,0 +1,142 @@
+from datetime import datetime
+
+import pytest
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+from dbk.core import models, sync
+from dbk.db import make_connection, make_session_factory, migrate
+
+T = models.Transaction
+
+
+@pytest.fixture
+def session():
+    e = make_connection("sqlite:///:memory:")
+    migrate(e, models.Base.metadata)
+    with make_session_factory(e)() as s:
+        yield s
+
+
+def counts(s: orm.Session) -> dict[tuple[str, int], tuple[int, int]]:
+    rows = s.execute(sa.select(models.TransactionCount))
+    return {
+        (c.scope.value, c.key_id): (c.total, c.uncategorized)
+        for c in rows.scalars()
+        if c.total
+    }
+
+
+def recount(s: orm.Session) -> dict[tuple[str, int], tuple[int, int]]:
+    models.rebuild_transaction_counts(s.connection())
+    return counts(s)
+
+
+def test_counts_follow_changes(session):
+    book = models.Book(name="b", currency="USD")
+    conn = models.Connection(
+        book=book, provider_id="bofa", conn_name="c", provider_data={}
+    )
+    source = models.DataSource(
+        name="s", type=models.DataSourceType.file, connection=conn
+    )
+    cash, food = [
+        models.Account(
+            name=name,
+            account_type=models.AccountType.asset,
+            is_root=False,
+            is_virtual=False,
+            book=book,
+        )
+        for name in ["cash", "food"]
+    ]
+    session.add_all([source, cash, food])
+    session.commit()
+
+    rows = [
+        dict(
+            book_id=book.id,
+            conn_id=conn.id,
+            source_id=source.id,
+            time=datetime(2023, 1, i + 1),
+            type=models.TransactionType.spend,
+            description=f"tx {i}",
+            credit_account_id=cash.id,
+            credit_amount=1.0,
+            external_ref=f"ref {i}",
+        )
+        for i in range(10)
+    ]
+    # duplicates are ignored, and not counted
+    sync.insert_transactions(session, rows + rows[:3])
+    session.commit()
+
+    expected = {
+        ("all", 0): (10, 10),
+        ("book", book.id): (10, 10),
+        ("connection", conn.id): (10, 10),
+        ("source", source.id): (10, 10),
+        ("account", cash.id): (10, 10),
+    }
+    assert counts(session) == expected
+
+    session.execute(
+        sa.update(T)
+        .where(T.description.in_(["tx 0", "tx 1"]))
+        .values(debit_account_id=food.id)
+    )
+    session.execute(
+        sa.update(T).where(T.description == "tx 2").values(debit_account_id=cash.id)
+    )
+    session.commit()
+    assert counts(session) == expected | {
+        ("all", 0): (10, 7),
+        ("book", book.id): (10, 7),
+        ("connection", conn.id): (10, 7),
+        ("source", source.id): (10, 7),
+        ("account", cash.id): (10, 7),
+        ("account", food.id): (2, 0),
+    }
+    assert counts(session) == recount(session)
+
+    session.delete(source)
+    session.commit()
+    assert counts(session) == {}
+    assert counts(session) == recount(session)
+
+
+def test_num_transactions(session):
+    book = models.Book(name="b", currency="USD")
+    conn = models.Connection(
+        book=book, provider_id="bofa", conn_name="c", provider_data={}
+    )
+    full, empty = [
+        models.DataSource(name=n, type=models.DataSourceType.file, connection=conn)
+        for n in ["full", "empty"]
+    ]
+    session.add_all([full, empty])
+    session.flush()
+    session.add_all(
+        T(
+            book_id=book.id,
+            conn_id=conn.id,
+            source_id=full.id,
+            time=datetime(2023, 1, i + 1),
+            type=models.TransactionType.unknown,
+            description=str(i),
+        )
+        for i in range(3)
+    )
+    session.commit()
+
+    stmt = (
+        sa.select(models.DataSource)
+        .options(
+            orm.with_expression(
+                models.DataSource.num_transactions,
+                models.DataSource.num_transactions_expr(),
+            )
+        )
+        .order_by(models.DataSource.name)
+    )
+    assert [s.num_transactions for s in session.scalars(stmt)] == [0, 3]
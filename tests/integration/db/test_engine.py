@@ -0,0 +1,71 @@
+import sqlalchemy as sa
+import sqlalchemy.pool as pool
+
+from dbk.core import models
+from dbk.db import make_connection, make_session_factory, migrate
+from dbk.settings import SqliteSettings
+
+
+def pragma(conn: sa.Connection, name: str):
+    return conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+
+def test_pragmas(tmp_path):
+    settings = SqliteSettings(cache_size=-2048, busy_timeout=1234)
+    engine = make_connection(f"sqlite:///{tmp_path / 'db.sqlite3'}", settings)
+
+    with engine.connect() as conn:
+        assert pragma(conn, "journal_mode") == "wal"
+        assert pragma(conn, "synchronous") == 1
+        assert pragma(conn, "cache_size") == -2048
+        assert pragma(conn, "mmap_size") == settings.mmap_size
+        assert pragma(conn, "temp_store") == 2
+        assert pragma(conn, "busy_timeout") == 1234
+        assert pragma(conn, "foreign_keys") == 1
+
+
+def test_in_memory():
+    engine = make_connection("sqlite:///:memory:")
+    with engine.connect() as conn:
+        assert pragma(conn, "journal_mode") == "memory"
+        assert pragma(conn, "foreign_keys") == 1
+
+
+def test_pool_per_role(tmp_path):
+    url = f"sqlite:///{tmp_path / 'db.sqlite3'}"
+    assert isinstance(make_connection(url, role="worker").pool, pool.NullPool)
+    assert isinstance(make_connection(url, role="tui").pool, pool.QueuePool)
+
+
+def test_read_during_write(tmp_path):
+    url = f"sqlite:///{tmp_path / 'db.sqlite3'}"
+    writer = make_connection(url, role="worker")
+    reader = make_connection(url, role="tui")
+    migrate(writer, models.Base.metadata)
+
+    with writer.begin() as w:
+        w.execute(sa.insert(models.Book), [dict(name="b", currency="USD")])
+        # the write transaction is still open, readers see the last commit
+        with reader.connect() as r:
+            assert r.scalar(sa.select(sa.func.count(models.Book.id))) == 0
+
+    with reader.connect() as r:
+        assert r.scalar(sa.select(sa.func.count(models.Book.id))) == 1
+
+
+def test_delete_cascades():
+    engine = make_connection("sqlite:///:memory:")
+    migrate(engine, models.Base.metadata)
+
+    with make_session_factory(engine)() as s:
+        book = models.Book(name="b", currency="USD")
+        s.add(
+            models.Connection(
+                book=book, provider_id="bofa", conn_name="c", provider_data={}
+            )
+        )
+        s.commit()
+
+        s.execute(sa.delete(models.Book))
+        s.commit()
+        assert s.scalar(sa.select(sa.func.count(models.Connection.id))) == 0
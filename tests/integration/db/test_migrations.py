@@ -0,0 +1,263 @@
+from pathlib import Path
+
+import pytest
+import sqlalchemy as sa
+
+from dbk import db
+from dbk.core import models
+from dbk.db import Migration, make_connection
+
+baseline_schema = Path(__file__).parent / "baseline_schema.sql"
+
+
+@pytest.fixture
+def engine(tmp_path):
+    return make_connection(f"sqlite:///{tmp_path / 'db.sqlite3'}")
+
+
+@pytest.fixture
+def baseline(engine):
+    """A database created before versioned migrations, with a few rows."""
+    with engine.connect() as conn:
+        conn.connection.driver_connection.executescript(baseline_schema.read_text())  # type: ignore
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO books VALUES (1, 'b', 'USD')")
+        conn.exec_driver_sql(
+            "INSERT INTO connections VALUES (1, 1, 'bofa', '{}', 'c')",
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO accounts (id, book_id, name, account_type, is_root, "
+            "is_virtual, parent_id) VALUES "
+            "(1, 1, 'expenses', 'expense', 1, 1, NULL), "
+            "(2, 1, 'food', 'expense', 0, 0, 1)"
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO data_sources (id, conn_id, name, type) "
+            "VALUES (1, 1, 's', 'file')"
+        )
+        conn.execute(
+            sa.text(
+                "INSERT INTO transactions (id, book_id, conn_id, source_id, type, "
+                "time, description, credit_amount) "
+                "VALUES (:id, 1, 1, 1, 'unknown', :time, :d, 1.0)"
+            ),
+            [
+                dict(id=i, time=f"2023-01-{i:02} 00:00:00", d=f"tx {i}")
+                for i in range(1, 26)
+            ],
+        )
+    return engine
+
+
+def schema(engine: sa.Engine) -> dict[str, tuple]:
+    """Comparable description of the tables, indexes and triggers of a database."""
+    result = {}
+    with engine.connect() as conn:
+        tables = conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        ).scalars()
+        for table in tables:
+            columns = conn.exec_driver_sql(f"PRAGMA table_info({table})").all()
+            fks = conn.exec_driver_sql(f"PRAGMA foreign_key_list({table})").all()
+            indexes = conn.exec_driver_sql(
+                "SELECT name, sql FROM sqlite_master "
+                "WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                (table,),
+            ).all()
+            triggers = conn.exec_driver_sql(
+                "SELECT name, sql FROM sqlite_master "
+                "WHERE type = 'trigger' AND tbl_name = ?",
+                (table,),
+            ).all()
+            unique = conn.exec_driver_sql(f"PRAGMA index_list({table})").all()
+            result[table] = (
+                sorted((c[1], c[2], c[3], c[5]) for c in columns),
+                sorted((fk[2], fk[3], fk[4], fk[6]) for fk in fks),
+                sorted((name, " ".join(sql.split())) for name, sql in indexes),
+                sorted((name, " ".join(sql.split())) for name, sql in triggers),
+                sorted(i[2] for i in unique if i[3] == "u"),
+            )
+    return result
+
+
+def test_fresh_database(engine):
+    assert db.migrate(engine, models.Base.metadata) == []
+
+    with engine.connect() as conn:
+        assert db.current_version(conn) == db.MIGRATIONS[-1].version
+    assert db.pending(engine) == []
+    assert db.migrate(engine, models.Base.metadata) == []
+
+
+def test_upgrade_baseline(baseline, tmp_path):
+    progress = []
+    applied = db.migrate(
+        baseline,
+        models.Base.metadata,
+        progress=lambda m, done, total: progress.append((m.version, done, total)),
+    )
+
+    assert applied == db.MIGRATIONS
+    assert (1, 25, 25) in progress
+    assert db.pending(baseline) == []
+
+    fresh = make_connection(f"sqlite:///{tmp_path / 'fresh.sqlite3'}")
+    db.migrate(fresh, models.Base.metadata)
+    assert schema(baseline) == schema(fresh)
+
+    with baseline.connect() as conn:
+        assert conn.scalar(sa.text("SELECT count(*) FROM transactions")) == 25
+        assert conn.scalar(sa.text("PRAGMA foreign_keys")) == 1
+        assert conn.execute(
+            sa.text(
+                "SELECT time, credit_units, amount_exponent FROM transactions "
+                "WHERE id = 1"
+            )
+        ).one() == (1672531200, 100, 2)
+        assert conn.execute(
+            sa.text("SELECT scope, key_id, total FROM transaction_counts")
+        ).all() == [
+            ("book", 1, 25),
+            ("connection", 1, 25),
+            ("source", 1, 25),
+            ("all", 0, 25),
+        ]
+        assert set(
+            conn.execute(
+                sa.text("SELECT ancestor_id, descendant_id, depth FROM account_closure")
+            ).all()
+        ) == {(1, 1, 0), (2, 2, 0), (1, 2, 1)}
+
+
+def test_failed_migration_rolls_back(baseline):
+    def ok(conn: sa.Connection, progress):
+        conn.exec_driver_sql("CREATE TABLE a (id INTEGER PRIMARY KEY)")
+
+    def broken(conn: sa.Connection, progress):
+        conn.exec_driver_sql("CREATE TABLE b (id INTEGER PRIMARY KEY)")
+        db.backfill(conn, "transactions", "description = 'changed'")
+        raise RuntimeError("broken")
+
+    migrations = [Migration(1, "ok", ok), Migration(2, "broken", broken)]
+    with pytest.raises(RuntimeError):
+        db.migrate(baseline, migrations=migrations)
+
+    with baseline.connect() as conn:
+        assert db.current_version(conn) == 1
+        tables = sa.inspect(conn).get_table_names()
+        assert "a" in tables and "b" not in tables
+        assert (
+            conn.scalar(
+                sa.text(
+                    "SELECT count(*) FROM transactions WHERE description = 'changed'"
+                )
+            )
+            == 0
+        )
+
+    assert db.pending(baseline, migrations) == migrations[1:]
+
+
+def test_batches(baseline):
+    def upgrade(conn: sa.Connection, progress):
+        db.backfill(
+            conn,
+            "transactions",
+            "debit_amount = credit_amount * 2",
+            where="id % 2 = 0",
+            progress=progress,
+            batch_size=10,
+        )
+
+    progress = []
+    db.migrate(
+        baseline,
+        migrations=[Migration(1, "backfill", upgrade)],
+        progress=lambda m, done, total: progress.append((done, total)),
+    )
+
+    assert progress == [(10, 25), (20, 25), (25, 25)]
+    with baseline.connect() as conn:
+        assert (
+            conn.scalar(
+                sa.text("SELECT count(*) FROM transactions WHERE debit_amount = 2.0")
+            )
+            == 12
+        )
+
+
+def test_reset(baseline):
+    db.migrate(baseline, models.Base.metadata)
+    db.reset(baseline, models.Base.metadata)
+
+    with baseline.connect() as conn:
+        assert conn.scalar(sa.text("SELECT count(*) FROM transactions")) == 0
+        assert db.current_version(conn) == db.MIGRATIONS[-1].version
+
+
+def test_daily_balances_of_version_6(baseline):
+    with baseline.begin() as conn:
+        conn.exec_driver_sql("UPDATE transactions SET credit_account_id = 2")
+    db.migrate(baseline, migrations=db.MIGRATIONS[:6])
+
+    with baseline.connect() as conn:
+        rows = conn.exec_driver_sql(
+            "SELECT day, net_change, balance FROM account_daily_balances "
+            "WHERE account_id = 2 ORDER BY day"
+        ).all()
+    assert len(rows) == 25
+    assert rows[0] == ("2023-01-01", -1.0, -1.0)
+    assert rows[-1] == ("2023-01-25", -1.0, -25.0)
+
+
+def test_write_after_each_step(baseline):
+    """A step only creates triggers whose tables and columns exist by then."""
+    for n, m in enumerate(db.MIGRATIONS, start=1):
+        db.migrate(baseline, migrations=db.MIGRATIONS[:n])
+        with baseline.begin() as conn:
+            columns = {c["name"] for c in sa.inspect(conn).get_columns("transactions")}
+            if "credit_units" in columns:
+                amount = dict(time=1675209600, credit_units=150, amount_exponent=2)
+            else:
+                amount = dict(time="2023-02-01 00:00:00", credit_amount=1.5)
+            row = dict(
+                book_id=1,
+                conn_id=1,
+                source_id=1,
+                type="spend",
+                description=f"after {m.version}",
+                credit_account_id=2,
+                **amount,
+            )
+            table = sa.table("transactions", *(sa.column(c) for c in row))
+            conn.execute(sa.insert(table).values(row))
+            conn.exec_driver_sql(
+                "UPDATE transactions SET debit_account_id = 1, description = 'moved' "
+                "WHERE id = ?",
+                (n,),
+            )
+            conn.exec_driver_sql(
+                "DELETE FROM transactions WHERE description = ?", (f"after {n - 1}",)
+            )
+
+    with baseline.connect() as conn:
+        total = conn.scalar(sa.text("SELECT count(*) FROM transactions"))
+        # the baseline and the row of the last step
+        assert total == 26
+        assert (
+            conn.scalar(
+                sa.text("SELECT total FROM transaction_counts WHERE scope = 'book'")
+            )
+            == total
+        )
+        assert conn.scalar(
+            sa.text(
+                "SELECT sum(net_change) FROM account_daily_balances "
+                "WHERE account_id = 2"
+            )
+        ) == conn.scalar(
+            sa.text(
+                "SELECT -sum(credit_units) FROM transactions "
+                "WHERE credit_account_id = 2"
+            )
+        )
@@ -0,0 +1,143 @@
+import re
+from datetime import datetime, timedelta
+
+import pytest
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+from dbk.core import models
+from dbk.db import make_connection, make_session_factory, migrate
+from dbk.tui.models.rows import AccountRow
+from dbk.tui.models.transactions import TransactionsModel
+
+T = models.Transaction
+uncategorized = sa.or_(T.credit_account_id == None, T.debit_account_id == None)
+
+_full_scan = re.compile(r"^SCAN (\w+)( USING COVERING INDEX \w+)?$")
+
+cursor = (datetime(2023, 6, 1), 5000)
+
+
+@pytest.fixture
+def engine():
+    e = make_connection("sqlite:///:memory:")
+    migrate(e, models.Base.metadata)
+    return e
+
+
+def query_plan(engine: sa.Engine, stmt) -> list[str]:
+    sql = stmt.compile(engine, compile_kwargs={"literal_binds": True})
+    with engine.connect() as conn:
+        return [r[3] for r in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+def transactions_model(engine, filter_uncategorized: bool) -> TransactionsModel:
+    model = TransactionsModel(make_session_factory(engine), lambda: None)  # type: ignore
+    model.filter_uncategorized = filter_uncategorized
+    return model
+
+
+def search_model(engine, by_rank: bool) -> TransactionsModel:
+    model = TransactionsModel(make_session_factory(engine), lambda: None)  # type: ignore
+    model.search = models.search_expression("coffee")
+    model.by_rank = by_rank
+    if by_rank:
+        model.sort_keys = [models.transactions_fts.c.rank, T.id]
+        model.descending = False
+    return model
+
+
+hot_queries = {
+    "transactions page": lambda e: transactions_model(e, False).statement(),
+    "transactions count": lambda e: transactions_model(e, False).count_statement(),
+    "next page": lambda e: transactions_model(e, False).statement(cursor),
+    "prev page": lambda e: transactions_model(e, False).statement(cursor, False),
+    "uncategorized next page": lambda e: transactions_model(e, True).statement(cursor),
+    "uncategorized page": lambda e: transactions_model(e, True).statement(),
+    "uncategorized count": lambda e: transactions_model(e, True).count_statement(),
+    "book transactions": lambda _: sa.select(T)
+    .where(T.book_id == 1)
+    .order_by(sa.desc(T.time), sa.desc(T.id))
+    .limit(100),
+    "apply rules": lambda _: sa.select(T).where(T.book_id == 1, uncategorized),
+    "search page": lambda e: search_model(e, False).statement(),
+    "search count": lambda e: search_model(e, False).count_statement(),
+    "ranked search next page": lambda e: search_model(e, True).statement((-1.0, 5)),
+    "account map": lambda _: AccountRow.select().where(models.Account.book_id == 1),
+    "child accounts": lambda _: sa.select(models.Account).where(
+        models.Account.parent_id == 1
+    ),
+    "connection accounts": lambda _: sa.select(models.Account).where(
+        models.Account.conn_id == 1
+    ),
+    "account transactions": lambda _: sa.select(T).where(
+        sa.or_(T.credit_account_id == 1, T.debit_account_id == 1)
+    ),
+    "data sources": lambda _: sa.select(models.DataSource)
+    .options(
+        orm.with_expression(
+            models.DataSource.num_transactions,
+            models.DataSource.num_transactions_expr(T.source_id),
+        )
+    )
+    .where(models.DataSource.conn_id == 1),
+    "duplicates of": lambda _: sa.select(T).where(T.duplicate_id == 1),
+}
+
+
+@pytest.mark.parametrize("name", ["next page", "prev page"])
+def test_pages_follow_index(engine, name):
+    plan = query_plan(engine, hot_queries[name](engine))
+    assert plan[0].startswith("SEARCH transactions USING INDEX ix_transactions_time")
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+@pytest.mark.parametrize("name", hot_queries)
+def test_no_full_scan(engine, name):
+    plan = query_plan(engine, hot_queries[name](engine))
+    scans = [step for step in plan if _full_scan.match(step)]
+    assert not scans, f"{name}: {plan}"
+
+
+def test_uncategorized_uses_partial_index(engine):
+    with make_session_factory(engine)() as s:
+        book = models.Book(name="b", currency="USD")
+        account = models.Account(
+            name="a",
+            account_type=models.AccountType.asset,
+            is_root=True,
+            is_virtual=False,
+            book=book,
+        )
+        s.add(account)
+        s.flush()
+        start = datetime(2023, 1, 1)
+        s.execute(
+            sa.insert(T),
+            [
+                dict(
+                    book_id=book.id,
+                    time=start + timedelta(hours=i),
+                    type=models.TransactionType.unknown,
+                    description=str(i),
+                    credit_account_id=account.id,
+                    debit_account_id=None if i % 50 == 0 else account.id,
+                    credit_amount=1.0,
+                )
+                for i in range(5000)
+            ],
+        )
+        s.commit()
+        s.execute(sa.text("ANALYZE"))
+
+    page = query_plan(engine, transactions_model(engine, True).statement())
+    assert "USING INDEX ix_transactions_uncategorized_time" in page[0]
+
+    # both indexes on (book_id, time, id) cost about the same to SQLite, which takes
+    # one or the other depending on the order of the indexes of the table
+    rules = query_plan(engine, hot_queries["apply rules"](engine))
+    assert re.fullmatch(
+        r"SEARCH transactions USING INDEX "
+        r"ix_transactions_(uncategorized_)?book_time \(book_id=\?\)",
+        rules[0],
+    ), rules
@@ -0,0 +1,134 @@
+from dataclasses import replace
+from datetime import datetime, timedelta
+
+import pytest
+import sqlalchemy as sa
+
+from dbk.core import models
+from dbk.db import make_connection, make_session_factory, migrate
+from dbk.tui.models.modals import SearchArgs
+from dbk.tui.models.transactions import Page, TransactionsModel
+
+T = models.Transaction
+fts = models.transactions_fts
+
+
+@pytest.fixture
+def session_factory():
+    e = make_connection("sqlite:///:memory:")
+    migrate(e, models.Base.metadata)
+    return make_session_factory(e)
+
+
+@pytest.fixture
+def book_id(session_factory) -> int:
+    with session_factory() as s:
+        book = models.Book(name="b", currency="USD")
+        s.add(book)
+        s.commit()
+        return book.id
+
+
+def add(s, book_id: int, *descriptions: str, start=datetime(2023, 1, 1)) -> list[int]:
+    txs = [
+        T(
+            book_id=book_id,
+            time=start + timedelta(days=i),
+            type=models.TransactionType.spend,
+            description=d,
+            credit_amount=1.0,
+        )
+        for i, d in enumerate(descriptions)
+    ]
+    s.add_all(txs)
+    s.flush()
+    return [tx.id for tx in txs]
+
+
+def search(s, text: str) -> set[int]:
+    stmt = sa.select(fts.c.rowid).where(
+        models.matches(models.search_expression(text))  # type: ignore
+    )
+    return set(s.scalars(stmt))
+
+
+def test_search_expression():
+    assert models.search_expression("  Café  bar ") == '"Café"* "bar"*'
+    assert models.search_expression('say "hi"') == '"say"* "hi"*'
+    assert models.search_expression(' " ') is None
+
+
+def test_index_follows_transactions(session_factory, book_id):
+    with session_factory() as s:
+        coffee, rent = add(s, book_id, "Coffee at Café Nero", "Rent March")
+        assert search(s, "cafe") == {coffee}
+        assert search(s, "ner") == {coffee}
+        assert search(s, "rent mar") == {rent}
+        assert search(s, "rent coffee") == set()
+
+        s.execute(
+            sa.update(T).where(T.id == rent).values(user_description="flat coffee")
+        )
+        assert search(s, "coffee") == {coffee, rent}
+        s.execute(sa.update(T).where(T.id == coffee).values(description="Tea"))
+        assert search(s, "coffee") == {rent}
+        assert search(s, "nero") == set()
+
+        s.execute(sa.delete(T).where(T.id == rent))
+        assert search(s, "coffee") == set()
+        assert search(s, "tea") == {coffee}
+
+
+def test_rebuild_search_index(session_factory, book_id):
+    with session_factory() as s:
+        [tx] = add(s, book_id, "Groceries")
+        s.execute(
+            sa.text(
+                "INSERT INTO transactions_fts (transactions_fts) VALUES ('delete-all')"
+            )
+        )
+        assert search(s, "groceries") == set()
+        models.rebuild_search_index(s.connection())
+        assert search(s, "groceries") == {tx}
+
+
+def ids(txs) -> list[int]:
+    return [tx.id for tx in txs]
+
+
+def show(model: TransactionsModel, page: Page | None) -> list[int]:
+    return ids(model.show(page)) if page else []
+
+
+def test_search_pages(session_factory, book_id):
+    with session_factory() as s:
+        tx_ids = add(s, book_id, *(f"coffee {i}" for i in range(25)))
+        ranked = add(
+            s,
+            book_id,
+            "coffee coffee coffee",
+            "lunch",
+            start=datetime(2022, 1, 1),
+        )
+        s.commit()
+    newest_first = tx_ids[::-1] + ranked[:1]
+
+    model = TransactionsModel(session_factory, lambda: None)  # type: ignore
+    model.pagination = replace(model.pagination, limit=10)
+    assert show(model, model.search_for(SearchArgs("COFFEE"))) == newest_first[:10]
+    assert model.pagination.total == 26
+    assert show(model, model.next_page()) == newest_first[10:20]
+    assert show(model, model.next_page()) == newest_first[20:]
+    assert show(model, model.prev_page()) == newest_first[10:20]
+
+    page = model.show(model.search_for(SearchArgs("coffee", by_rank=True)))
+    assert page[0].id == ranked[0]
+    assert page[0].rank is not None
+    assert [tx.rank for tx in page] == sorted(tx.rank for tx in page)  # type: ignore
+    by_rank = ids(page)
+    while next_page := model.next_page():
+        by_rank += ids(model.show(next_page))
+    assert sorted(by_rank) == sorted(newest_first)
+
+    assert show(model, model.search_for(SearchArgs(" "))) == newest_first[:10]
+    assert model.pagination.total == 27
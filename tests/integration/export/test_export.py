@@ -0,0 +1,137 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+
+import pytest
+import sqlalchemy as sa
+
+from dbk.core import export, models
+from dbk.db import make_connection, make_session_factory, migrate
+
+
+@pytest.fixture
+def session_factory():
+    e = make_connection("sqlite:///:memory:")
+    migrate(e, models.Base.metadata)
+    return make_session_factory(e)
+
+
+@pytest.fixture
+def book_id(session_factory) -> int:
+    with session_factory() as s:
+        book = models.Book(name="b", currency="USD")
+        assets = models.Account(
+            book=book,
+            name="Assets",
+            account_type=models.AccountType.asset,
+            is_root=True,
+            is_virtual=True,
+        )
+        checking = models.Account(
+            book=book,
+            name="Checking",
+            account_type=models.AccountType.asset,
+            is_root=False,
+            is_virtual=False,
+            currency="JPY",
+            parent=assets,
+        )
+        expenses = models.Account(
+            book=book,
+            name="Expenses",
+            account_type=models.AccountType.expense,
+            is_root=True,
+            is_virtual=True,
+        )
+        food = models.Account(
+            book=book,
+            name="Food",
+            account_type=models.AccountType.expense,
+            is_root=False,
+            is_virtual=False,
+            parent=expenses,
+        )
+        s.add_all([book, assets, checking, expenses, food])
+        s.flush()
+        s.add_all(
+            [
+                models.Transaction(
+                    book_id=book.id,
+                    time=datetime(2023, 1, day, 12),
+                    type=models.TransactionType.spend,
+                    description=f"lunch {day}",
+                    credit_account_id=checking.id,
+                    debit_account_id=food.id if day % 2 else None,
+                    credit_amount=1200.0,
+                    debit_amount=1200.0 if day % 2 else None,
+                )
+                for day in range(1, 11)
+            ]
+        )
+        s.commit()
+        return book.id
+
+
+def test_transactions(session_factory, book_id):
+    with session_factory() as s:
+        rows = list(export.transactions(s, book_id))
+    assert [r.description for r in rows] == [f"lunch {d}" for d in range(1, 11)]
+    first = rows[0]
+    assert first.credit_account == "Assets:Checking"
+    assert first.debit_account == "Expenses:Food"
+    assert (first.credit_amount, first.currency) == (1200.0, "JPY")
+    assert rows[1].debit_account is None
+
+
+def test_filters(session_factory, book_id):
+    with session_factory() as s:
+        food = export.find_account(s, book_id, "Expenses:Food")
+        expenses = export.find_account(s, book_id, "Expenses")
+        in_range = export.transactions(
+            s, book_id, start=date(2023, 1, 3), end=date(2023, 1, 5)
+        )
+        assert [r.description for r in in_range] == ["lunch 3", "lunch 4", "lunch 5"]
+        assert len(list(export.transactions(s, book_id, account_id=food))) == 5
+        # an account includes the accounts under it
+        assert len(list(export.transactions(s, book_id, account_id=expenses))) == 5
+
+        with pytest.raises(export.AccountNotFound):
+            export.find_account(s, book_id, "Food")
+
+
+def test_csv(session_factory, book_id):
+    out = io.StringIO()
+    with session_factory() as s:
+        assert export.export(s, book_id, out) == 10
+    out.seek(0)
+    rows = list(csv.DictReader(out))
+    assert len(rows) == 10
+    assert rows[0]["time"] == "2023-01-01T12:00:00"
+    assert rows[0]["type"] == "spend"
+    assert rows[0]["debit_account"] == "Expenses:Food"
+    assert rows[1]["debit_account"] == ""
+
+
+def test_jsonl(session_factory, book_id):
+    out = io.StringIO()
+    with session_factory() as s:
+        n = export.export(s, book_id, out, export.ExportFormat.jsonl)
+    lines = out.getvalue().splitlines()
+    assert n == len(lines) == 10
+    row = json.loads(lines[1])
+    assert row["credit_amount"] == 1200.0
+    assert row["debit_amount"] is None
+    assert row["time"] == "2023-01-02T12:00:00"
+
+
+def test_streams_in_index_order(session_factory):
+    stmt = export.statement(1)
+    with session_factory() as s:
+        engine = s.get_bind()
+        sql = stmt.compile(engine, compile_kwargs={"literal_binds": True})
+        plan = [r[3] for r in s.execute(sa.text(f"EXPLAIN QUERY PLAN {sql}"))]
+    assert plan[0].startswith(
+        "SEARCH transactions USING INDEX ix_transactions_book_time"
+    )
+    assert not any("TEMP B-TREE" in step for step in plan), plan
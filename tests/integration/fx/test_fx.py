@@ -0,0 +1,140 @@
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+
+from dbk.core import balances, fx, models
+from dbk.db import make_connection, make_session_factory, migrate
+
+
+@pytest.fixture
+def session():
+    e = make_connection("sqlite:///:memory:")
+    migrate(e, models.Base.metadata)
+    with make_session_factory(e)() as s:
+        yield s
+
+
+@pytest.fixture
+def rates(session, tmp_path) -> fx.Rates:
+    path = tmp_path / "rates.csv"
+    path.write_text(
+        "date,base,quote,rate\n"
+        "2023-01-02,EUR,USD,1.10\n"
+        "2023-01-04,EUR,USD,1.20\n"
+        "2023-01-03,USD,CAD,1.25\n"
+        # the direct rate wins over the inverse one
+        "2023-01-05,CAD,USD,0.75\n"
+        "2023-01-05,USD,CAD,2.00\n"
+    )
+    assert fx.import_rates(session, fx.read_rate_file(path)) == 5
+    return fx.rates(session, "USD")
+
+
+def days(*days: int) -> np.ndarray:
+    return np.array([date(2023, 1, d) for d in days], "datetime64[D]")
+
+
+def test_read_rate_file(tmp_path):
+    path = tmp_path / "eurusd.csv"
+    path.write_text("Date,Close\n2023-01-02,1.1\n")
+    [rate] = fx.read_rate_file(path, "eur", "usd")
+    assert (rate.base, rate.quote, rate.day, rate.rate) == (
+        "EUR",
+        "USD",
+        date(2023, 1, 2),
+        1.1,
+    )
+
+    with pytest.raises(fx.InvalidRateFile):
+        list(fx.read_rate_file(path, "EUR"))
+
+    path.write_text("date,rate\n2023-01-02,0\n")
+    with pytest.raises(fx.InvalidRateFile):
+        list(fx.read_rate_file(path, "EUR", "USD"))
+
+
+def test_convert_as_of(rates):
+    eur, cad, usd, gbp = rates.codes(["EUR", "CAD", "USD", "GBP"])
+    assert usd == -1 and gbp == -2
+
+    converted = rates.convert(
+        np.array([100.0, 100.0, 100.0, 100.0, 125.0, 100.0, 100.0, 100.0]),
+        np.array([eur, eur, eur, eur, cad, cad, usd, gbp]),
+        days(1, 2, 3, 9, 3, 5, 1, 5),
+    )
+    np.testing.assert_allclose(
+        converted, [np.nan, 110.0, 110.0, 120.0, 100.0, 75.0, 100.0, np.nan]
+    )
+
+
+def test_replace_rates(session, rates, tmp_path):
+    path = tmp_path / "eurusd.csv"
+    path.write_text("date,rate\n2023-01-04,1.5\n")
+    fx.import_rates(session, fx.read_rate_file(path, "EUR", "USD"))
+    [eur] = fx.rates(session, "USD").codes(["EUR"])
+    assert list(fx.rates(session, "USD").factors(np.array([eur]), days(4))) == [1.5]
+
+
+def test_no_rates(session):
+    rates = fx.rates(session, "USD")
+    codes = rates.codes(["USD", "EUR"])
+    assert list(rates.factors(codes, days(1, 1))[:1]) == [1.0]
+    assert np.isnan(rates.factors(codes, days(1, 1))[1])
+
+
+def test_currencies_in_any_case(session, rates):
+    lower = fx.rates(session, "usd")
+    assert lower.target == "USD"
+    [eur] = lower.codes(["eur"])
+    assert list(lower.factors(np.array([eur]), days(4))) == [1.2]
+    assert list(rates.codes(["usd", "Eur"])) == [-1, eur]
+
+
+def test_total_at_converts(session, rates):
+    book = models.Book(name="b", currency="usd")
+
+    def account(name: str, currency: str | None, parent=None):
+        return models.Account(
+            book=book,
+            name=name,
+            account_type=models.AccountType.asset,
+            is_root=parent is None,
+            is_virtual=False,
+            currency=currency,
+            parent=parent,
+        )
+
+    savings = account("savings", None)
+    euros = account("euros", "EUR", savings)
+    pounds = account("pounds", "GBP", savings)
+    session.add_all([savings, euros, pounds])
+    session.flush()
+    for a, amount in [(savings, 10.0), (euros, 100.0)]:
+        session.add(
+            models.Transaction(
+                book_id=book.id,
+                time=datetime(2023, 1, 2),
+                type=models.TransactionType.receive,
+                description=a.name,
+                debit_account_id=a.id,
+                debit_amount=amount,
+            )
+        )
+    session.commit()
+
+    assert balances.total_at(session, savings.id, date(2023, 1, 4)) == 130.0
+    assert balances.total_at(session, euros.id, date(2023, 1, 4)) == 100.0
+    # the empty account needs no rate, one with a balance does
+    session.add(
+        models.Transaction(
+            book_id=book.id,
+            time=datetime(2023, 1, 3),
+            type=models.TransactionType.receive,
+            description="pounds",
+            debit_account_id=pounds.id,
+            debit_amount=1.0,
+        )
+    )
+    session.commit()
+    assert np.isnan(balances.total_at(session, savings.id, date(2023, 1, 4)))
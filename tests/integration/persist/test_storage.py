@@ -0,0 +1,227 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import sqlalchemy.orm as orm
+
+from dbk.core import models, persist
+from dbk.db import make_connection, make_session_factory, migrate
+from dbk.errors import DbkError
+from dbk.settings import SqliteSettings, UserConfig
+
+contents = "Date,Description,Amount\n01/05/2023,coffee,-4.50\n"
+
+
+@pytest.fixture
+def session():
+    e = make_connection("sqlite:///:memory:")
+    migrate(e, models.Base.metadata)
+    sf = make_session_factory(e)
+    with sf() as s:
+        s.expire_on_commit = False
+        yield s
+
+
+@pytest.fixture
+def config(tmp_path):
+    return UserConfig(working_dir=tmp_path / "wd")
+
+
+@pytest.fixture
+def statement(tmp_path):
+    fname = tmp_path / "statement.csv"
+    fname.write_text(contents)
+    return fname
+
+
+def make_sources(session: orm.Session, *hashes: str) -> list[models.DataSource]:
+    book = models.Book(name="test", currency="USD")
+    sources = []
+    for i, h in enumerate(hashes):
+        conn = models.Connection(
+            book=book, provider_id="bofa", conn_name=f"c{i}", provider_data={}
+        )
+        sources.append(
+            models.DataSource(
+                name=f"s{i}", type=models.DataSourceType.file, hash=h, connection=conn
+            )
+        )
+    session.add_all(sources)
+    session.commit()
+    return sources
+
+
+class TestLocalStorage:
+    def test_roundtrip(self, session, config, statement):
+        [ds] = make_sources(session, "a" * 64)
+        storage = persist.LocalStorage(config)
+
+        storage.write_file(ds, statement)
+        with storage.read_stream(ds) as f:
+            assert f.read() == contents
+
+        storage.write_stream(ds, io.StringIO("replaced"))
+        with storage.read_stream(ds) as f:
+            assert f.read() == "replaced"
+
+    def test_binary_and_map(self, session, config, statement):
+        [ds] = make_sources(session, "a" * 64)
+        storage = persist.LocalStorage(config)
+        storage.write_file(ds, statement)
+
+        with storage.read_binary(ds) as f:
+            assert f.read() == contents.encode()
+
+        with storage.map(ds) as m:
+            view = memoryview(m)
+            assert view[:4] == b"Date"
+            assert bytes(view) == contents.encode()
+            view.release()
+
+
+class TestContentAddressedStorage:
+    def test_shared_blob(self, session, config, statement):
+        h = "ab" * 32
+        a, b = make_sources(session, h, h)
+        storage = persist.ContentAddressedStorage(config)
+
+        storage.write_file(a, statement)
+        storage.write_stream(b, io.StringIO("never written"))
+
+        path = storage.get_data_source_path(a)
+        assert path == config.working_dir / "user_data" / "blobs" / "ab" / "ab" / h
+        assert storage.get_data_source_path(b) == path
+        assert [p.name for p in path.parent.iterdir()] == [h]
+
+        with storage.read_stream(b) as f:
+            assert f.read() == contents
+        with storage.map(b) as m:
+            assert m[:] == contents.encode()
+
+        assert storage.refcounts(session) == {h: 2}
+
+    def test_collect_garbage(self, session, config, statement):
+        kept, dropped = "cd" * 32, "ef" * 32
+        a, b = make_sources(session, kept, dropped)
+        storage = persist.ContentAddressedStorage(config)
+        storage.write_file(a, statement)
+        storage.write_file(b, statement)
+
+        session.delete(b)
+        session.commit()
+
+        assert storage.collect_garbage(session) == [dropped]
+        assert storage.get_data_source_path(a).exists()
+        assert not storage.blob_path(dropped).exists()
+
+
+def test_make_storage(config):
+    assert type(persist.make_storage(config)) is persist.LocalStorage
+
+    config.storage_backend = "cas"
+    assert type(persist.make_storage(config)) is persist.ContentAddressedStorage
+
+    config.storage_backend = "compressed"
+    config.storage_codec = "lzma"
+    storage = persist.make_storage(config)
+    assert isinstance(storage, persist.CompressedStorage)
+    assert storage.codec == "lzma"
+
+
+class TestCompressedStorage:
+    @pytest.mark.parametrize(
+        "codec,magic", [("gzip", b"\x1f\x8b"), ("lzma", b"\xfd7zXZ")]
+    )
+    def test_roundtrip(self, session, config, tmp_path, codec, magic):
+        [ds] = make_sources(session, "a" * 64)
+        storage = persist.CompressedStorage(config, codec=codec, level=9)
+
+        big = tmp_path / "big.csv"
+        big.write_text(contents * 10_000)
+        storage.write_file(ds, big)
+
+        path = storage.get_data_source_path(ds)
+        assert path.read_bytes().startswith(magic)
+        assert path.stat().st_size * 10 < big.stat().st_size
+
+        with storage.read_stream(ds) as f:
+            assert f.read() == contents * 10_000
+
+        storage.write_stream(ds, io.StringIO(contents))
+        with storage.read_stream(ds) as f:
+            assert f.read() == contents
+
+        with storage.read_binary(ds) as f:
+            assert f.read() == contents.encode()
+
+        with pytest.raises(persist.UnsupportedOperation):
+            storage.map(ds)
+
+
+class TestSqliteBlobStorage:
+    @pytest.fixture
+    def engine(self, tmp_path):
+        e = make_connection(f"sqlite:///{tmp_path / 'db.sqlite3'}")
+        migrate(e, models.Base.metadata)
+        return e
+
+    @pytest.fixture
+    def session(self, engine):
+        with make_session_factory(engine)() as s:
+            s.expire_on_commit = False
+            yield s
+
+    def test_roundtrip(self, engine, session, tmp_path):
+        [ds] = make_sources(session, "a" * 64)
+        storage = persist.SqliteBlobStorage(engine)
+
+        big = tmp_path / "big.csv"
+        big.write_text(contents * 50_000)
+        storage.write_file(ds, big)
+
+        with storage.read_stream(ds) as f:
+            assert f.read() == contents * 50_000
+
+        # a smaller blob replaces the row
+        storage.write_stream(ds, io.StringIO(contents))
+        with storage.read_binary(ds) as f:
+            assert f.read(4) == b"Date"
+            assert f.tell() == 4
+            f.seek(0)
+            assert f.read() == contents.encode()
+
+        blob = session.get(models.DataSourceBlob, ds.id)
+        assert blob is not None and blob.size == len(contents)
+
+    def test_concurrent_writes(self, engine, session, tmp_path):
+        sources = make_sources(session, *(c * 64 for c in "abcdef"))
+        # without waiting for locks, any overlapping write fails
+        no_wait = make_connection(str(engine.url), SqliteSettings(busy_timeout=0))
+        storage = persist.SqliteBlobStorage(no_wait)
+
+        def write(ds: models.DataSource):
+            fname = tmp_path / f"{ds.name}.csv"
+            fname.write_text(f"{ds.name}\n" + contents * 100_000)
+            storage.write_file(ds, fname)
+
+        with ThreadPoolExecutor(len(sources)) as pool:
+            list(pool.map(write, sources))
+
+        for ds in sources:
+            with storage.read_stream(ds) as f:
+                assert f.readline() == f"{ds.name}\n"
+
+    def test_missing(self, engine, session):
+        [ds] = make_sources(session, "a" * 64)
+        storage = persist.SqliteBlobStorage(engine)
+
+        with pytest.raises(DbkError):
+            storage.read_stream(ds)
+
+    def test_make_storage(self, engine, config):
+        config.storage_backend = "sqlite"
+        assert isinstance(
+            persist.make_storage(config, engine), persist.SqliteBlobStorage
+        )
+        with pytest.raises(DbkError):
+            persist.make_storage(config)
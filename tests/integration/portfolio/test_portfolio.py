@@ -0,0 +1,207 @@
+from datetime import date, datetime
+from unittest import mock
+
+import numpy as np
+import pytest
+import sqlalchemy as sa
+
+from dbk.core import fx, models, portfolio, snapshot
+from dbk.db import make_connection, make_session_factory, migrate
+
+
+@pytest.fixture
+def session():
+    e = make_connection("sqlite:///:memory:")
+    migrate(e, models.Base.metadata)
+    with make_session_factory(e)() as s:
+        s.expire_on_commit = False
+        yield s
+
+
+@pytest.fixture
+def book(session) -> models.Book:
+    book = models.Book(name="b", currency="USD")
+
+    def account(name: str, currency: str | None):
+        return models.Account(
+            book=book,
+            name=name,
+            account_type=models.AccountType.asset,
+            is_root=True,
+            is_virtual=False,
+            currency=currency,
+        )
+
+    cash, vti, bnd = account("cash", None), account("vti", "VTI"), account("bnd", "BND")
+    session.add_all([cash, vti, bnd])
+    session.flush()
+
+    def trade(day: date, credit, debit, credit_amount: float, debit_amount: float):
+        session.add(
+            models.Transaction(
+                book_id=book.id,
+                time=datetime(day.year, day.month, day.day, 15),
+                type=models.TransactionType.trade,
+                description=f"trade {day}",
+                credit_account_id=credit.id,
+                debit_account_id=debit.id,
+                credit_amount=credit_amount,
+                debit_amount=debit_amount,
+            )
+        )
+
+    # buy 10 VTI for 1000, then 5 for 600, sell 3 for 390
+    trade(date(2023, 1, 2), cash, vti, 1000.0, 10.0)
+    trade(date(2023, 1, 4), cash, vti, 600.0, 5.0)
+    trade(date(2023, 1, 6), vti, cash, 3.0, 390.0)
+    # buy and sell all BND
+    trade(date(2023, 1, 3), cash, bnd, 500.0, 7.0)
+    trade(date(2023, 1, 5), bnd, cash, 7.0, 520.0)
+    session.commit()
+    return book
+
+
+@pytest.fixture
+def prices(session, tmp_path):
+    path = tmp_path / "vti.csv"
+    path.write_text("Date,Open,Close\n2023-01-02,99,100\n2023-01-05,120,125.5\n")
+    assert portfolio.import_prices(session, portfolio.read_price_file(path, "VTI")) == 2
+    session.commit()
+
+
+def test_read_price_file(tmp_path):
+    path = tmp_path / "prices.csv"
+    path.write_text("symbol,date,price\nVTI,2023-01-02,100\nBND,2023-01-02,70.5\n")
+    prices = list(portfolio.read_price_file(path))
+    assert [(p.instrument, p.day, p.price) for p in prices] == [
+        ("VTI", date(2023, 1, 2), 100.0),
+        ("BND", date(2023, 1, 2), 70.5),
+    ]
+
+    path.write_text("date,price\n2023-01-02,100\n")
+    with pytest.raises(portfolio.InvalidPriceFile):
+        list(portfolio.read_price_file(path))
+
+    path.write_text("date,price\n2023-01-02,n/a\n")
+    with pytest.raises(portfolio.InvalidPriceFile):
+        list(portfolio.read_price_file(path, "VTI"))
+
+
+def test_import_replaces_prices(session, prices, tmp_path):
+    path = tmp_path / "vti.csv"
+    path.write_text("date,close\n2023-01-05,130\n")
+    portfolio.import_prices(session, portfolio.read_price_file(path, "VTI"))
+    [history] = portfolio.price_histories(session, ["VTI"]).values()
+    assert list(history.prices) == [100.0, 130.0]
+
+
+def test_positions(session, book, prices):
+    [vti] = portfolio.positions(session, book.id, date(2023, 1, 10))
+    assert (vti.instrument, vti.quantity, vti.cost) == ("VTI", 12.0, 1210.0)
+    assert vti.price == 125.5
+    assert vti.value == 12 * 125.5
+    assert vti.gain == 12 * 125.5 - 1210.0
+
+    early = portfolio.positions(session, book.id, date(2023, 1, 3))
+    assert [(p.instrument, p.quantity, p.price) for p in early] == [
+        ("BND", 7.0, None),
+        ("VTI", 10.0, 100.0),
+    ]
+    assert portfolio.positions(session, book.id, date(2023, 1, 1)) == []
+
+
+def test_valuation(session, book, prices):
+    v = portfolio.valuation(session, book.id, date(2023, 1, 1), date(2023, 1, 7))
+    assert v.instruments == ["BND", "VTI"]
+    assert len(v.days) == 7
+    bnd, vti = v.values[:, 0], v.values[:, 1]
+    assert list(vti) == [0.0, 1000.0, 1000.0, 1500.0, 15 * 125.5, 1506.0, 1506.0]
+    # BND has no prices, and is worth nothing once sold
+    assert np.isnan(bnd[2:4]).all() and list(bnd[4:]) == [0.0, 0.0, 0.0]
+    assert list(v.total[:2]) == [0.0, 1000.0]
+    assert list(v.costs[-1]) == [-20.0, 1210.0]
+
+
+def test_trades_from_snapshot(session, book, prices, tmp_path):
+    snapshots = snapshot.SnapshotCache(tmp_path / "snapshots")
+    day = date(2023, 1, 10)
+    assert portfolio.positions(session, book.id, day, snapshots) == (
+        portfolio.positions(session, book.id, day)
+    )
+
+    # a trade changed after the snapshot was taken is seen
+    session.execute(
+        sa.update(models.Transaction)
+        .where(models.Transaction.description == "trade 2023-01-06")
+        .values(debit_amount=400.0)
+    )
+    session.commit()
+    [vti] = portfolio.positions(session, book.id, day, snapshots)
+    assert vti.cost == 1200.0
+
+
+def test_sold_in_full_is_closed(session, book):
+    cash = book.accounts[0]
+    fund = models.Account(
+        book=book,
+        name="fund",
+        account_type=models.AccountType.asset,
+        is_root=True,
+        is_virtual=False,
+        currency="FND",
+    )
+    session.add(fund)
+    session.flush()
+    # buy 0.1 and 0.2, sell 0.3: as floats, 0.1 + 0.2 - 0.3 is not 0
+    for day, credit, debit, credit_amount, debit_amount in [
+        (20, cash, fund, 10.0, 0.1),
+        (21, cash, fund, 20.0, 0.2),
+        (22, fund, cash, 0.3, 30.0),
+    ]:
+        session.add(
+            models.Transaction(
+                book_id=book.id,
+                time=datetime(2023, 1, day),
+                type=models.TransactionType.trade,
+                description="fund",
+                credit_account_id=credit.id,
+                debit_account_id=debit.id,
+                credit_amount=credit_amount,
+                debit_amount=debit_amount,
+            )
+        )
+    session.commit()
+
+    held = portfolio.positions(session, book.id, date(2023, 1, 21))
+    assert [(p.instrument, p.quantity) for p in held] == [("FND", 0.3), ("VTI", 12.0)]
+    held = portfolio.positions(session, book.id, date(2023, 1, 22))
+    assert [p.instrument for p in held] == ["VTI"]
+    v = portfolio.valuation(session, book.id, date(2023, 1, 22), date(2023, 1, 22))
+    assert v.values[0, v.instruments.index("FND")] == 0.0
+
+
+def test_prices_in_other_currency(session, book, tmp_path):
+    path = tmp_path / "vti.csv"
+    path.write_text("date,close,currency\n2023-01-02,100,eur\n2023-01-05,120,EUR\n")
+    portfolio.import_prices(session, portfolio.read_price_file(path, "VTI"))
+    path = tmp_path / "eurusd.csv"
+    path.write_text("date,rate\n2023-01-04,1.5\n")
+    fx.import_rates(session, fx.read_rate_file(path, "EUR", "USD"))
+    path = tmp_path / "agg.csv"
+    path.write_text("date,close\n2023-01-02,70\n")
+    portfolio.import_prices(session, portfolio.read_price_file(path, "AGG"))
+    session.commit()
+
+    [history] = portfolio.price_histories(session, ["VTI"], "USD").values()
+    # no rate yet on the first day
+    assert np.isnan(history.prices[0]) and history.prices[1] == 180.0
+    # prices without a currency are in the one asked for, whatever its case
+    with mock.patch.object(fx, "rates", side_effect=AssertionError):
+        [history] = portfolio.price_histories(session, ["AGG"], "usd").values()
+    assert list(history.prices) == [70.0]
+    histories = portfolio.price_histories(session, ["AGG", "VTI"], "usd")
+    assert histories["VTI"].prices[1] == 180.0
+    [vti] = portfolio.positions(session, book.id, date(2023, 1, 10))
+    assert vti.price == 180.0
+    early = portfolio.positions(session, book.id, date(2023, 1, 3))
+    assert [(p.instrument, p.price) for p in early] == [("BND", None), ("VTI", None)]
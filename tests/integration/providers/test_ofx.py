@@ -0,0 +1,167 @@
+import io
+from datetime import datetime
+from unittest import mock
+
+import pytest
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+from dbk.core import models, persist
+from dbk.core.providers import SyncContext
+from dbk.core.providers.ofx import (
+    OfxAccountType,
+    OfxData,
+    OfxProvider,
+    _parse_amount,
+    read_statement_transactions,
+)
+from dbk.db import make_connection, make_session_factory, migrate
+
+sgml_input = """OFXHEADER:100
+DATA:OFXSGML
+VERSION:102
+SECURITY:NONE
+ENCODING:USASCII
+CHARSET:1252
+COMPRESSION:NONE
+OLDFILEUID:NONE
+NEWFILEUID:NONE
+
+<OFX>
+<SIGNONMSGSRSV1><SONRS><STATUS><CODE>0<SEVERITY>INFO</STATUS>
+<DTSERVER>20230131120000<LANGUAGE>ENG</SONRS></SIGNONMSGSRSV1>
+<BANKMSGSRSV1><STMTTRNRS><TRNUID>1<STMTRS><CURDEF>USD
+<BANKACCTFROM><BANKID>123<ACCTID>456<ACCTTYPE>CHECKING</BANKACCTFROM>
+<BANKTRANLIST><DTSTART>20230101<DTEND>20230131
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20230105120000.000[-5:EST]<TRNAMT>-4.50<FITID>A1<NAME>COFFEE & CO</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20230105120000.000[-5:EST]<TRNAMT>-4.50<FITID>A2<NAME>COFFEE & CO</STMTTRN>
+<STMTTRN>
+<TRNTYPE>CREDIT
+<DTPOSTED>20230115
+<TRNAMT>2000.00
+<FITID>A3
+<MEMO>PAYROLL
+</STMTTRN>
+</BANKTRANLIST>
+<LEDGERBAL><BALAMT>1991.00<DTASOF>20230131</LEDGERBAL>
+</STMTRS></STMTTRNRS></BANKMSGSRSV1>
+</OFX>
+"""
+
+xml_input = """<?xml version="1.0" encoding="UTF-8" standalone="no"?>
+<?OFX OFXHEADER="200" VERSION="220" SECURITY="NONE" OLDFILEUID="NONE" NEWFILEUID="NONE"?>
+<OFX>
+  <BANKMSGSRSV1><STMTTRNRS><STMTRS>
+    <BANKTRANLIST>
+      <STMTTRN>
+        <TRNTYPE>DEBIT</TRNTYPE>
+        <DTPOSTED>20230105</DTPOSTED>
+        <TRNAMT>-4.50</TRNAMT>
+        <FITID>A1</FITID>
+        <NAME>COFFEE &amp; CO</NAME>
+      </STMTTRN>
+    </BANKTRANLIST>
+  </STMTRS></STMTTRNRS></BANKMSGSRSV1>
+</OFX>
+"""
+
+
+class _SmallChunks(io.StringIO):
+    """Forces the parser to deal with tags and values split across reads."""
+
+    def read(self, size=-1):
+        return super().read(7)
+
+
+@pytest.fixture
+def session():
+    e = make_connection("sqlite:///:memory:")
+    migrate(e, models.Base.metadata)
+    sf = make_session_factory(e)
+    with sf() as s:
+        s.expire_on_commit = False
+        yield s
+
+
+@pytest.mark.parametrize("stream_cls", [io.StringIO, _SmallChunks])
+def test_read_sgml(stream_cls):
+    txs = list(read_statement_transactions(stream_cls(sgml_input)))
+
+    assert [tx["FITID"] for tx in txs] == ["A1", "A2", "A3"]
+    assert txs[0]["NAME"] == "COFFEE & CO"
+    assert txs[0]["TRNAMT"] == "-4.50"
+    assert txs[2]["MEMO"] == "PAYROLL"
+
+
+@pytest.mark.parametrize("stream_cls", [io.StringIO, _SmallChunks])
+def test_read_sgml_empty_leaves(stream_cls):
+    body = sgml_input.replace(
+        "<NAME>COFFEE & CO</STMTTRN>", "<NAME><MEMO></STMTTRN>", 1
+    ).replace("<FITID>A3", "<NAME>\n<FITID>A3")
+    txs = list(read_statement_transactions(stream_cls(body)))
+
+    assert [tx["FITID"] for tx in txs] == ["A1", "A2", "A3"]
+    assert (txs[0]["NAME"], txs[0]["MEMO"], txs[0]["TRNAMT"]) == ("", "", "-4.50")
+    assert (txs[2]["NAME"], txs[2]["MEMO"]) == ("", "PAYROLL")
+
+
+@pytest.mark.parametrize("stream_cls", [io.StringIO, _SmallChunks])
+def test_read_xml(stream_cls):
+    txs = list(read_statement_transactions(stream_cls(xml_input)))
+
+    assert len(txs) == 1
+    assert txs[0]["NAME"] == "COFFEE & CO"
+    assert txs[0]["DTPOSTED"] == "20230105"
+
+
+@pytest.mark.parametrize(
+    "text,amount",
+    [("-4.50", -4.5), ("-4,50", -4.5), ("1,234.56", 1234.56), (" 2000 ", 2000.0)],
+)
+def test_parse_amount(text, amount):
+    assert _parse_amount(text) == amount
+
+
+def test_sync_with_source(session: orm.Session):
+    with session.begin_nested():
+        book = models.Book(name="test", currency="USD")
+        conn = models.Connection(
+            book=book,
+            provider_id=OfxProvider.provider_id(),
+            conn_name="test",
+            provider_data=OfxData(account_type=OfxAccountType.checking).model_dump(),
+        )
+        source = models.DataSource(
+            name="test",
+            type=models.DataSourceType.file,
+            connection=conn,
+        )
+        session.add_all([book, conn, source])
+
+    storage = mock.MagicMock(spec=persist.Storage)
+    storage.read_stream.side_effect = lambda ds: io.StringIO(sgml_input)
+
+    provider = OfxProvider()
+    ctx = SyncContext(
+        session=session,
+        storage=storage,
+        provider=provider,
+        connection=conn,
+        data_source=source,
+    )
+
+    # syncing the same file twice must not duplicate transactions
+    provider.sync(ctx)
+    provider.sync(ctx)
+
+    txs = session.scalars(
+        sa.select(models.Transaction).order_by(models.Transaction.external_ref)
+    ).all()
+
+    # A1 and A2 look the same, but are different transactions
+    assert [tx.external_ref for tx in txs] == ["A1", "A2", "A3"]
+    assert txs[0].time == datetime(2023, 1, 5, 12)
+    assert txs[0].credit_amount == 4.5
+    assert txs[0].credit_account_id == conn.accounts[0].id
+    assert txs[2].description == "PAYROLL"
+    assert txs[2].debit_amount == 2000
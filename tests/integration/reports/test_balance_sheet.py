@@ -0,0 +1,173 @@
+import math
+from datetime import date, datetime
+
+import pytest
+
+from dbk.core import add_default_book, models, reports
+from dbk.db import make_connection, make_session_factory, migrate
+
+
+@pytest.fixture
+def session():
+    e = make_connection("sqlite:///:memory:")
+    migrate(e, models.Base.metadata)
+    with make_session_factory(e)() as s:
+        s.expire_on_commit = False
+        yield s
+
+
+@pytest.fixture
+def book(session) -> models.Book:
+    book = add_default_book(session)
+    session.flush()
+    roots = {a.name: a for a in book.accounts}
+
+    def account(name: str, parent: models.Account):
+        a = models.Account(
+            book=book,
+            name=name,
+            account_type=parent.account_type,
+            is_root=False,
+            is_virtual=False,
+            parent=parent,
+        )
+        session.add(a)
+        return a
+
+    checking = account("Checking", roots["Assets"])
+    card = account("Card", roots["Liabilities"])
+    food = models.Account(
+        book=book,
+        name="Food",
+        account_type=models.AccountType.expense,
+        is_root=False,
+        is_virtual=True,
+        parent=roots["Expenses"],
+    )
+    groceries = account("Groceries", food)
+    restaurants = account("Restaurants", food)
+    salary = account("Salary", roots["Incomes"])
+    session.flush()
+
+    def tx(day: int, credit, debit, amount: float):
+        session.add(
+            models.Transaction(
+                book_id=book.id,
+                time=datetime(2023, 1, day, 12),
+                type=models.TransactionType.unknown,
+                description=f"{day} {amount}",
+                credit_account_id=credit.id,
+                debit_account_id=debit.id,
+                credit_amount=amount,
+                debit_amount=amount,
+            )
+        )
+
+    tx(1, salary, checking, 1000.0)
+    tx(2, checking, groceries, 40.0)
+    tx(3, card, restaurants, 25.5)
+    tx(10, card, groceries, 10.0)
+    session.commit()
+    return book
+
+
+def by_name(sheet: reports.BalanceSheet) -> dict[str, reports.ReportLine]:
+    return {line.name: line for line in sheet.lines}
+
+
+def test_balance_sheet(session, book):
+    sheet = reports.balance_sheet(session, book.id, date(2023, 1, 5))
+    lines = by_name(sheet)
+
+    assert [r.name for r in sheet.roots()] == [
+        "Assets",
+        "Expenses",
+        "Incomes",
+        "Liabilities",
+    ]
+    assert lines["Checking"].balance == 960.0
+    assert lines["Assets"].balance == 0.0
+    assert lines["Assets"].total == 960.0
+    assert lines["Food"].total == lines["Expenses"].total == 65.5
+    assert (lines["Liabilities"].total, lines["Incomes"].total) == (-25.5, -1000.0)
+    assert lines["Groceries"].depth == 2
+    # assets, expenses, incomes and liabilities balance out
+    assert sum(r.total for r in sheet.roots()) == 0.0
+
+
+def test_tree_order(session, book):
+    sheet = reports.balance_sheet(session, book.id, date(2023, 1, 5))
+    assert [(r.depth, r.name) for r in sheet.lines] == [
+        (0, "Assets"),
+        (1, "Checking"),
+        (0, "Expenses"),
+        (1, "Food"),
+        (2, "Groceries"),
+        (2, "Restaurants"),
+        (0, "Incomes"),
+        (1, "Salary"),
+        (0, "Liabilities"),
+        (1, "Card"),
+    ]
+
+
+def test_as_of(session, book):
+    before = by_name(reports.balance_sheet(session, book.id, date(2022, 12, 31)))
+    assert all(r.total == 0.0 for r in before.values())
+
+    after = by_name(reports.balance_sheet(session, book.id, date(2023, 2, 1)))
+    assert after["Groceries"].balance == 50.0
+    assert after["Food"].total == 75.5
+    assert after["Card"].total == -35.5
+
+
+def test_converts_totals(session, book):
+    savings = models.Account(
+        book=book,
+        name="Savings",
+        account_type=models.AccountType.asset,
+        is_root=False,
+        is_virtual=False,
+        parent_id=next(a.id for a in book.accounts if a.name == "Assets"),
+        currency="EUR",
+    )
+    session.add(savings)
+    session.flush()
+    salary = next(a for a in book.accounts if a.name == "Incomes")
+    session.add(
+        models.Transaction(
+            book_id=book.id,
+            time=datetime(2023, 1, 4, 12),
+            type=models.TransactionType.unknown,
+            description="euros",
+            credit_account_id=salary.id,
+            debit_account_id=savings.id,
+            credit_amount=110.0,
+            debit_amount=100.0,
+        )
+    )
+    session.commit()
+
+    # no rate yet, the total of the savings is unknown
+    lines = by_name(reports.balance_sheet(session, book.id, date(2023, 1, 5)))
+    assert lines["Savings"].balance == 100.0
+    assert math.isnan(lines["Assets"].total)
+    assert lines["Checking"].total == 960.0
+
+    session.add_all(
+        [
+            models.FxRate(
+                base="EUR", quote=book.currency, day=date(2023, 1, 1), rate=1.1
+            ),
+            models.FxRate(
+                base="EUR", quote=book.currency, day=date(2023, 1, 5), rate=1.2
+            ),
+        ]
+    )
+    sheet = reports.balance_sheet(session, book.id, date(2023, 1, 4))
+    assert sheet.currency == book.currency
+    assert by_name(sheet)["Savings"].total == pytest.approx(110.0)
+    assert by_name(sheet)["Assets"].total == pytest.approx(1070.0)
+
+    lines = by_name(reports.balance_sheet(session, book.id, date(2023, 1, 5)))
+    assert lines["Assets"].total == pytest.approx(1080.0)
@@ -0,0 +1,187 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+import sqlalchemy as sa
+
+from dbk.core import fx, models, reports
+from dbk.core.reports import Granularity
+from dbk.db import make_connection, make_session_factory, migrate
+
+T = models.Transaction
+
+
+@pytest.fixture
+def session():
+    e = make_connection("sqlite:///:memory:")
+    migrate(e, models.Base.metadata)
+    with make_session_factory(e)() as s:
+        s.expire_on_commit = False
+        yield s
+
+
+@pytest.fixture
+def accounts(session) -> dict[str, models.Account]:
+    book = models.Book(name="b", currency="USD")
+    accounts = {
+        name: models.Account(
+            book=book,
+            name=name,
+            account_type=account_type,
+            is_root=True,
+            is_virtual=False,
+        )
+        for name, account_type in [
+            ("checking", models.AccountType.asset),
+            ("food", models.AccountType.expense),
+            ("rent", models.AccountType.expense),
+        ]
+    }
+    session.add_all(accounts.values())
+    session.commit()
+    return accounts
+
+
+def spend(session, accounts, day: date, amount: float, category: str | None):
+    tx = T(
+        book_id=accounts["checking"].book_id,
+        time=datetime.combine(day, datetime.min.time()) + timedelta(hours=23),
+        type=models.TransactionType.spend,
+        description=f"{day} {amount}",
+        credit_account_id=accounts["checking"].id,
+        credit_amount=amount,
+        debit_account_id=accounts[category].id if category else None,
+        debit_amount=amount if category else None,
+    )
+    session.add(tx)
+    session.commit()
+    return tx
+
+
+@pytest.mark.parametrize("granularity", list(Granularity))
+def test_buckets_match_sql(session, granularity):
+    days = [date(2023, 12, 31) + timedelta(days=i) for i in range(45)]
+    stmt = sa.select(
+        *(
+            granularity.sql(
+                sa.literal(datetime.combine(d, datetime.min.time()), models.EpochTime())
+            )
+            for d in days
+        )
+    )
+    in_sql = [date.fromisoformat(b) for b in session.execute(stmt).one()]
+    assert in_sql == [granularity.bucket(d) for d in days]
+
+
+def test_spending(session, accounts):
+    spend(session, accounts, date(2023, 1, 5), 10.0, "food")
+    spend(session, accounts, date(2023, 1, 31), 2.5, "food")
+    spend(session, accounts, date(2023, 2, 1), 1000.0, "rent")
+    spend(session, accounts, date(2023, 2, 3), 7.0, None)
+    spend(session, accounts, date(2023, 4, 1), 1.0, "food")
+
+    book_id = accounts["checking"].book_id
+    report = reports.spending(
+        session, book_id, date(2023, 1, 15), date(2023, 3, 1), Granularity.month
+    )
+    assert report.buckets == [date(2023, 1, 1), date(2023, 2, 1), date(2023, 3, 1)]
+    assert report.amounts == {
+        accounts["food"].id: [12.5, 0.0, 0.0],
+        accounts["rent"].id: [0.0, 1000.0, 0.0],
+        None: [0.0, 7.0, 0.0],
+    }
+    assert report.totals() == [12.5, 1007.0, 0.0]
+
+    weekly = reports.spending(
+        session, book_id, date(2023, 1, 30), date(2023, 2, 5), Granularity.week
+    )
+    assert weekly.buckets == [date(2023, 1, 30)]
+    assert weekly.totals() == [1009.5]
+
+
+def test_cache_updates_changed_buckets(session, accounts, monkeypatch):
+    book_id = accounts["checking"].book_id
+    food = spend(session, accounts, date(2023, 1, 5), 10.0, "food")
+    spend(session, accounts, date(2023, 3, 5), 3.0, "food")
+    period = (date(2023, 1, 1), date(2023, 3, 31), Granularity.month)
+    cache = reports.SpendingCache()
+    first = cache.get(session, book_id, *period)
+
+    queried = []
+    rows = reports._spending.spending_rows
+
+    def spending_rows(session, book_id, granularity, ranges):
+        ranges = list(ranges)
+        queried.append(ranges)
+        return rows(session, book_id, granularity, ranges)
+
+    monkeypatch.setattr(reports._spending, "spending_rows", spending_rows)
+
+    assert cache.get(session, book_id, *period) is first
+    assert queried == []
+
+    spend(session, accounts, date(2023, 2, 10), 5.0, "rent")
+    # recategorizing moves spending between categories of its bucket
+    session.execute(
+        sa.update(T).where(T.id == food.id).values(debit_account_id=accounts["rent"].id)
+    )
+    session.commit()
+
+    report = cache.get(session, book_id, *period)
+    assert queried == [
+        [(date(2023, 1, 1), date(2023, 2, 1)), (date(2023, 2, 1), date(2023, 3, 1))]
+    ]
+    assert report.amounts == {
+        accounts["food"].id: [0.0, 0.0, 3.0],
+        accounts["rent"].id: [10.0, 5.0, 0.0],
+    }
+    assert report.amounts == reports.spending(session, book_id, *period).amounts
+    # the report handed out before is left as it was
+    assert first.amounts == {accounts["food"].id: [10.0, 0.0, 3.0]}
+
+
+def test_spending_converts_currencies(session, accounts, tmp_path):
+    book_id = accounts["checking"].book_id
+    card = models.Account(
+        book_id=book_id,
+        name="card",
+        account_type=models.AccountType.liability,
+        is_root=True,
+        is_virtual=False,
+        currency="EUR",
+    )
+    session.add(card)
+    session.commit()
+    spend(session, accounts, date(2023, 1, 5), 10.0, "food")
+    for day in (date(2023, 1, 9), date(2023, 2, 9)):
+        session.add(
+            T(
+                book_id=book_id,
+                time=datetime.combine(day, datetime.min.time()),
+                type=models.TransactionType.spend,
+                description="abroad",
+                credit_account_id=card.id,
+                credit_amount=20.0,
+                debit_account_id=accounts["food"].id,
+                debit_amount=20.0,
+            )
+        )
+    session.commit()
+    period = (date(2023, 1, 1), date(2023, 2, 28), Granularity.month)
+    cache = reports.SpendingCache()
+
+    # without a rate, euros are left out and noted
+    report = cache.get(session, book_id, *period)
+    assert report.totals() == [10.0, 0.0]
+    assert report.missing_rates == {
+        date(2023, 1, 1): {"EUR"},
+        date(2023, 2, 1): {"EUR"},
+    }
+
+    path = tmp_path / "eurusd.csv"
+    path.write_text("date,rate\n2022-12-30,1.5\n2023-02-01,1.25\n")
+    fx.import_rates(session, fx.read_rate_file(path, "EUR", "USD"))
+    session.commit()
+    # new rates rebuild the cached report
+    report = cache.get(session, book_id, *period)
+    assert report.totals() == [40.0, 25.0]
+    assert report.missing_rates == {}
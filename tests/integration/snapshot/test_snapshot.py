@@ -0,0 +1,232 @@
+import json
+from datetime import UTC, datetime, timedelta
+
+import numpy as np
+import pytest
+import sqlalchemy as sa
+
+from dbk.core import models, snapshot
+from dbk.db import make_connection, make_session_factory, migrate
+
+T = models.Transaction
+
+
+@pytest.fixture
+def session_factory():
+    e = make_connection("sqlite:///:memory:")
+    migrate(e, models.Base.metadata)
+    return make_session_factory(e)
+
+
+@pytest.fixture
+def cache(tmp_path) -> snapshot.SnapshotCache:
+    return snapshot.SnapshotCache(tmp_path)
+
+
+@pytest.fixture
+def book(session_factory) -> tuple[int, int]:
+    """Ids of a book and of an account in it."""
+    with session_factory() as s:
+        book = models.Book(name="b", currency="USD")
+        account = models.Account(
+            book=book,
+            name="a",
+            account_type=models.AccountType.asset,
+            is_root=True,
+            is_virtual=False,
+        )
+        s.add_all([book, account])
+        s.commit()
+        return book.id, account.id
+
+
+def add(s, book: tuple[int, int], n: int, start=datetime(2023, 1, 1)):
+    book_id, account_id = book
+    s.execute(
+        sa.insert(T),
+        [
+            dict(
+                book_id=book_id,
+                time=start + timedelta(days=i),
+                type=models.TransactionType.spend,
+                description=f"shop {i % 3}",
+                credit_account_id=account_id,
+                credit_amount=i + 0.25,
+            )
+            for i in range(n)
+        ],
+    )
+    s.commit()
+
+
+def test_snapshot(session_factory, cache, book):
+    book_id, account_id = book
+    with session_factory() as s:
+        add(s, book, 6)
+        snap = cache.refresh(s, book_id)
+
+    assert len(snap) == 6
+    assert isinstance(snap.id, np.memmap)
+    assert not snap.time.flags.writeable
+    assert snap.time[1] - snap.time[0] == 86400
+    assert datetime.fromtimestamp(int(snap.time[0]), UTC) == datetime(
+        2023, 1, 1, tzinfo=UTC
+    )
+    assert list(snap.credit_units[:2]) == [25, 125]
+    assert list(snap.debit_units[:2]) == [0, 0]
+    assert set(snap.credit_account_id) == {account_id}
+    assert set(snap.debit_account_id) == {0}
+    assert snapshot.TYPES[snap.type[0]] == models.TransactionType.spend
+    # descriptions are stored once
+    assert len(snap.descriptions) == 3
+    assert [snap.descriptions[c] for c in snap.description[:4]] == [
+        "shop 0",
+        "shop 1",
+        "shop 2",
+        "shop 0",
+    ]
+
+    # another reader, e.g. another process, loads the same files
+    loaded = cache.load(book_id)
+    assert loaded is not None
+    assert loaded.watermark == snap.watermark == snap.id[-1]
+
+
+def test_refresh_appends(session_factory, cache, book):
+    book_id, _ = book
+    with session_factory() as s:
+        add(s, book, 4)
+        old = cache.refresh(s, book_id)
+        assert cache.refresh(s, book_id).watermark == old.watermark
+
+        add(s, book, 4, start=datetime(2024, 1, 1))
+        new = cache.refresh(s, book_id)
+        ids = list(s.scalars(sa.select(T.id).order_by(T.id)))
+
+    assert list(new.id) == ids
+    assert len(new.descriptions) == 3
+    # the old snapshot stays readable after its files are replaced
+    assert len(old) == 4 and old.id[-1] == ids[3]
+
+
+def test_refresh_after_delete(session_factory, cache, book):
+    book_id, _ = book
+    with session_factory() as s:
+        add(s, book, 4)
+        cache.refresh(s, book_id)
+        s.execute(sa.delete(T).where(T.description == "shop 1"))
+        s.commit()
+        snap = cache.refresh(s, book_id)
+        ids = list(s.scalars(sa.select(T.id).order_by(T.id)))
+
+    assert list(snap.id) == ids
+
+
+def test_empty_book(session_factory, cache, book):
+    book_id, _ = book
+    with session_factory() as s:
+        snap = cache.refresh(s, book_id)
+    assert len(snap) == 0
+    assert snap.watermark == 0
+
+
+def test_refresh_after_update(session_factory, cache, book):
+    book_id, _ = book
+    with session_factory() as s:
+        add(s, book, 4)
+        old = cache.refresh(s, book_id)
+        first, second = int(old.id[0]), int(old.id[1])
+        s.execute(sa.update(T).where(T.id == first).values(description="market"))
+        s.execute(
+            sa.update(T)
+            .where(T.id == second)
+            .values(time=datetime(2024, 6, 1), credit_amount=7.5)
+        )
+        s.commit()
+        snap = cache.refresh(s, book_id)
+
+    assert snap.version > old.version
+    assert list(snap.id) == list(old.id)
+    assert snap.descriptions[snap.description[0]] == "market"
+    assert snap.credit_units[1] == 750
+    assert snap.time[1] == datetime(2024, 6, 1, tzinfo=UTC).timestamp()
+    # the other rows are kept as they were
+    assert list(snap.credit_units[2:]) == list(old.credit_units[2:])
+
+
+def test_refresh_after_id_reuse(session_factory, cache, book):
+    book_id, account_id = book
+    with session_factory() as s:
+        add(s, book, 4)
+        old = cache.refresh(s, book_id)
+        last = int(old.id[-1])
+        # SQLite gives the highest id to the next row once it is deleted
+        s.execute(sa.delete(T).where(T.id == last))
+        s.add(
+            T(
+                book_id=book_id,
+                time=datetime(2023, 3, 1),
+                type=models.TransactionType.spend,
+                description="new",
+                credit_account_id=account_id,
+                credit_amount=9.0,
+            )
+        )
+        s.commit()
+        assert s.scalar(sa.select(sa.func.max(T.id))) == last
+        snap = cache.refresh(s, book_id)
+
+    assert len(snap) == 4 and snap.id[-1] == last
+    assert snap.credit_units[-1] == 900
+    assert snap.descriptions[snap.description[-1]] == "new"
+
+
+def test_previous_generation_is_kept(session_factory, cache, book):
+    book_id, _ = book
+    with session_factory() as s:
+        add(s, book, 2)
+        cache.refresh(s, book_id)
+        # a reader that read CURRENT before the next refresh can still load its files
+        stale = (cache.directory / str(book_id) / "CURRENT").read_text()
+        add(s, book, 2, start=datetime(2024, 1, 1))
+        cache.refresh(s, book_id)
+        (cache.directory / str(book_id) / "CURRENT").write_text(stale)
+        assert len(cache.load(book_id)) == 2
+
+        add(s, book, 2, start=datetime(2025, 1, 1))
+        cache.refresh(s, book_id)
+        # the generation newer than the stale one could be about to become CURRENT
+        book_dir = cache.directory / str(book_id)
+        assert len(list(book_dir.glob("gen-*"))) == 3
+
+        add(s, book, 2, start=datetime(2026, 1, 1))
+        cache.refresh(s, book_id)
+    generations = sorted(p.name for p in book_dir.glob("gen-*"))
+    assert generations == ["gen-00000002", "gen-00000003"]
+
+
+def test_generation_in_progress_is_kept(session_factory, cache, book):
+    book_id, _ = book
+    with session_factory() as s:
+        add(s, book, 2)
+        cache.refresh(s, book_id)
+        # another process has created the next generation, but not yet pointed
+        # CURRENT at it
+        book_dir = cache.directory / str(book_id)
+        (book_dir / "gen-00000001").mkdir()
+
+        add(s, book, 2, start=datetime(2024, 1, 1))
+        assert len(cache.refresh(s, book_id)) == 4
+        assert (book_dir / "gen-00000001").exists()
+        current = json.loads((book_dir / "CURRENT").read_text())
+        assert current["generation"] == "gen-00000002"
+
+
+def test_removed_while_saving(session_factory, cache, book, monkeypatch):
+    book_id, _ = book
+    with session_factory() as s:
+        add(s, book, 3)
+        monkeypatch.setattr(cache, "load", lambda book_id: None)
+        snap = cache.refresh(s, book_id, full=True)
+    assert len(snap) == 3
+    assert snap.descriptions[snap.description[0]] == "shop 0"
@@ -0,0 +1,103 @@
+import io
+from unittest import mock
+
+import pytest
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+from dbk.core import models, persist, sync
+from dbk.core.providers.bofa import BofaAccountType, BofaData, BofaProvider
+from dbk.db import make_connection, make_session_factory, migrate
+
+header = """blank
+blank
+blank
+blank
+blank
+
+Date,Description,Amount,Running Bal.
+12/20/2022,0,,"26,012.56"
+"""
+
+csv_input = header + "".join(
+    f"01/{i % 28 + 1:02}/2023,tx {i},-{i}.00,1\n" for i in range(25)
+)
+
+
+class _FailingStream(io.StringIO):
+    """Simulates a crash after a number of lines have been read."""
+
+    def __init__(self, value: str, fail_after: int):
+        self.fail_after = fail_after
+        super().__init__(value)
+
+    def readline(self, size=-1):
+        self.fail_after -= 1
+        if self.fail_after < 0:
+            raise RuntimeError("interrupted")
+        return super().readline(size)
+
+
+@pytest.fixture
+def session():
+    e = make_connection("sqlite:///:memory:")
+    migrate(e, models.Base.metadata)
+    sf = make_session_factory(e)
+    with sf() as s:
+        s.expire_on_commit = False
+        yield s
+
+
+@pytest.fixture
+def conn_and_source(session: orm.Session):
+    book = models.Book(name="test", currency="USD")
+    conn = models.Connection(
+        book=book,
+        provider_id=BofaProvider.provider_id(),
+        conn_name="test",
+        provider_data=BofaData(account_type=BofaAccountType.checking).model_dump(),
+    )
+    source = models.DataSource(
+        name="test",
+        type=models.DataSourceType.file,
+        connection=conn,
+    )
+    session.add_all([book, conn, source])
+    session.commit()
+    return conn, source
+
+
+def _count(session: orm.Session) -> int:
+    return session.scalar(sa.select(sa.func.count(models.Transaction.id)))
+
+
+def test_resume_after_failure(session: orm.Session, conn_and_source, monkeypatch):
+    conn, source = conn_and_source
+    monkeypatch.setattr(sync, "CHECKPOINT_EVERY", 10)
+    storage = mock.MagicMock(spec=persist.Storage)
+
+    # fail while reading the 16th transaction, after the first checkpoint
+    storage.read_stream.side_effect = lambda ds: _FailingStream(csv_input, 8 + 15)
+    sync.sync_connection(session, storage, conn, [source])
+
+    assert source.last_synced is None
+    assert source.last_sync_error == "interrupted"
+    assert source.sync_row == 10
+    assert source.sync_offset is not None
+    assert _count(session) == 10
+
+    # resuming seeks to the checkpoint instead of re-reading the file
+    offset = source.sync_offset
+    assert csv_input[offset:].startswith("01/11/2023,tx 10,")
+
+    stream = io.StringIO(csv_input)
+    storage.read_stream.side_effect = lambda ds: stream
+    with mock.patch.object(stream, "seek", wraps=stream.seek) as seek:
+        sync.sync_connection(session, storage, conn, [source])
+    seek.assert_called_once_with(offset)
+
+    assert source.last_synced is not None
+    assert source.last_sync_error is None
+    assert source.sync_row is None
+    assert source.sync_offset is None
+    assert _count(session) == 25
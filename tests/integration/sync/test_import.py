@@ -0,0 +1,176 @@
+from datetime import datetime
+
+import pytest
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+from dbk.core import models, persist, sync
+from dbk.core.providers.bofa import BofaAccountType, BofaData, BofaProvider
+from dbk.db import make_connection, make_session_factory, migrate
+from dbk.settings import UserConfig
+
+header = """blank
+blank
+blank
+blank
+blank
+
+Date,Description,Amount,Running Bal.
+12/20/2022,0,,"26,012.56"
+"""
+
+
+def make_statement(month: int, n: int) -> str:
+    rows = [
+        f'{month:02}/{day + 1:02}/2023,tx {month}-{day},-{day}.50,"1.00"'
+        for day in range(n)
+    ]
+    return header + "\n".join(rows) + "\n"
+
+
+@pytest.fixture
+def session():
+    e = make_connection("sqlite:///:memory:")
+    migrate(e, models.Base.metadata)
+    sf = make_session_factory(e)
+    with sf() as s:
+        s.expire_on_commit = False
+        yield s
+
+
+@pytest.fixture
+def conn(session: orm.Session):
+    book = models.Book(name="test", currency="USD")
+    conn = models.Connection(
+        book=book,
+        provider_id=BofaProvider.provider_id(),
+        conn_name="test",
+        provider_data=BofaData(account_type=BofaAccountType.checking).model_dump(),
+    )
+    session.add_all([book, conn])
+    session.commit()
+    return conn
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return persist.LocalStorage(UserConfig(working_dir=tmp_path / "wd"))
+
+
+def test_discover_files(tmp_path):
+    (tmp_path / "2023").mkdir()
+    (tmp_path / "2023" / "jan.csv").write_text("")
+    (tmp_path / "feb.csv").write_text("")
+    (tmp_path / ".hidden").write_text("")
+
+    assert [p.name for p in sync.discover_files(str(tmp_path))] == [
+        "jan.csv",
+        "feb.csv",
+    ]
+    assert [p.name for p in sync.discover_files(str(tmp_path / "*.csv"))] == ["feb.csv"]
+
+
+def test_import_files(tmp_path, session: orm.Session, conn, storage):
+    statements = tmp_path / "statements"
+    statements.mkdir()
+    for month in range(1, 4):
+        (statements / f"{month}.csv").write_text(make_statement(month, 10))
+    # a copy of an already listed statement is only imported once
+    (statements / "copy.csv").write_text(make_statement(1, 10))
+
+    fnames = sync.discover_files(str(statements))
+    stats = sync.import_files(session, storage, conn, fnames, n_jobs=2)
+
+    assert stats.files == 3
+    assert stats.rows == 30
+    assert len(conn.accounts) == 1
+    assert session.scalar(sa.select(sa.func.count(models.DataSource.id))) == 3
+    assert session.scalar(sa.select(sa.func.count(models.Transaction.id))) == 30
+    # the import brought the running balances up to date
+    assert not session.scalar(sa.select(models.AccountBalanceDirty.account_id))
+
+    stats = sync.import_files(session, storage, conn, fnames, n_jobs=2)
+    assert stats.files == 0
+    assert stats.skipped == 3
+
+
+def test_import_files_in_chunks(tmp_path, session: orm.Session, conn, storage):
+    statements = tmp_path / "statements"
+    statements.mkdir()
+    for month in range(1, 3):
+        (statements / f"{month}.csv").write_text(make_statement(month, 10))
+    # rows are sent before the one that fails to parse
+    bad = make_statement(3, 6) + '13/45/2023,bad,-1.50,"1.00"\n'
+    (statements / "bad.csv").write_text(bad)
+
+    fnames = sync.discover_files(str(statements))
+    stats = sync.import_files(session, storage, conn, fnames, n_jobs=2, chunk_rows=4)
+
+    assert (stats.files, stats.skipped) == (2, 1)
+    assert session.scalar(sa.select(sa.func.count(models.Transaction.id))) >= 20
+    sources = session.scalars(
+        sa.select(models.DataSource).order_by(models.DataSource.name)
+    ).all()
+    assert [ds.last_sync_error is None for ds in sources] == [True, True, False]
+    assert sources[2].last_sync_error.startswith("ValueError")  # type: ignore
+
+
+def test_insert_transactions_encodes_amounts(session: orm.Session, conn):
+    yen = models.Account(
+        book_id=conn.book_id,
+        name="yen",
+        account_type=models.AccountType.asset,
+        is_root=False,
+        is_virtual=False,
+        currency="JPY",
+    )
+    session.add(yen)
+    session.commit()
+
+    row = dict(
+        book_id=conn.book_id,
+        conn_id=conn.id,
+        time=datetime(2023, 1, 5, 12),
+        type=models.TransactionType.unknown,
+    )
+    sync.insert_transactions(
+        session,
+        [
+            row | dict(description="yen", credit_account_id=yen.id, credit_amount=1500),
+            row | dict(description="usd", debit_amount=12.34),
+        ],
+    )
+    session.commit()
+
+    T = models.Transaction
+    stmt = sa.select(T.description, T.credit_units, T.debit_units, T.amount_exponent)
+    assert set(session.execute(stmt)) == {
+        ("yen", 1500, None, 0),
+        ("usd", None, 1234, 2),
+    }
+    txs = {tx.description: tx for tx in session.scalars(sa.select(T))}
+    assert txs["yen"].credit_amount == 1500.0
+    assert txs["usd"].debit_amount == 12.34
+    assert txs["usd"].time == datetime(2023, 1, 5, 12)
+
+
+def test_insert_fractional_trade(session: orm.Session, conn):
+    row = dict(
+        book_id=conn.book_id,
+        conn_id=conn.id,
+        time=datetime(2023, 1, 5, 12),
+        type=models.TransactionType.trade,
+        description="buy VTI",
+        credit_amount=12.35,
+        debit_amount=0.12345,
+    )
+    with pytest.raises(models.InexactAmount):
+        sync.insert_transactions(session, [row])
+    session.rollback()
+
+    sync.insert_transactions(session, [row | dict(amount_exponent=5)])
+    session.commit()
+
+    T = models.Transaction
+    stmt = sa.select(T.credit_units, T.debit_units, T.amount_exponent)
+    assert session.execute(stmt).one() == (1235000, 12345, 5)
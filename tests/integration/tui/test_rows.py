@@ -0,0 +1,96 @@
+from datetime import datetime
+
+import pytest
+
+from dbk.core import models
+from dbk.db import make_connection, make_session_factory, migrate
+from dbk.tui.models.rows import AccountMap, TransactionRow
+from dbk.tui.models.transactions import TransactionsModel
+
+
+@pytest.fixture
+def session_factory():
+    e = make_connection("sqlite:///:memory:")
+    migrate(e, models.Base.metadata)
+    return make_session_factory(e)
+
+
+@pytest.fixture
+def book(session_factory) -> models.Book:
+    with session_factory() as s:
+        s.expire_on_commit = False
+        book = models.Book(name="b", currency="USD")
+        expenses = models.Account(
+            book=book,
+            name="expenses",
+            account_type=models.AccountType.expense,
+            is_root=True,
+            is_virtual=True,
+        )
+        food = models.Account(
+            book=book,
+            name="food",
+            account_type=models.AccountType.expense,
+            is_root=False,
+            is_virtual=False,
+            currency="USD",
+            parent=expenses,
+        )
+        s.add_all([book, expenses, food])
+        s.commit()
+        return book
+
+
+def test_account_map(session_factory, book):
+    accounts = AccountMap(session_factory, book.id)
+    [root] = accounts.roots()
+    assert root.name == "expenses"
+    assert [a.name for a in accounts.children(root.id)] == ["food"]
+
+    with session_factory() as s:
+        rent = models.Account(
+            book_id=book.id,
+            name="rent",
+            account_type=models.AccountType.expense,
+            is_root=False,
+            is_virtual=False,
+            parent_id=root.id,
+        )
+        s.add(rent)
+        s.commit()
+        rent_id = rent.id
+
+    # missing accounts are looked up by reloading the map
+    rent_row = accounts.get(rent_id)
+    assert rent_row is not None and rent_row.parent_id == root.id
+    assert [a.name for a in accounts.children(root.id)] == ["food", "rent"]
+    assert accounts.get(None) is None
+
+
+def test_transaction_rows(session_factory, book):
+    accounts = AccountMap(session_factory, book.id)
+    [food] = accounts.children(accounts.roots()[0].id)
+    with session_factory() as s:
+        s.add(
+            models.Transaction(
+                book_id=book.id,
+                time=datetime(2023, 1, 5),
+                type=models.TransactionType.spend,
+                description="lunch",
+                debit_account_id=food.id,
+                debit_amount=12.5,
+            )
+        )
+        s.commit()
+
+    model = TransactionsModel(session_factory, lambda: None)  # type: ignore
+    page = model.transactions()
+    [tx] = page.txs
+    assert isinstance(tx, TransactionRow)
+    assert (tx.time, tx.debit_amount, tx.credit_amount) == (
+        datetime(2023, 1, 5),
+        12.5,
+        None,
+    )
+    # accounts are resolved with the page, not when it is rendered
+    assert page.accounts[food.id].name == "food"
@@ -0,0 +1,65 @@
+import asyncio
+import threading
+
+from textual.app import App
+from textual.widgets import Static
+
+from dbk.tui.models.runner import QueryRunner
+from dbk.tui.widgets import _util as util
+from dbk.tui.widgets._util import run_query
+
+
+def test_runs_off_the_event_loop():
+    async def main():
+        with QueryRunner(max_workers=1) as runner:
+            release = threading.Event()
+            blocked = asyncio.ensure_future(runner.run(release.wait))
+            queued = asyncio.ensure_future(runner.run(threading.get_ident))
+
+            # the event loop keeps running while the only worker is busy
+            await asyncio.sleep(0.05)
+            assert not blocked.done()
+
+            queued.cancel()
+            release.set()
+            assert await blocked is True
+            assert queued.cancelled()
+
+            assert await runner.run(threading.get_ident) != threading.get_ident()
+
+    asyncio.run(main())
+
+
+class QueryApp(App):
+    def __init__(self):
+        super().__init__()
+        self.results: list[str] = []
+
+    def compose(self):
+        yield Static(id="view")
+
+
+def test_stale_queries_are_dropped(monkeypatch):
+    async def main():
+        with QueryRunner() as runner:
+            # instead of the runner of the dbk app
+            monkeypatch.setattr(util, "get_query_runner", lambda app: runner)
+            app = QueryApp()
+            async with app.run_test() as pilot:
+                view = app.query_one("#view")
+                slow = threading.Event()
+
+                def stale():
+                    slow.wait(1)
+                    return "stale"
+
+                run_query(view, stale, app.results.append)
+                fresh = run_query(view, lambda: "fresh", app.results.append)
+                await fresh.wait()
+                slow.set()
+                await pilot.pause(0.05)
+
+                assert app.results == ["fresh"]
+                assert not view.loading
+
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+from dataclasses import replace
+from datetime import datetime, timedelta
+
+import pytest
+import sqlalchemy as sa
+
+from dbk.core import models
+from dbk.db import make_connection, make_session_factory, migrate
+from dbk.tui.models.transactions import Page, TransactionsModel
+
+
+@pytest.fixture
+def session_factory():
+    e = make_connection("sqlite:///:memory:")
+    migrate(e, models.Base.metadata)
+    return make_session_factory(e)
+
+
+@pytest.fixture
+def tx_ids(session_factory) -> list[int]:
+    """Ids of 250 transactions, newest first. Every 3 share a time."""
+    with session_factory() as s:
+        book = models.Book(name="b", currency="USD")
+        s.add(book)
+        s.flush()
+        start = datetime(2023, 1, 1)
+        s.execute(
+            sa.insert(models.Transaction),
+            [
+                dict(
+                    book_id=book.id,
+                    time=start + timedelta(days=i // 3),
+                    type=models.TransactionType.unknown,
+                    description=str(i),
+                    credit_amount=1.0,
+                )
+                for i in range(250)
+            ],
+        )
+        s.commit()
+        stmt = sa.select(models.Transaction.id).order_by(
+            models.Transaction.time.desc(), models.Transaction.id.desc()
+        )
+        return list(s.scalars(stmt))
+
+
+def ids(txs) -> list[int]:
+    return [tx.id for tx in txs]
+
+
+def show(model: TransactionsModel, page: Page | None) -> list[int]:
+    return ids(model.show(page)) if page else []
+
+
+def test_pages(session_factory, tx_ids):
+    model = TransactionsModel(session_factory, lambda: None)  # type: ignore
+    model.pagination = replace(model.pagination, limit=100)
+
+    assert show(model, model.transactions()) == tx_ids[:100]
+    p = model.pagination
+    assert (p.total, p.offset, p.num_pages) == (250, 0, 2)
+    assert model.prev_page() is None
+
+    assert show(model, model.next_page()) == tx_ids[100:200]
+    assert show(model, model.next_page()) == tx_ids[200:]
+    p = model.pagination
+    assert (p.current_page, p.offset_end) == (2, 250)
+    assert model.next_page() is None
+
+    assert show(model, model.prev_page()) == tx_ids[100:200]
+    # reloading stays on the current page
+    assert show(model, model.transactions()) == tx_ids[100:200]
+    assert show(model, model.prev_page()) == tx_ids[:100]
+    assert model.pagination.offset == 0
+
+
+def test_page_not_shown(session_factory, tx_ids):
+    model = TransactionsModel(session_factory, lambda: None)  # type: ignore
+    model.show(model.transactions())
+    shown = model.pagination
+
+    # a page that is loaded but dropped as stale leaves the model where it was
+    page = model.next_page()
+    assert page is not None and model.pagination == shown
+    assert page.pagination.offset == 100
+    assert show(model, model.next_page()) == tx_ids[100:200]
+
+
+def test_reload_after_delete(session_factory, tx_ids):
+    model = TransactionsModel(session_factory, lambda: None)  # type: ignore
+    model.show(model.transactions())
+    model.show(model.next_page())  # type: ignore
+    model.show(model.next_page())  # type: ignore
+
+    with session_factory() as s:
+        s.execute(
+            sa.delete(models.Transaction).where(models.Transaction.id.in_(tx_ids[100:]))
+        )
+        s.commit()
+
+    assert show(model, model.transactions()) == tx_ids[:100]
+    assert (model.pagination.total, model.pagination.offset) == (100, 0)
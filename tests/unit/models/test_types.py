@@ -0,0 +1,67 @@
+from datetime import UTC, datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+from dbk.core import models
+
+
+@pytest.mark.parametrize(
+    "amount, currency, units",
+    [
+        (12.34, "USD", 1234),
+        (0.1, "eur", 10),
+        (1500, "JPY", 1500),
+        (1.234, "BHD", 1234),
+        (Decimal("9.99"), None, 999),
+        (None, "USD", None),
+    ],
+)
+def test_units(amount, currency, units):
+    exponent = models.currency_exponent(currency)
+    assert models.to_units(amount, exponent) == units
+    if units is not None:
+        assert models.from_units(units, exponent) == float(amount)
+
+
+def test_units_round_half_even():
+    assert models.to_units(1.005, 2) == 100
+    assert models.to_units(1.015, 2) == 102
+
+
+def test_units_sum_exactly():
+    units = sum(models.to_units(0.1, 2) for _ in range(10))  # type: ignore
+    assert models.from_units(units, 2) == 1.0
+
+
+def test_transaction_amounts():
+    tx = models.Transaction(credit_amount=1.5, amount_exponent=0)
+    assert tx.credit_units == 2
+    assert tx.credit_amount == 2.0
+
+    tx = models.Transaction(credit_amount=1.5, debit_amount=None)
+    assert (tx.credit_units, tx.debit_units) == (150, None)
+
+
+def test_trade_amounts_are_exact():
+    assert models.to_units(0.125, 3, exact=True) == 125
+    with pytest.raises(models.InexactAmount):
+        models.to_units(0.12345, 2, exact=True)
+
+    trade = models.TransactionType.trade
+    with pytest.raises(models.InexactAmount):
+        models.Transaction(debit_amount=0.12345, type=trade)
+    tx = models.Transaction(debit_amount=0.12345, type=trade, amount_exponent=5)
+    assert tx.debit_units == 12345
+
+
+def test_epoch_time():
+    t = models.EpochTime()
+    dt = datetime(2023, 1, 5, 12, 30, 15)
+    assert t.process_bind_param(dt, None) == 1672921815
+    assert t.process_result_value(1672921815, None) == dt
+
+    est = timezone(timedelta(hours=-5))
+    aware = datetime(2023, 1, 5, 7, 30, 15, tzinfo=est)
+    assert t.process_bind_param(aware, None) == 1672921815
+    assert t.process_bind_param(dt.replace(tzinfo=UTC), None) == 1672921815